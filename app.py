@@ -1,19 +1,368 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, Response
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from werkzeug.security import safe_join
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.orm import Session, aliased, selectinload, object_session
+from datetime import datetime, timezone, timedelta
 import os
 import csv
 import io
+import json
+import base64
+import hashlib
+import hmac
+import bisect
+import math
+import re
+import threading
+import time
+import uuid
+import queue
+import heapq
+import itertools
+import sys
+import traceback
+from collections import namedtuple, Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import click
+import html
+import unicodedata
+import struct
+import functools
+import mmap
+import mimetypes
+from array import array
+import sqlite3
+import gzip
+import zlib
+
+try:
+    import orjson  # Optional, several times faster than the json module for large responses
+except ImportError:
+    orjson = None
+
+try:
+    import numpy  # Optional, vectorizes urgency model scoring
+except ImportError:
+    numpy = None
+
+try:
+    import brotli  # Optional, adds br variants of static assets and pages
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-for-sessions'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///support.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Database engine
+# DATABASE_URL selects the backend (default: SQLite file in the instance folder). Pool settings
+# apply to file and server databases; SQLite connections also get the pragmas below.
+def normalize_database_url(url):
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]  # Heroku/Render style URLs
+    return url
+
+DATABASE_URL = normalize_database_url(os.environ.get('DATABASE_URL', 'sqlite:///support.db'))
+# Archived conversations (see archive_conversations) go to the 'archive' bind: the main database
+# by default, or e.g. sqlite:///archive.db to keep cold rows out of the live file entirely
+ARCHIVE_DATABASE_URL = normalize_database_url(os.environ.get('ARCHIVE_DATABASE_URL', DATABASE_URL))
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # seconds
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 15000))  # ms to wait for the write lock
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # Readers no longer block the writer (and vice versa)
+    'synchronous': 'NORMAL',  # Safe with WAL; fsync at checkpoints instead of every commit
+    'busy_timeout': SQLITE_BUSY_TIMEOUT,
+    'cache_size': int(os.environ.get('SQLITE_CACHE_KB', 65536)) * -1,  # negative = KiB
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_BYTES', 268435456)),
+    'temp_store': 'MEMORY',
+}
+
+def engine_options(url):
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        options = {"connect_args": {"timeout": SQLITE_BUSY_TIMEOUT / 1000, "check_same_thread": False}}
+        if url.database in (None, '', ':memory:'):
+            return options  # In-memory databases use a single shared connection
+        return {**options, "pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(DATABASE_URL)
+app.config['SQLALCHEMY_BINDS'] = {'archive': {'url': ARCHIVE_DATABASE_URL, **engine_options(ARCHIVE_DATABASE_URL)}}
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        if name == 'journal_mode' and dbapi_connection.execute('PRAGMA database_list').fetchone()[2] == '':
+            continue  # In-memory databases can't use WAL
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
 db = SQLAlchemy(app)
 CORS(app)
 
+SUMMARY_PREVIEW_LENGTH = 500
+BULK_STATUS_CHUNK = 500  # ids per UPDATE ... WHERE id IN (...) in batch status changes
+BULK_STATUS_MAX_IDS = 50000
+BULK_EVENT_LIMIT = 100  # Larger batches send agents one "resync" instead of per-conversation events
+
+# Request instrumentation
+# Every request records wall time, SQL statement count and SQL time (via engine events) per
+# route. Requests slower than SLOW_REQUEST_MS are logged with their slowest statements, totals
+# are served in Prometheus text format at /metrics (per process: each gunicorn worker keeps its
+# own), and responses carry a Server-Timing header for the browser's network panel.
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
+SLOW_STATEMENTS_LOGGED = 3
+# /metrics is closed by default: with METRICS_TOKEN set it requires "Authorization: Bearer <token>",
+# without one it only answers loopback clients (a reverse proxy on the same host counts as loopback)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+LOOPBACK_ADDRESSES = ("127.0.0.1", "::1")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+# Opt-in sampling profiler: comma separated route rules, e.g. PROFILE_ROUTES=/api/agent/messages.
+# Each matching request writes a folded-stack file (flamegraph.pl / speedscope) to instance/profiles.
+PROFILE_ROUTES = {rule.strip() for rule in os.environ.get('PROFILE_ROUTES', '').split(',') if rule.strip()}
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))  # seconds between stack samples
+
+_request_stats = threading.local()
+
+def prometheus_labels(pairs):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+class Metric:
+    def __init__(self, name, help_text, kind, buckets=None):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind  # 'counter' or 'histogram'
+        self.buckets = buckets
+        self.values = {}  # labels -> count, or [per-bucket counts, observations, sum] for histograms
+        self.lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * len(self.buckets), 0, 0.0]
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    def render(self, label_names):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            if self.kind == 'counter':
+                items = sorted(self.values.items())
+            else:
+                items = sorted((labels, [list(v[0]), v[1], v[2]]) for labels, v in self.values.items())
+        for labels, value in items:
+            pairs = list(zip(label_names, labels))
+            if self.kind == 'counter':
+                lines.append(f"{self.name}{prometheus_labels(pairs)} {value}")
+                continue
+            bucket_counts, count, total = value
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{prometheus_labels(pairs + [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{prometheus_labels(pairs + [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_count{prometheus_labels(pairs)} {count}")
+            lines.append(f"{self.name}_sum{prometheus_labels(pairs)} {total:.6f}")
+        return lines
+
+REQUEST_LABELS = ("route", "method", "status")
+ROUTE_LABELS = ("route", "method")
+METRICS = [
+    (Metric("messageflow_http_requests_total", "Requests handled", "counter"), REQUEST_LABELS),
+    (Metric("messageflow_http_request_duration_seconds", "Wall time per request", "histogram",
+            LATENCY_BUCKETS), ROUTE_LABELS),
+    (Metric("messageflow_sql_statements_per_request", "SQL statements executed per request", "histogram",
+            QUERY_COUNT_BUCKETS), ROUTE_LABELS),
+    (Metric("messageflow_sql_duration_seconds", "Time spent in SQL per request", "histogram",
+            LATENCY_BUCKETS), ROUTE_LABELS),
+    (Metric("messageflow_slow_requests_total", "Requests slower than SLOW_REQUEST_MS", "counter"), ROUTE_LABELS),
+]
+requests_total, request_duration, sql_statements, sql_duration, slow_requests = (m for m, _ in METRICS)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, "handle_error")
+def handle_cursor_error(exception_context):
+    # A failed statement never reaches after_cursor_execute, drop its start time here
+    conn = exception_context.connection
+    if conn is not None and exception_context.statement is not None and conn.info.get('query_started'):
+        conn.info['query_started'].pop()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    stats = getattr(_request_stats, "current", None)
+    if stats is None:
+        return  # Background thread or CLI command
+    stats["queries"] += 1
+    stats["sql_time"] += elapsed
+    # Keep only the slowest few statements (min-heap keyed on duration)
+    entry = (elapsed, stats["queries"], statement)
+    if len(stats["slowest"]) < SLOW_STATEMENTS_LOGGED:
+        heapq.heappush(stats["slowest"], entry)
+    elif elapsed > stats["slowest"][0][0]:
+        heapq.heapreplace(stats["slowest"], entry)
+
+class SamplingProfiler:
+    # One background thread samples the stacks of the request threads being profiled
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.targets = {}  # thread id -> Counter of folded stacks
+        self.thread = None
+
+    def start(self, thread_id):
+        with self.lock:
+            self.targets[thread_id] = Counter()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="sampling-profiler", daemon=True)
+                self.thread.start()
+
+    def stop(self, thread_id):
+        with self.lock:
+            return self.targets.pop(thread_id, None)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.targets:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, stacks in self.targets.items():
+                    frame = frames.get(thread_id)
+                    if frame is None:
+                        continue
+                    stack = traceback.extract_stack(frame)
+                    stacks[";".join(f"{entry.name} ({os.path.basename(entry.filename)}:{entry.lineno})"
+                                    for entry in stack)] += 1
+
+profiler = SamplingProfiler(PROFILE_INTERVAL)
+
+def write_profile(route, stacks):
+    folder = os.path.join(app.instance_path, 'profiles')
+    os.makedirs(folder, exist_ok=True)
+    name = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+    path = os.path.join(folder, f"{name}-{datetime.utcnow():%Y%m%dT%H%M%S%f}.folded")
+    with open(path, 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+def request_route():
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+@app.before_request
+def start_request_instrumentation():
+    _request_stats.current = {
+        "started": time.perf_counter(), "queries": 0, "sql_time": 0.0, "slowest": [], "profiled": False,
+        "streaming": False
+    }
+    if request_route() in PROFILE_ROUTES:
+        profiler.start(threading.get_ident())
+        _request_stats.current["profiled"] = True
+
+@app.after_request
+def record_request_instrumentation(response):
+    stats = getattr(_request_stats, "current", None)
+    if stats is None:
+        return response
+    elapsed = time.perf_counter() - stats["started"]
+    response.headers["Server-Timing"] = (
+        f'db;dur={stats["sql_time"] * 1000:.1f};desc="{stats["queries"]} queries", app;dur={elapsed * 1000:.1f}'
+    )
+    request_line = (request_route(), request.method, request.full_path, str(response.status_code))
+    if not response.is_streamed or response.mimetype == "text/event-stream":
+        observe_request(stats, *request_line)  # Event streams stay open for minutes, time only the setup
+        return response
+    # Streamed bodies (iter_threads, exports) run their SQL after this hook, in the same thread. Keep
+    # counting until the server closes the response; Server-Timing only shows the SQL before the body.
+    stats["streaming"] = True
+
+    def finish():
+        observe_request(stats, *request_line)
+        if getattr(_request_stats, "current", None) is stats:
+            _request_stats.current = None
+    response.call_on_close(finish)
+    return response
+
+def observe_request(stats, route, method, path, status):
+    elapsed = time.perf_counter() - stats["started"]
+    labels = (route, method)
+    requests_total.inc(labels + (status,))
+    request_duration.observe(labels, elapsed)
+    sql_statements.observe(labels, stats["queries"])
+    sql_duration.observe(labels, stats["sql_time"])
+    if elapsed * 1000 >= SLOW_REQUEST_MS:
+        slow_requests.inc(labels)
+        slowest = "".join(
+            f"\n  {duration * 1000:.1f} ms (#{index}): {' '.join(statement.split())[:300]}"
+            for duration, index, statement in sorted(stats["slowest"], reverse=True)
+        )
+        app.logger.warning(
+            "Slow request %s %s: %.0f ms, %d SQL statements in %.0f ms%s", method, path,
+            elapsed * 1000, stats["queries"], stats["sql_time"] * 1000, slowest
+        )
+
+@app.teardown_request
+def finish_request_instrumentation(exc):
+    stats = getattr(_request_stats, "current", None)
+    if not (stats and stats["streaming"]):
+        _request_stats.current = None
+    if stats and stats["profiled"]:
+        stacks = profiler.stop(threading.get_ident())
+        if stacks:
+            path = write_profile(request_route(), stacks)
+            app.logger.info("Wrote profile %s (%d samples)", path, sum(stacks.values()))
+
+@app.route("/metrics")
+def metrics():
+    if METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"):
+            return jsonify({"error": "Unauthorized"}), 401
+    elif request.remote_addr not in LOOPBACK_ADDRESSES:
+        return jsonify({"error": "Set METRICS_TOKEN to scrape metrics from another host"}), 403
+    lines = []
+    for metric, label_names in METRICS:
+        lines.extend(metric.render(label_names))
+    pool = db.engine.pool
+    if hasattr(pool, "checkedout"):
+        lines += [
+            "# HELP messageflow_db_pool_checked_out Database connections currently in use",
+            "# TYPE messageflow_db_pool_checked_out gauge",
+            f"messageflow_db_pool_checked_out {pool.checkedout()}",
+        ]
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
 # Database Models
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -25,80 +374,1603 @@ class User(db.Model):
     account_type = db.Column(db.String(20))  # Optional field for customers
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    messages = db.relationship('Message', back_populates='customer', lazy='select')
+
 class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    customer_id = db.Column(db.Integer, nullable=False)  # User ID of customer
+    customer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)  # User ID of customer
     message_text = db.Column(db.Text, nullable=False)
     urgency = db.Column(db.String(20), default='Normal')  # 'Urgent' or 'Normal'
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     status = db.Column(db.String(20), default='Open')  # 'Open' or 'Resolved'
+    urgency_terms = db.Column(db.String(255))  # Comma separated keywords that made the message Urgent
+    urgency_source = db.Column(db.String(10))  # 'rules', 'model', 'import' (CSV column) or 'agent'
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # New reply or status change
+    first_response_at = db.Column(db.DateTime)  # When an agent first replied
+    first_response_seconds = db.Column(db.Float)
+    first_responder = db.Column(db.String(100))  # Name of that agent
+    content_hash = db.Column(db.String(40))  # See message_fingerprint()
+    simhash = db.Column(db.BigInteger)
+    duplicate_of = db.Column(db.Integer)  # Earlier open message this one nearly repeats
+    duplicate_count = db.Column(db.Integer, default=0)  # Identical messages folded into this one
+    last_duplicate_at = db.Column(db.DateTime)
+
+    customer = db.relationship('User', back_populates='messages', lazy='select')
+    replies = db.relationship('Reply', back_populates='message', lazy='select', order_by='Reply.timestamp')
+
+    __table_args__ = (
+        db.Index('ix_message_status_urgency', 'status', 'urgency'),
+        db.Index('ix_message_customer_timestamp', 'customer_id', 'timestamp'),
+        db.Index('ix_message_customer_content_hash', 'customer_id', 'content_hash'),
+        {"sqlite_autoincrement": True},  # Archived ids are never handed out again, see ensure_autoincrement
+    )
 
 class Reply(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    message_id = db.Column(db.Integer, nullable=False)  # ID of the original message
+    message_id = db.Column(db.Integer, db.ForeignKey('message.id'), nullable=False, index=True)  # ID of the original message
     agent_name = db.Column(db.String(100), nullable=False)  # Name of the agent who replied
     reply_text = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
-# Urgency detection function
+    message = db.relationship('Message', back_populates='replies', lazy='select')
+
+    __table_args__ = {"sqlite_autoincrement": True}
+
+class ArchivedMessage(db.Model):
+    # Messages of long-resolved conversations, moved out of Message by archive_conversations().
+    # Same columns (and ids) as Message; never updated once written.
+    __bind_key__ = 'archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    customer_id = db.Column(db.Integer, nullable=False)  # No foreign key: may live in another database
+    message_text = db.Column(db.Text, nullable=False)
+    urgency = db.Column(db.String(20))
+    timestamp = db.Column(db.DateTime)
+    status = db.Column(db.String(20))
+    urgency_terms = db.Column(db.String(255))
+    urgency_source = db.Column(db.String(10))
+    updated_at = db.Column(db.DateTime)
+    first_response_at = db.Column(db.DateTime)
+    first_response_seconds = db.Column(db.Float)
+    first_responder = db.Column(db.String(100))
+    content_hash = db.Column(db.String(40))
+    simhash = db.Column(db.BigInteger)
+    duplicate_of = db.Column(db.Integer)
+    duplicate_count = db.Column(db.Integer, default=0)
+    last_duplicate_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    replies = db.relationship('ArchivedReply', lazy='select', order_by='ArchivedReply.timestamp')
+
+    __table_args__ = (
+        db.Index('ix_archived_message_customer_timestamp', 'customer_id', 'timestamp'),
+    )
+
+class ArchivedReply(db.Model):
+    __bind_key__ = 'archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    message_id = db.Column(db.Integer, db.ForeignKey('archived_message.id'), nullable=False, index=True)
+    agent_name = db.Column(db.String(100), nullable=False)
+    reply_text = db.Column(db.Text, nullable=False)
+    timestamp = db.Column(db.DateTime)
+
+class ArchiveRun(db.Model):
+    # One row per archived batch, committed together with the rows it moved. Summed up, they give
+    # the archived message counts that stats add to the live ones without touching the archive tables.
+    __bind_key__ = 'archive'
+    id = db.Column(db.Integer, primary_key=True)
+    cutoff = db.Column(db.DateTime, nullable=False)  # Conversations idle since before this were archived
+    conversations = db.Column(db.Integer, nullable=False, default=0)
+    messages = db.Column(db.Integer, nullable=False, default=0)
+    urgent_messages = db.Column(db.Integer, nullable=False, default=0)
+    replies = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ImportJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    path = db.Column(db.String(500), nullable=False)  # Spooled upload on disk
+    state = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    rows_failed = db.Column(db.Integer, nullable=False, default=0)
+    messages_imported = db.Column(db.Integer, nullable=False, default=0)
+    duplicates_skipped = db.Column(db.Integer, default=0)  # Rows already stored (re-uploads, repeats)
+    errors = db.Column(db.Text)  # JSON list of {"row", "error"} (first IMPORT_MAX_ERRORS only)
+    error = db.Column(db.Text)  # Why the whole job failed
+    created_by = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        end = self.finished_at or datetime.utcnow()
+        elapsed = (end - self.started_at).total_seconds() if self.started_at else 0
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "state": self.state,
+            "rows_processed": self.rows_processed,
+            "rows_failed": self.rows_failed,
+            "messages_imported": self.messages_imported,
+            "duplicates_skipped": self.duplicates_skipped or 0,
+            "rows_per_second": round(self.rows_processed / elapsed, 1) if elapsed > 0 else None,
+            "errors": json.loads(self.errors) if self.errors else [],
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class ResponseTimeBucket(db.Model):
+    # Streaming first-response histograms: one row per (dimension, key, day, bucket),
+    # incremented as agents first reply. dimension is 'all', 'agent' or 'urgency'.
+    dimension = db.Column(db.String(20), primary_key=True)
+    key = db.Column(db.String(100), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True)  # See response_bucket()
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total_seconds = db.Column(db.Float, nullable=False, default=0.0)
+
+class MessageRollup(db.Model):
+    # Time-bucketed counters for the analytics trends, written alongside messages and replies.
+    # New activity lands in 'hour' rows; compact_rollups() folds old hours into 'day' rows.
+    granularity = db.Column(db.String(4), primary_key=True)  # 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    received = db.Column(db.Integer, nullable=False, default=0)
+    received_urgent = db.Column(db.Integer, nullable=False, default=0)
+    resolved = db.Column(db.Integer, nullable=False, default=0)  # Open -> Resolved transitions
+    reopened = db.Column(db.Integer, nullable=False, default=0)  # Resolved -> Open transitions
+    replies = db.Column(db.Integer, nullable=False, default=0)
+
+class BusEvent(db.Model):
+    # Shared event log used by DatabaseEventBus to fan events out across worker processes
+    id = db.Column(db.Integer, primary_key=True)
+    channels = db.Column(db.String(255), nullable=False)  # Space separated channel names
+    event_type = db.Column(db.String(50), nullable=False)
+    data = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class ConversationSummary(db.Model):
+    # One row per customer, kept in sync by every write path (see bump_conversation_summary)
+    customer_id = db.Column(db.Integer, primary_key=True)
+    latest_message_id = db.Column(db.Integer, nullable=False)
+    latest_preview = db.Column(db.Text, nullable=False)
+    latest_urgency = db.Column(db.String(20))
+    latest_status = db.Column(db.String(20))
+    last_activity = db.Column(db.DateTime, nullable=False)
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    urgent_count = db.Column(db.Integer, nullable=False, default=0)
+    open_count = db.Column(db.Integer, nullable=False, default=0)
+    open_urgent_count = db.Column(db.Integer, nullable=False, default=0)
+    priority = db.Column(db.Integer, nullable=False, default=0)  # 2 = urgent & open, 1 = open, 0 = resolved
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.Index('ix_conversation_summary_inbox', 'priority', 'last_activity', 'customer_id'),
+    )
+
+    @property
+    def status(self):
+        return "Open" if self.open_count > 0 else self.latest_status
+
+class QueueEntry(db.Model):
+    # Agents' work queue: one row per conversation with open messages, ordered by SLA deadline and
+    # kept in step with Message by refresh_queue(). Agents claim the head with a time-limited lease.
+    customer_id = db.Column(db.Integer, primary_key=True)
+    due_at = db.Column(db.DateTime, nullable=False)  # Earliest SLA deadline of its open messages
+    priority = db.Column(db.Integer, nullable=False, default=1)  # 2 = has an urgent open message, 1 = open
+    waiting_since = db.Column(db.DateTime, nullable=False)  # Oldest open message
+    claimed_by = db.Column(db.Integer)  # Agent user id
+    claimed_by_name = db.Column(db.String(100))
+    claim_expires_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_queue_entry_due', 'due_at', 'customer_id'),
+        db.Index('ix_queue_entry_claimed_by', 'claimed_by'),
+    )
+
+    def to_dict(self, now=None):
+        now = now or datetime.utcnow()
+        claimed = self.claim_expires_at is not None and self.claim_expires_at >= now
+        return {
+            "customer_id": self.customer_id,
+            "due_at": self.due_at.isoformat(),
+            "overdue": self.due_at < now,
+            "priority": self.priority,
+            "waiting_since": self.waiting_since.isoformat(),
+            "claimed_by": self.claimed_by if claimed else None,
+            "claimed_by_name": self.claimed_by_name if claimed else None,
+            "claim_expires_at": self.claim_expires_at.isoformat() if claimed else None
+        }
+
+# User profile cache
+# Read-only snapshots of User rows shared by all requests in this process: bounded LRU with a TTL
+# so other workers' changes show up within USER_CACHE_TTL seconds. Rows changed through the ORM
+# are dropped immediately and again once their transaction commits.
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 60))
+USER_CACHE_CHUNK = 500  # ids per IN (...) when loading misses
+
+UserProfile = namedtuple('UserProfile', ['id', 'name', 'email', 'role', 'phone', 'department', 'account_type'])
+
+class UserProfileCache:
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # user id -> (profile, loaded at), least recently used first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        if user_id is None:
+            return None
+        return self.get_many([user_id]).get(user_id)
+
+    def get_many(self, user_ids):
+        # {id: UserProfile} for the ids that exist; all misses are loaded with one query per chunk
+        now = time.monotonic()
+        found = {}
+        missing = []
+        with self.lock:
+            for user_id in set(user_ids):
+                entry = self.entries.get(user_id)
+                if entry is not None and now - entry[1] < self.ttl:
+                    self.entries.move_to_end(user_id)
+                    found[user_id] = entry[0]
+                else:
+                    missing.append(user_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+        if not missing:
+            return found
+        loaded = []
+        for start in range(0, len(missing), USER_CACHE_CHUNK):
+            rows = db.session.query(*[getattr(User, field) for field in UserProfile._fields]).filter(
+                User.id.in_(missing[start:start + USER_CACHE_CHUNK])
+            )
+            loaded.extend(UserProfile(*row) for row in rows)
+        with self.lock:
+            for profile in loaded:
+                self.entries[profile.id] = (profile, now)
+                self.entries.move_to_end(profile.id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        found.update((profile.id, profile) for profile in loaded)
+        return found
+
+    def invalidate(self, user_ids=None):
+        with self.lock:
+            if user_ids is None:
+                self.entries.clear()
+                return
+            for user_id in user_ids:
+                self.entries.pop(user_id, None)
+
+user_cache = UserProfileCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    user_cache.invalidate([target.id])
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('users_changed', set()).add(target.id)
+
+# Thread loading and serialization
+# Replies for a whole set of messages are fetched in one extra query and customers come from the
+# profile cache, so thread endpoints run a constant number of queries no matter how long the thread is
+def load_threads(query, model=Message):
+    # model: Message or ArchivedMessage
+    return query.options(selectinload(model.replies)).all()
+
+def iter_threads(query, model=Message):
+    # Same as load_threads but streamed, STREAM_YIELD_PER messages (and their replies) at a time.
+    # Rows are read while the response body is written, after the request context and its session
+    # are gone, so the generator uses a session of its own. Its SQL still counts towards the request's
+    # metrics (see record_request_instrumentation), though not its Server-Timing header.
+    statement = query.options(selectinload(model.replies)).statement.execution_options(
+        yield_per=STREAM_YIELD_PER
+    )
+    engine = db.session.get_bind(mapper=model)
+
+    def rows():
+        with Session(engine) as stream_session:
+            yield from stream_session.scalars(statement)
+    return rows()
+
+def reply_to_dict(reply):
+    return {
+        "id": reply.id,
+        "agent_name": reply.agent_name,
+        "reply_text": reply.reply_text,
+        "timestamp": reply.timestamp.isoformat()
+    }
+
+def customer_to_dict(customer):
+    return {
+        "id": customer.id,
+        "name": customer.name,
+        "email": customer.email,
+        "phone": customer.phone,
+        "account_type": customer.account_type or "Standard",
+        "department": customer.department
+    }
+
+def message_to_dict(msg, customers=None):
+    # customers: {id: UserProfile} from user_cache.get_many() to include the customer's details
+    data = {
+        "id": msg.id,
+        "message_text": msg.message_text,
+        "urgency": msg.urgency,
+        "timestamp": msg.timestamp.isoformat(),
+        "status": msg.status,
+        "urgency_terms": msg.urgency_terms.split(",") if msg.urgency_terms else [],
+        "duplicate_count": msg.duplicate_count or 0,
+        "duplicate_of": msg.duplicate_of,
+        "replies": [reply_to_dict(reply) for reply in msg.replies]
+    }
+    if isinstance(msg, ArchivedMessage):
+        data["archived"] = True
+    if customers is not None:
+        customer = customers.get(msg.customer_id)
+        data.update({
+            "customer_id": msg.customer_id,
+            "customer_name": customer.name if customer else "Unknown",
+            "customer_email": customer.email if customer else None,
+            "customer_phone": customer.phone if customer else None,
+            "account_type": customer.account_type if customer else None
+        })
+    return data
+
+# Streaming JSON responses
+# Large lists are written as they are read instead of being built in memory first: a JSON array
+# (optionally inside a wrapper object) or, with ?format=ndjson / Accept: application/x-ndjson,
+# one object per line with the wrapper fields as the first line. Output is gzip-compressed on
+# the fly when the client accepts it; after_request compresses other large responses.
+STREAM_YIELD_PER = 500  # ORM rows fetched per batch
+STREAM_CHUNK_BYTES = 64 * 1024
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/html", "text/plain", "text/css",
+                          "text/csv", "application/javascript", "text/javascript"}
+
+def json_bytes(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def wants_ndjson():
+    return request.args.get("format") == "ndjson" or \
+        request.accept_mimetypes.best == "application/x-ndjson"
+
+def accepts_gzip():
+    return request.accept_encodings["gzip"] > 0
+
+def json_chunks(items, wrapper=None, key=None, ndjson=False):
+    # Yields bytes of about STREAM_CHUNK_BYTES; `items` is consumed lazily
+    buffer = bytearray()
+    if ndjson:
+        if wrapper is not None:
+            buffer += json_bytes(wrapper) + b"\n"
+        end = b""
+        for item in items:
+            buffer += json_bytes(item) + b"\n"
+            if len(buffer) >= STREAM_CHUNK_BYTES:
+                yield bytes(buffer)
+                buffer.clear()
+    else:
+        if wrapper is not None:
+            head = json_bytes(wrapper)[:-1]  # Drop the closing brace, the array goes last
+            buffer += head + (b"," if len(head) > 1 else b"") + json_bytes(key) + b":["
+            end = b"]}"
+        else:
+            buffer += b"["
+            end = b"]"
+        first = True
+        for item in items:
+            if not first:
+                buffer += b","
+            first = False
+            buffer += json_bytes(item)
+            if len(buffer) >= STREAM_CHUNK_BYTES:
+                yield bytes(buffer)
+                buffer.clear()
+    buffer += end
+    if buffer:
+        yield bytes(buffer)
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_json(items, wrapper=None, key=None):
+    # Response for a lazily serialized list. The body is generated outside the request context,
+    # so `items` must not need it (see iter_threads)
+    ndjson = wants_ndjson()
+    chunks = json_chunks(items, wrapper, key, ndjson)
+    response = Response(mimetype="application/x-ndjson" if ndjson else "application/json")
+    if accepts_gzip():
+        chunks = gzip_chunks(chunks)
+        response.headers["Content-Encoding"] = "gzip"
+    response.response = chunks
+    response.vary.add("Accept-Encoding")
+    return response
+
+@app.after_request
+def compress_response(response):
+    if response.is_streamed or response.direct_passthrough or response.status_code != 200 \
+            or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add("Accept-Encoding")
+    if response.content_length is None or response.content_length < GZIP_MIN_BYTES or not accepts_gzip():
+        return response
+    response.set_data(gzip.compress(response.get_data(), GZIP_LEVEL))
+    response.headers["Content-Encoding"] = "gzip"
+    return response
+
+# Full-text search
+# SQLite uses an FTS5 table kept in sync by triggers; other databases (or SQLite builds
+# without FTS5) fall back to LIKE matching. Both return (message_id, rank, snippet) tuples.
+SNIPPET_START, SNIPPET_END = "\x02", "\x03"
+
+FTS5_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS message_search USING fts5(
+        message_text, reply_text, customer_name, customer_email,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS message_search_ai AFTER INSERT ON message BEGIN
+        INSERT INTO message_search (rowid, message_text, reply_text, customer_name, customer_email)
+        VALUES (new.id, new.message_text, '',
+                (SELECT name FROM "user" WHERE id = new.customer_id),
+                (SELECT email FROM "user" WHERE id = new.customer_id));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS message_search_au AFTER UPDATE OF message_text, customer_id ON message BEGIN
+        UPDATE message_search SET message_text = new.message_text,
+            customer_name = (SELECT name FROM "user" WHERE id = new.customer_id),
+            customer_email = (SELECT email FROM "user" WHERE id = new.customer_id)
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS message_search_ad AFTER DELETE ON message BEGIN
+        DELETE FROM message_search WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS reply_search_ai AFTER INSERT ON reply BEGIN
+        UPDATE message_search SET reply_text = (
+            SELECT group_concat(reply_text, ' ') FROM reply WHERE message_id = new.message_id
+        ) WHERE rowid = new.message_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS reply_search_au AFTER UPDATE OF reply_text ON reply BEGIN
+        UPDATE message_search SET reply_text = (
+            SELECT group_concat(reply_text, ' ') FROM reply WHERE message_id = new.message_id
+        ) WHERE rowid = new.message_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS reply_search_ad AFTER DELETE ON reply BEGIN
+        UPDATE message_search SET reply_text = coalesce((
+            SELECT group_concat(reply_text, ' ') FROM reply WHERE message_id = old.message_id
+        ), '') WHERE rowid = old.message_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS user_search_au AFTER UPDATE OF name, email ON "user" BEGIN
+        UPDATE message_search SET customer_name = new.name, customer_email = new.email
+        WHERE rowid IN (SELECT id FROM message WHERE customer_id = new.id);
+    END""",
+]
+
+class FTS5SearchBackend:
+    name = "fts5"
+    table = "message_search"
+    bind_key = None  # Flask-SQLAlchemy bind holding the table
+
+    @classmethod
+    def execute(cls, sql, params=None):
+        return db.session.execute(db.text(sql), params, bind_arguments={"bind": db.engines[cls.bind_key]})
+
+    @classmethod
+    def available(cls):
+        if db.engines[cls.bind_key].dialect.name != 'sqlite':
+            return False
+        row = cls.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name", {"name": cls.table}
+        ).first()
+        return row is not None
+
+    @staticmethod
+    def setup():
+        for statement in FTS5_SCHEMA:
+            db.session.execute(db.text(statement))
+
+    @staticmethod
+    def rebuild():
+        db.session.execute(db.text("DELETE FROM message_search"))
+        db.session.execute(db.text("""
+            INSERT INTO message_search (rowid, message_text, reply_text, customer_name, customer_email)
+            SELECT m.id, m.message_text,
+                   coalesce((SELECT group_concat(r.reply_text, ' ') FROM reply r WHERE r.message_id = m.id), ''),
+                   u.name, u.email
+            FROM message m LEFT JOIN "user" u ON u.id = m.customer_id
+        """))
+
+    @staticmethod
+    def match_expression(query):
+        # Quote every term so user input can't use FTS5 syntax; trailing * gives prefix matching
+        terms = [term.replace('"', '""') for term in query.split()]
+        return " ".join(f'"{term}"*' for term in terms if term)
+
+    @classmethod
+    def search(cls, query, limit, offset):
+        # bm25 weights: message text, replies, customer name, customer email
+        rows = cls.execute(f"""
+            SELECT rowid, bm25({cls.table}, 4.0, 1.0, 2.0, 2.0) AS rank,
+                   snippet({cls.table}, -1, '{SNIPPET_START}', '{SNIPPET_END}', '…', 16)
+            FROM {cls.table}
+            WHERE {cls.table} MATCH :match
+            ORDER BY rank, rowid DESC
+            LIMIT :limit OFFSET :offset
+        """, {"match": cls.match_expression(query), "limit": limit, "offset": offset})
+        return [(row[0], row[1], row[2]) for row in rows]
+
+class LikeSearchBackend:
+    name = "like"
+
+    @staticmethod
+    def available():
+        return True
+
+    @staticmethod
+    def setup():
+        pass
+
+    @staticmethod
+    def rebuild():
+        pass
+
+    @staticmethod
+    def search(query, limit, offset):
+        rows = db.session.query(Message.id, Message.message_text).join(
+            User, Message.customer_id == User.id
+        ).filter(
+            db.or_(
+                Message.message_text.contains(query),
+                User.name.contains(query),
+                User.email.contains(query)
+            )
+        ).order_by(
+            db.case((Message.urgency == 'Urgent', 1), else_=2),
+            Message.timestamp.desc()
+        ).limit(limit).offset(offset).all()
+        return [(row.id, None, row.message_text[:200]) for row in rows]
+
+_search_backend = None
+
+def get_search_backend():
+    global _search_backend
+    if _search_backend is None:
+        _search_backend = FTS5SearchBackend if FTS5SearchBackend.available() else LikeSearchBackend
+    return _search_backend
+
+def ensure_search_index():
+    # Create the FTS5 table/triggers when SQLite supports it, and fill it for existing data
+    global _search_backend
+    if db.engine.dialect.name != 'sqlite':
+        return
+    try:
+        FTS5SearchBackend.setup()
+    except Exception:
+        db.session.rollback()  # SQLite compiled without FTS5
+        return
+    empty = db.session.execute(db.text("SELECT 1 FROM message_search LIMIT 1")).first() is None
+    if empty and Message.query.first() is not None:
+        FTS5SearchBackend.rebuild()
+    db.session.commit()
+    _search_backend = FTS5SearchBackend
+
+def highlight_snippet(snippet):
+    # Escape the text first, then turn the backend's markers into <mark> tags
+    escaped = html.escape(snippet or "")
+    return escaped.replace(SNIPPET_START, "<mark>").replace(SNIPPET_END, "</mark>")
+
+# Event bus
+# Write paths publish small delta events after they commit; /api/events streams them to the browser as
+# Server-Sent Events. Channels: "agents" (every agent) and "customer:<id>" (that customer's chat).
+# EVENT_BUS=local keeps events inside this process; EVENT_BUS=database relays them through the
+# BusEvent table so every gunicorn worker sees every event.
+EVENT_BUS = os.environ.get('EVENT_BUS', 'local')
+EVENT_QUEUE_SIZE = 256  # Per subscriber; a slow client that falls behind gets a "resync" event
+EVENT_POLL_INTERVAL = float(os.environ.get('EVENT_POLL_INTERVAL', 0.5))
+EVENT_RETENTION_SECONDS = 300
+
+class Subscription:
+    def __init__(self, bus, channels):
+        self.bus = bus
+        self.channels = set(channels)
+        self.queue = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout=None):
+        if self.overflowed:
+            self.overflowed = False
+            with self.queue.mutex:
+                self.queue.queue.clear()
+            return (None, "resync", {})
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+class LocalEventBus:
+    name = "local"
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def deliver(self, event_id, channels, event_type, data):
+        with self._lock:
+            targets = set()
+            for channel in channels:
+                targets.update(self._subscribers.get(channel, ()))
+        for subscription in targets:
+            subscription.put((event_id, event_type, data))
+
+    def publish(self, channels, event_type, data):
+        with self._lock:
+            self._next_id += 1
+            event_id = self._next_id
+        self.deliver(event_id, channels, event_type, data)
+
+    def publish_many(self, events):
+        for channels, event_type, data in events:
+            self.publish(channels, event_type, data)
+
+class DatabaseEventBus(LocalEventBus):
+    name = "database"
+
+    def __init__(self):
+        super().__init__()
+        self._last_id = None
+        self._poller = None
+        self._published = 0
+
+    def publish(self, channels, event_type, data):
+        self.publish_many([(channels, event_type, data)])
+
+    def publish_many(self, events):
+        # Own connection/transaction: publishing happens after the caller's commit
+        if not events:
+            return
+        now = datetime.utcnow()
+        with db.engine.begin() as conn:
+            conn.execute(db.insert(BusEvent), [{
+                "channels": " ".join(channels), "event_type": event_type,
+                "data": json.dumps(data), "created_at": now
+            } for channels, event_type, data in events])
+            published, self._published = self._published, self._published + len(events)
+            if published // 100 != self._published // 100:
+                cutoff = datetime.utcfromtimestamp(time.time() - EVENT_RETENTION_SECONDS)
+                conn.execute(db.delete(BusEvent).where(BusEvent.created_at < cutoff))
+
+    def subscribe(self, channels):
+        self._start_poller()
+        return super().subscribe(channels)
+
+    def _start_poller(self):
+        with self._lock:
+            if self._poller is not None:
+                return
+            self._poller = threading.Thread(target=self._poll, name="event-bus", daemon=True)
+            self._poller.start()
+
+    def _poll(self):
+        with app.app_context():
+            if self._last_id is None:
+                with db.engine.connect() as conn:
+                    self._last_id = conn.execute(db.select(db.func.max(BusEvent.id))).scalar() or 0
+            while True:
+                time.sleep(EVENT_POLL_INTERVAL)
+                try:
+                    with db.engine.connect() as conn:
+                        rows = conn.execute(db.select(BusEvent).where(BusEvent.id > self._last_id)
+                                            .order_by(BusEvent.id)).all()
+                except Exception:
+                    app.logger.exception("Event bus poll failed")
+                    continue
+                for row in rows:
+                    self._last_id = row.id
+                    self.deliver(row.id, row.channels.split(), row.event_type, json.loads(row.data))
+
+event_bus = DatabaseEventBus() if EVENT_BUS == 'database' else LocalEventBus()
+
+def publish_event(channels, event_type, data):
+    # Never let a notification failure break the write that triggered it
+    try:
+        event_bus.publish(channels, event_type, data)
+    except Exception:
+        app.logger.exception("Could not publish %s event", event_type)
+
+def publish_events(events):
+    # (channels, event_type, data) tuples in one go (one transaction on the database bus)
+    try:
+        event_bus.publish_many(events)
+    except Exception:
+        app.logger.exception("Could not publish %d events", len(events))
+
+def customer_channel(customer_id):
+    return f"customer:{customer_id}"
+
+def publish_conversation(customer_id):
+    # Agents get the refreshed inbox row so dashboards can patch it in place
+    summary = db.session.get(ConversationSummary, customer_id, populate_existing=True)
+    customer = user_cache.get(customer_id)
+    if summary and customer:
+        publish_event(["agents"], "conversation", serialize_conversation(summary, customer))
+
+# Message statistics
+# All status/urgency counts come from one GROUP BY pass, cached per process for STATS_CACHE_TTL
+# seconds and dropped as soon as a transaction that changed messages commits.
+STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL', 5))
+_stats_cache = {"counts": None, "at": 0.0}
+_stats_lock = threading.Lock()
+
+def invalidate_stats_cache():
+    with _stats_lock:
+        _stats_cache["counts"] = None
+        _response_time_cache.clear()
+
+@event.listens_for(db.session, "after_commit")
+def _invalidate_stats_after_commit(session):
+    if session.info.pop('messages_changed', False):
+        invalidate_stats_cache()
+    users = session.info.pop('users_changed', None)
+    if users:
+        user_cache.invalidate(users)
+
+@event.listens_for(db.session, "before_commit")
+def _refresh_queue_before_commit(session):
+    if 'queue_changed' in session.info:
+        refresh_queue(session.info.pop('queue_changed'))
+
+@event.listens_for(db.session, "after_rollback")
+def _clear_messages_changed(session):
+    session.info.pop('messages_changed', None)
+    session.info.pop('queue_changed', None)
+    users = session.info.pop('users_changed', None)
+    if users:
+        user_cache.invalidate(users)  # Rolled-back inserts/updates may have been cached meanwhile
+
+def get_message_counts():
+    # {(status, urgency): count}
+    now = time.monotonic()
+    counts = _stats_cache["counts"]
+    if counts is not None and now - _stats_cache["at"] < STATS_CACHE_TTL:
+        return counts
+    rows = db.session.query(Message.status, Message.urgency, db.func.count(Message.id)).group_by(
+        Message.status, Message.urgency
+    ).all()
+    counts = {(status, urgency): count for status, urgency, count in rows}
+    # Archived messages (all resolved) are counted from the archive run log, not the archive tables
+    archived, archived_urgent = db.session.query(
+        db.func.coalesce(db.func.sum(ArchiveRun.messages), 0),
+        db.func.coalesce(db.func.sum(ArchiveRun.urgent_messages), 0)
+    ).one()
+    for urgency, count in (('Urgent', archived_urgent), ('Normal', archived - archived_urgent)):
+        if count:
+            counts[('Resolved', urgency)] = counts.get(('Resolved', urgency), 0) + count
+    with _stats_lock:
+        _stats_cache["counts"] = counts
+        _stats_cache["at"] = now
+    return counts
+
+def count_messages(status=None, urgency=None):
+    return sum(
+        count for (s, u), count in get_message_counts().items()
+        if (status is None or s == status) and (urgency is None or u == urgency)
+    )
+
+# Response time analytics
+# First-response latency goes into log-scaled buckets (RESPONSE_BUCKETS_PER_DECADE per factor of 10,
+# so percentiles are within ~12%) per day, overall / per agent / per urgency. Reading p50/p90/p99 for a
+# range sums a few hundred bucket rows and never touches Message or Reply.
+RESPONSE_BUCKETS_PER_DECADE = 20
+RESPONSE_MAX_BUCKET = RESPONSE_BUCKETS_PER_DECADE * 8  # up to 10^8 seconds
+_response_time_cache = {}
+
+def response_bucket(seconds):
+    # Bucket 0 holds everything under a second
+    if seconds < 1:
+        return 0
+    return min(RESPONSE_MAX_BUCKET, 1 + int(math.log10(seconds) * RESPONSE_BUCKETS_PER_DECADE))
+
+def response_bucket_upper(bucket):
+    return 10 ** (bucket / RESPONSE_BUCKETS_PER_DECADE)
+
+def upsert_statement(model):
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    return upsert(model)
+
+def upsert_increment(model, key_columns, rows, add_columns):
+    # INSERT rows, or add their counters onto the existing row with the same key (atomic in SQL)
+    if not rows:
+        return
+    stmt = upsert_statement(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column: getattr(model, column) + getattr(stmt.excluded, column) for column in add_columns}
+    )
+    db.session.execute(stmt, rows)
+
+def upsert_replace(model, key_columns, rows, set_columns):
+    # INSERT rows, or overwrite `set_columns` of the existing row with the same key
+    if not rows:
+        return
+    stmt = upsert_statement(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column: getattr(stmt.excluded, column) for column in set_columns}
+    )
+    db.session.execute(stmt, rows)
+
+def response_time_upsert(rows):
+    # rows: dicts with dimension, key, day, bucket, count, total_seconds
+    upsert_increment(ResponseTimeBucket, ['dimension', 'key', 'day', 'bucket'], rows, ['count', 'total_seconds'])
+
+def response_time_rows(seconds, responded_at, agent_name, urgency):
+    bucket = response_bucket(seconds)
+    day = responded_at.date()
+    return [
+        {"dimension": dimension, "key": key, "day": day, "bucket": bucket, "count": 1, "total_seconds": seconds}
+        for dimension, key in (("all", "all"), ("agent", agent_name), ("urgency", urgency or "Normal"))
+    ]
+
+def record_first_response(message, agent_name, responded_at):
+    # Called in the reply's transaction; only the first reply to a message counts
+    if message.first_response_at is not None:
+        return
+    seconds = max(0.0, (responded_at - message.timestamp).total_seconds())
+    message.first_response_at = responded_at
+    message.first_response_seconds = seconds
+    message.first_responder = agent_name
+    response_time_upsert(response_time_rows(seconds, responded_at, agent_name, message.urgency))
+    mark_messages_changed()
+
+def summarize_buckets(buckets):
+    # buckets: {bucket: (count, total_seconds)}
+    count = sum(c for c, _ in buckets.values())
+    if not count:
+        return {"count": 0, "mean": None, "p50": None, "p90": None, "p99": None}
+    result = {"count": count, "mean": round(sum(t for _, t in buckets.values()) / count, 1)}
+    for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+        target = math.ceil(q * count)
+        seen = 0
+        for bucket in sorted(buckets):
+            seen += buckets[bucket][0]
+            if seen >= target:
+                result[name] = round(response_bucket_upper(bucket), 1)
+                break
+    return result
+
+def response_time_stats(dimension="all", start=None, end=None):
+    # {key: {"count", "mean", "p50", "p90", "p99"}} for responses between the start and end days
+    cache_key = (dimension, start, end)
+    cached = _response_time_cache.get(cache_key)
+    if cached and time.monotonic() - cached[0] < STATS_CACHE_TTL:
+        return cached[1]
+    R = ResponseTimeBucket
+    query = db.session.query(R.key, R.bucket, db.func.sum(R.count), db.func.sum(R.total_seconds)).filter(
+        R.dimension == dimension
+    )
+    if start:
+        query = query.filter(R.day >= start)
+    if end:
+        query = query.filter(R.day <= end)
+    per_key = {}
+    for key, bucket, count, total in query.group_by(R.key, R.bucket):
+        per_key.setdefault(key, {})[bucket] = (count, total)
+    result = {key: summarize_buckets(buckets) for key, buckets in per_key.items()}
+    _response_time_cache[cache_key] = (time.monotonic(), result)
+    return result
+
+def format_duration(seconds):
+    if seconds is None:
+        return "N/A"
+    if seconds < 60:
+        return f"{int(seconds)}s"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f}h"
+    return f"{seconds / 86400:.1f}d"
+
+def backfill_response_times(batch_size=5000):
+    # Recompute first responses and all histograms from the Reply/Message tables
+    db.session.execute(db.delete(ResponseTimeBucket))
+    first_reply = db.session.query(
+        Reply.message_id.label("message_id"), db.func.min(Reply.id).label("reply_id")
+    ).group_by(Reply.message_id).subquery()
+    rows = db.session.query(
+        Message.id, Message.timestamp, Message.urgency, Reply.timestamp, Reply.agent_name
+    ).join(first_reply, first_reply.c.message_id == Message.id).join(
+        Reply, Reply.id == first_reply.c.reply_id
+    ).execution_options(yield_per=batch_size)
+
+    buckets = {}
+    updates = []
+    count = 0
+    for message_id, created_at, urgency, responded_at, agent_name in rows:
+        seconds = max(0.0, (responded_at - created_at).total_seconds())
+        updates.append({"mid": message_id, "at": responded_at, "seconds": seconds, "agent": agent_name})
+        for row in response_time_rows(seconds, responded_at, agent_name, urgency):
+            key = (row["dimension"], row["key"], row["day"], row["bucket"])
+            c, t = buckets.get(key, (0, 0.0))
+            buckets[key] = (c + 1, t + seconds)
+        count += 1
+    # Written after reading so the streaming cursor above stays undisturbed
+    M = Message.__table__
+    stmt = db.update(M).where(M.c.id == db.bindparam("mid")).values(
+        first_response_at=db.bindparam("at"),
+        first_response_seconds=db.bindparam("seconds"),
+        first_responder=db.bindparam("agent")
+    )
+    for i in range(0, len(updates), batch_size):
+        db.session.execute(stmt, updates[i:i + batch_size])
+    histogram_rows = [
+        {"dimension": d, "key": k, "day": day, "bucket": b, "count": c, "total_seconds": t}
+        for (d, k, day, b), (c, t) in buckets.items()
+    ]
+    for i in range(0, len(histogram_rows), batch_size):
+        db.session.execute(db.insert(ResponseTimeBucket), histogram_rows[i:i + batch_size])
+    mark_messages_changed()
+    return count
+
+# Analytics rollups
+# Trend queries read a few hundred MessageRollup rows instead of scanning Message. Hourly rows
+# are kept for ROLLUP_HOURLY_DAYS days, after which compaction merges them into daily rows.
+ROLLUP_COUNTERS = ['received', 'received_urgent', 'resolved', 'reopened', 'replies']
+ROLLUP_HOURLY_DAYS = int(os.environ.get('ROLLUP_HOURLY_DAYS', 7))
+ROLLUP_COMPACT_INTERVAL = 3600  # seconds between background compactions
+
+def hour_start(when):
+    return when.replace(minute=0, second=0, microsecond=0)
+
+def day_start(when):
+    return when.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def rollup_row(granularity, bucket_start, **counts):
+    row = {"granularity": granularity, "bucket_start": bucket_start}
+    row.update({counter: counts.get(counter, 0) for counter in ROLLUP_COUNTERS})
+    return row
+
+def rollup_add(rows):
+    upsert_increment(MessageRollup, ['granularity', 'bucket_start'], rows, ROLLUP_COUNTERS)
+
+def rollup_record(when=None, **counts):
+    # Count activity in the hourly bucket containing `when` (default: now)
+    rollup_add([rollup_row('hour', hour_start(when or datetime.utcnow()), **counts)])
+
+def rollup_status_change(old_status, new_status, count=1):
+    if old_status == new_status or not count:
+        return
+    if new_status == 'Resolved':
+        rollup_record(resolved=count)
+    else:
+        rollup_record(reopened=count)
+
+def rollup_messages(messages):
+    # New messages, bucketed by their own timestamps
+    buckets = {}
+    for message in messages:
+        bucket = buckets.setdefault(hour_start(message.timestamp), {"received": 0, "received_urgent": 0})
+        bucket["received"] += 1
+        if message.urgency == 'Urgent':
+            bucket["received_urgent"] += 1
+    rollup_add([rollup_row('hour', start, **counts) for start, counts in buckets.items()])
+
+def compact_rollups(now=None):
+    # Fold hourly rows older than the retention window into daily rows. DELETE ... RETURNING
+    # makes each hourly row count exactly once even if two workers compact at the same time.
+    cutoff = day_start((now or datetime.utcnow()) - timedelta(days=ROLLUP_HOURLY_DAYS))
+    R = MessageRollup
+    deleted = db.session.execute(
+        db.delete(R).where(R.granularity == 'hour', R.bucket_start < cutoff).returning(
+            R.bucket_start, *[getattr(R, counter) for counter in ROLLUP_COUNTERS]
+        )
+    ).all()
+    days = {}
+    for row in deleted:
+        totals = days.setdefault(day_start(row[0]), dict.fromkeys(ROLLUP_COUNTERS, 0))
+        for counter, value in zip(ROLLUP_COUNTERS, row[1:]):
+            totals[counter] += value
+    rollup_add([rollup_row('day', start, **totals) for start, totals in days.items()])
+    return len(deleted)
+
+def rebuild_rollups():
+    # Recompute rollups from Message/Reply. Transition history isn't stored, so a message that is
+    # Resolved now counts as resolved at its last update time.
+    db.session.execute(db.delete(MessageRollup))
+    buckets = {}
+
+    def truncate_hour(column):
+        if db.engine.dialect.name == 'postgresql':
+            return db.func.date_trunc('hour', column)
+        return db.func.strftime('%Y-%m-%d %H:00:00', column)
+
+    def add(start, counter, value):
+        if start is None:
+            return
+        if isinstance(start, str):
+            start = datetime.fromisoformat(start)
+        buckets.setdefault(start, dict.fromkeys(ROLLUP_COUNTERS, 0))[counter] += value
+
+    hour = truncate_hour(Message.timestamp)
+    for start, received, urgent in db.session.query(
+        hour, db.func.count(Message.id), db.func.sum(db.case((Message.urgency == 'Urgent', 1), else_=0))
+    ).group_by(hour):
+        add(start, "received", received)
+        add(start, "received_urgent", urgent or 0)
+    resolved_hour = truncate_hour(Message.updated_at)
+    for start, resolved in db.session.query(resolved_hour, db.func.count(Message.id)).filter(
+        Message.status == 'Resolved'
+    ).group_by(resolved_hour):
+        add(start, "resolved", resolved)
+    reply_hour = truncate_hour(Reply.timestamp)
+    for start, replies in db.session.query(reply_hour, db.func.count(Reply.id)).group_by(reply_hour):
+        add(start, "replies", replies)
+    rollup_add([rollup_row('hour', start, **counts) for start, counts in buckets.items()])
+    compact_rollups()
+
+def rollup_series(granularity, start, end):
+    # Zero-filled buckets from start to end (inclusive) with derived rates and the open backlog
+    R = MessageRollup
+    step = timedelta(hours=1) if granularity == 'hour' else timedelta(days=1)
+    floor = hour_start if granularity == 'hour' else day_start
+    start, end = floor(start), floor(end)
+    columns = [db.func.sum(getattr(R, counter)) for counter in ROLLUP_COUNTERS]
+
+    buckets = {}
+    if granularity == 'hour':
+        rows = db.session.query(R.bucket_start, *columns).filter(
+            R.granularity == 'hour', R.bucket_start >= start, R.bucket_start < end + step
+        ).group_by(R.bucket_start)
+        for row in rows:
+            buckets[row[0]] = dict(zip(ROLLUP_COUNTERS, row[1:]))
+    else:
+        # Daily rows plus hourly rows not compacted yet
+        for row in db.session.query(R.granularity, R.bucket_start, *columns).filter(
+            R.bucket_start >= start, R.bucket_start < end + step
+        ).group_by(R.granularity, R.bucket_start):
+            totals = buckets.setdefault(day_start(row[1]), dict.fromkeys(ROLLUP_COUNTERS, 0))
+            for counter, value in zip(ROLLUP_COUNTERS, row[2:]):
+                totals[counter] += value or 0
+
+    # Backlog walks back from today's open count using the net change of every later bucket
+    later = db.session.query(
+        db.func.sum(R.received), db.func.sum(R.resolved), db.func.sum(R.reopened)
+    ).filter(R.bucket_start >= end + step).one()
+    backlog = count_messages(status='Open') - ((later[0] or 0) - (later[1] or 0) + (later[2] or 0))
+
+    series = []
+    bucket = end
+    while bucket >= start:
+        counts = buckets.get(bucket) or dict.fromkeys(ROLLUP_COUNTERS, 0)
+        counts = {counter: counts.get(counter) or 0 for counter in ROLLUP_COUNTERS}
+        series.append({
+            "bucket_start": bucket.isoformat(),
+            **counts,
+            "urgent_share": round(counts["received_urgent"] / counts["received"], 3) if counts["received"] else None,
+            "resolution_rate": round(counts["resolved"] / counts["received"], 3) if counts["received"] else None,
+            "backlog": max(0, backlog)
+        })
+        backlog -= counts["received"] - counts["resolved"] + counts["reopened"]
+        bucket -= step
+    series.reverse()
+    return series
+
+_rollup_compactor = None
+
+def start_rollup_compactor():
+    # Background thread that compacts old hourly rollups once an hour
+    global _rollup_compactor
+    if _rollup_compactor is not None:
+        return
+
+    def run():
+        while True:
+            with app.app_context():
+                try:
+                    compact_rollups()
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception("Rollup compaction failed")
+            time.sleep(ROLLUP_COMPACT_INTERVAL)
+
+    _rollup_compactor = threading.Thread(target=run, name="rollup-compactor", daemon=True)
+    _rollup_compactor.start()
+
+# Urgency detection
+# Keywords are compiled into one case-insensitive alternation regex with word boundaries,
+# so "issue" no longer fires inside "tissue". A trailing * allows any word ending ("delay*" matches "delayed").
+# Weights add up per message; a message is Urgent when the score reaches the threshold.
+DEFAULT_URGENCY_RULES = {
+    "threshold": 1.0,
+    "keywords": {
+        "loan*": 1.0, "approval*": 1.0, "disburs*": 1.0, "delay*": 1.0, "urgent*": 1.0,
+        "help": 1.0, "problem*": 1.0, "money": 1.0, "issue*": 1.0
+    }
+}
+URGENCY_RULES_FILE = os.environ.get(
+    'URGENCY_KEYWORDS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'urgency_keywords.json')
+)
+URGENCY_RELOAD_INTERVAL = 5  # seconds between checks of the rules file
+
+UrgencyResult = namedtuple('UrgencyResult', ['urgency', 'score', 'terms', 'source'], defaults=['rules'])
+
+class UrgencyMatcher:
+    def __init__(self, keywords, threshold):
+        self.threshold = float(threshold)
+        self.keywords = []
+        self.weights = []
+        parts = []
+        # Longest keywords first so phrases win over the single words inside them
+        for keyword, weight in sorted(keywords.items(), key=lambda item: -len(item[0])):
+            term = keyword.strip().lower()
+            prefix = term.endswith('*')
+            term = term.rstrip('*').strip()
+            if not term:
+                continue
+            pattern = r'\s+'.join(re.escape(word) for word in term.split())
+            if prefix:
+                pattern += r'\w*'
+            parts.append(f'(?P<k{len(self.keywords)}>{pattern})')
+            self.keywords.append(keyword.strip().lower())
+            self.weights.append(float(weight))
+        self.regex = re.compile(r'\b(?:' + '|'.join(parts) + r')\b', re.IGNORECASE) if parts else None
+
+    def _result(self, matches):
+        score = 0.0
+        terms = []
+        for index in matches:
+            score += self.weights[index]
+            terms.append(self.keywords[index])
+        urgency = "Urgent" if terms and score >= self.threshold else "Normal"
+        return UrgencyResult(urgency, score, terms)
+
+    def _indexes(self, match):
+        return int(match.lastgroup[1:])
+
+    def score(self, text):
+        if not self.regex or not text:
+            return UrgencyResult("Normal", 0.0, [])
+        # Each keyword counts once per message, in order of first appearance
+        found = dict.fromkeys(self._indexes(m) for m in self.regex.finditer(text))
+        return self._result(found)
+
+    def score_batch(self, texts):
+        # One regex pass over all texts joined together; match offsets map back to their row
+        texts = [text or "" for text in texts]
+        if not self.regex or not texts:
+            return [UrgencyResult("Normal", 0.0, []) for _ in texts]
+        starts = []
+        position = 0
+        for text in texts:
+            starts.append(position)
+            position += len(text) + 1
+        found = [dict() for _ in texts]
+        for match in self.regex.finditer("\n".join(texts)):
+            row = bisect.bisect_right(starts, match.start()) - 1
+            found[row][self._indexes(match)] = None
+        return [self._result(matches) for matches in found]
+
+_urgency_matcher = None
+_urgency_rules_mtime = None
+_urgency_checked_at = 0.0
+_urgency_lock = threading.Lock()
+
+def load_urgency_rules(path=None):
+    # Rules file is JSON: {"threshold": 1.0, "keywords": {"keyword": weight, ...}}
+    path = path or URGENCY_RULES_FILE
+    try:
+        with open(path, encoding='utf-8') as f:
+            rules = json.load(f)
+        keywords = rules.get("keywords") or {}
+        if isinstance(keywords, list):
+            keywords = {keyword: 1.0 for keyword in keywords}
+        return UrgencyMatcher(keywords, rules.get("threshold", 1.0))
+    except (OSError, ValueError, AttributeError, TypeError) as e:
+        if os.path.exists(path):
+            app.logger.warning("Could not load urgency rules from %s: %s", path, e)
+        return UrgencyMatcher(DEFAULT_URGENCY_RULES["keywords"], DEFAULT_URGENCY_RULES["threshold"])
+
+def get_urgency_matcher():
+    # Reload when the rules file changes, checking its mtime at most every few seconds
+    global _urgency_matcher, _urgency_rules_mtime, _urgency_checked_at
+    now = time.monotonic()
+    if _urgency_matcher is not None and now - _urgency_checked_at < URGENCY_RELOAD_INTERVAL:
+        return _urgency_matcher
+    with _urgency_lock:
+        _urgency_checked_at = now
+        try:
+            mtime = os.path.getmtime(URGENCY_RULES_FILE)
+        except OSError:
+            mtime = None
+        if _urgency_matcher is None or mtime != _urgency_rules_mtime:
+            _urgency_matcher = load_urgency_rules()
+            _urgency_rules_mtime = mtime
+    return _urgency_matcher
+
+def reload_urgency_rules():
+    global _urgency_checked_at, _urgency_rules_mtime
+    with _urgency_lock:
+        _urgency_checked_at = 0.0
+        _urgency_rules_mtime = object()  # force a reload on next use
+    return get_urgency_matcher()
+
+def score_urgency(text):
+    return classify_urgency([text], [get_urgency_matcher().score(text)])[0]
+
 def detect_urgency(text):
-    urgent_keywords = ["loan", "approval", "disbursement", "delay", "urgent", "help", "problem", "money","issue"]
-    for word in urgent_keywords:
-        if word.lower() in text.lower():
-            return "Urgent"
-    return "Normal"
+    return score_urgency(text).urgency
+
+def detect_urgency_batch(texts):
+    return classify_urgency(texts, get_urgency_matcher().score_batch(texts))
+
+# Urgency model
+# Learned replacement for the keyword threshold: naive Bayes over word unigrams and bigrams, hashed
+# into 2**bits buckets, trained offline from resolved messages (flask train-urgency-model). The file
+# is a one-line JSON header followed by one float32 log-odds weight per bucket. It is memory-mapped, so
+# all workers share one copy, and reloaded when it changes. While a model is loaded it decides Urgent
+# vs Normal (score = probability); the keyword rules still supply urgency_terms and take over again
+# when there is no model file or it can't be read. Batches (CSV import chunks) are scored with one
+# numpy gather and bincount when numpy is installed.
+URGENCY_MODEL_FILE = os.environ.get('URGENCY_MODEL_FILE', os.path.join(app.instance_path, 'urgency_model.bin'))
+URGENCY_MODEL_FORMAT = "urgency-nb-1"
+URGENCY_MODEL_MIN_EXAMPLES = 20  # Per class
+URGENCY_REVIEWED_SOURCES = ('agent', 'import')  # Labels a person chose rather than a detector
+
+def urgency_features(text, mask):
+    # Bucket numbers of the text's words and word pairs, each counted once
+    words = normalized_words(text or "")
+    grams = itertools.chain(words, (f"{a} {b}" for a, b in zip(words, words[1:])))
+    return {zlib.crc32(gram.encode()) & mask for gram in grams}
+
+class UrgencyModel:
+    def __init__(self, weights, bias, threshold=0.5, info=None):
+        # weights: 2**bits log P(feature|Urgent) - log P(feature|Normal); bias: log prior odds
+        self.weights = weights
+        self.mask = len(weights) - 1
+        self.bias = bias
+        self.threshold = threshold
+        self.info = info or {}
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offset = mapped.find(b"\n") + 1
+        header = json.loads(mapped[:offset])
+        if header.get("format") != URGENCY_MODEL_FORMAT:
+            raise ValueError(f"unknown model format {header.get('format')!r}")
+        size = 1 << header["bits"]
+        if numpy is not None:
+            weights = numpy.frombuffer(mapped, dtype="<f4", count=size, offset=offset)
+        elif sys.byteorder == "little":
+            weights = memoryview(mapped)[offset:offset + 4 * size].cast("f")
+        else:
+            weights = array("f", mapped[offset:offset + 4 * size])
+            weights.byteswap()
+        if len(weights) != size:
+            raise ValueError("truncated model file")
+        return cls(weights, header["bias"], header["threshold"], header)
+
+    def save(self, path):
+        # Written next to the target and renamed over it: workers still mapping the old file keep it
+        weights = array("f", self.weights)
+        if sys.byteorder != "little":
+            weights.byteswap()
+        header = json.dumps(dict(self.info, format=URGENCY_MODEL_FORMAT, bits=self.mask.bit_length(),
+                                 bias=self.bias, threshold=self.threshold))
+        header += " " * (-(len(header) + 1) % 4)  # Keep the weights 4-byte aligned
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(header.encode() + b"\n")
+            weights.tofile(f)
+        os.replace(temporary, path)
+
+    def probabilities(self, texts):
+        rows = [urgency_features(text, self.mask) for text in texts]
+        if numpy is not None and isinstance(self.weights, numpy.ndarray) and len(rows) > 1:
+            lengths = [len(row) for row in rows]
+            buckets = numpy.fromiter(itertools.chain.from_iterable(rows), dtype=numpy.int64, count=sum(lengths))
+            owners = numpy.repeat(numpy.arange(len(rows)), lengths)
+            logits = numpy.bincount(owners, weights=self.weights[buckets], minlength=len(rows)) + self.bias
+            return (1 / (1 + numpy.exp(-numpy.clip(logits, -50, 50)))).tolist()
+        weights = self.weights
+        return [1 / (1 + math.exp(-max(-50, min(50, self.bias + sum(weights[b] for b in row))))) for row in rows]
+
+    def classify(self, texts, results):
+        # results: the keyword rules' UrgencyResults for the same texts (for their terms)
+        return [
+            UrgencyResult("Urgent", probability, result.terms, "model") if probability > self.threshold
+            else UrgencyResult("Normal", probability, [], "model")
+            for probability, result in zip(self.probabilities(texts), results)
+        ]
+
+_urgency_model = None
+_urgency_model_mtime = None
+_urgency_model_checked_at = None
+_urgency_model_lock = threading.Lock()
+
+def get_urgency_model():
+    # Same change detection as the rules file; None when there is no usable model
+    global _urgency_model, _urgency_model_mtime, _urgency_model_checked_at
+    now = time.monotonic()
+    if _urgency_model_checked_at is not None and now - _urgency_model_checked_at < URGENCY_RELOAD_INTERVAL:
+        return _urgency_model
+    with _urgency_model_lock:
+        _urgency_model_checked_at = now
+        try:
+            mtime = os.path.getmtime(URGENCY_MODEL_FILE)
+        except OSError:
+            mtime = None
+        if mtime != _urgency_model_mtime:
+            _urgency_model_mtime = mtime
+            _urgency_model = None
+            if mtime is not None:
+                try:
+                    _urgency_model = UrgencyModel.load(URGENCY_MODEL_FILE)
+                except (OSError, ValueError, KeyError) as e:
+                    app.logger.warning("Could not load urgency model from %s: %s", URGENCY_MODEL_FILE, e)
+    return _urgency_model
+
+def reload_urgency_model():
+    global _urgency_model_checked_at, _urgency_model_mtime
+    with _urgency_model_lock:
+        _urgency_model_checked_at = None
+        _urgency_model_mtime = object()
+    return get_urgency_model()
+
+def classify_urgency(texts, results):
+    model = get_urgency_model()
+    return model.classify(texts, results) if model is not None else results
+
+def urgency_metrics(predicted, actual):
+    # Urgent is the positive class
+    pairs = list(zip(predicted, actual))
+    hits = sum(1 for p, a in pairs if p == a == "Urgent")
+    flagged = sum(1 for p, a in pairs if p == "Urgent")
+    urgent = sum(1 for p, a in pairs if a == "Urgent")
+    precision = hits / flagged if flagged else 0.0
+    recall = hits / urgent if urgent else 0.0
+    return {
+        "examples": len(pairs),
+        "accuracy": round(sum(1 for p, a in pairs if p == a) / len(pairs), 4) if pairs else None,
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0
+    }
+
+def train_urgency_model(labels="reviewed", bits=18, threshold=0.5, holdout=10, alpha=1.0, batch_size=5000):
+    # Naive Bayes with binary features and add-alpha smoothing from resolved messages. labels:
+    # 'reviewed' (urgency chosen by an agent or an import file) or 'all'. Every holdout-th message
+    # (by id) is kept out of training and used to compare the model with the keyword rules.
+    # Returns (model, report); raises ValueError without enough examples of both classes.
+    size = 1 << bits
+    mask = size - 1
+    counts = {"Urgent": [0] * size, "Normal": [0] * size}
+    documents = {"Urgent": 0, "Normal": 0}
+    held_out = []
+    query = db.select(Message.id, Message.message_text, Message.urgency).where(
+        Message.status == 'Resolved', Message.urgency.in_(documents)
+    )
+    if labels == "reviewed":
+        query = query.where(Message.urgency_source.in_(URGENCY_REVIEWED_SOURCES))
+    for message_id, text, urgency in db.session.execute(query.execution_options(yield_per=batch_size)):
+        if holdout and message_id % holdout == 0:
+            held_out.append((text, urgency))
+            continue
+        documents[urgency] += 1
+        class_counts = counts[urgency]
+        for bucket in urgency_features(text, mask):
+            class_counts[bucket] += 1
+    if min(documents.values()) < URGENCY_MODEL_MIN_EXAMPLES:
+        raise ValueError(f"Need at least {URGENCY_MODEL_MIN_EXAMPLES} resolved Urgent and Normal messages "
+                         f"with {labels} labels, have {documents}")
+    
+    urgent_total = sum(counts["Urgent"]) + alpha * size
+    normal_total = sum(counts["Normal"]) + alpha * size
+    offset = math.log(normal_total / urgent_total)
+    weights = array("f", (
+        math.log((u + alpha) / (n + alpha)) + offset for u, n in zip(counts["Urgent"], counts["Normal"])
+    ))
+    report = {"labels": labels, "trained_on": documents, "trained_at": datetime.utcnow().isoformat()}
+    model = UrgencyModel(weights, math.log(documents["Urgent"] / documents["Normal"]), threshold, report)
+    if held_out:
+        texts = [text for text, urgency in held_out]
+        actual = [urgency for text, urgency in held_out]
+        rules = get_urgency_matcher().score_batch(texts)
+        report["holdout"] = {
+            "model": urgency_metrics([r.urgency for r in model.classify(texts, rules)], actual),
+            "rules": urgency_metrics([r.urgency for r in rules], actual)
+        }
+    return model, report
+
+def set_message_urgency(message, urgency):
+    # An agent's correction: also a reviewed label for the next training run
+    message.urgency_source = 'agent'
+    if message.urgency == urgency:
+        return
+    delta = 1 if urgency == 'Urgent' else -1
+    rollup_record(message.timestamp, received_urgent=delta)
+    message.urgency = urgency
+    db.session.flush()
+    rebuild_conversation_summaries([message.customer_id])
+
+# Static assets and page shells
+# Page CSS and JS live in static/ and are linked with asset_url(), which names them by content hash
+# (/assets/css/dashboard.<hash>.css): browsers keep them for a year without revalidating and an
+# edited file simply gets a new URL. Pages are plain shells that load their data from the API, so
+# each is rendered once per process. Assets and shells are compressed once, gzip and (with the
+# optional brotli package) br, and served in the best encoding the client accepts. Shells are
+# revalidated on every load (If-None-Match -> 304), so a returning agent downloads a few hundred
+# bytes. With app.debug nothing is cached and edits show up immediately.
+ASSET_MAX_AGE = 365 * 86400
+ASSET_HASH_LENGTH = 12
+
+Precompressed = namedtuple('Precompressed', ['identity', 'gzip', 'br', 'digest'])
+Asset = namedtuple('Asset', ['path', 'hashed_path', 'mimetype', 'body'])
+_assets = {}  # static/ path -> Asset
+_asset_paths = {}  # hashed path -> static/ path
+_page_shells = {}  # template name -> Precompressed
+
+def precompress(data):
+    return Precompressed(
+        data,
+        gzip.compress(data, 9, mtime=0),
+        brotli.compress(data, quality=11) if brotli is not None else None,
+        hashlib.sha256(data).hexdigest()[:ASSET_HASH_LENGTH]
+    )
+
+def precompressed_response(body, mimetype, cache_control):
+    if body.br is not None and request.accept_encodings["br"] > 0:
+        data, encoding = body.br, "br"
+    elif request.accept_encodings["gzip"] > 0:
+        data, encoding = body.gzip, "gzip"
+    else:
+        data, encoding = body.identity, None
+    response = Response(data, mimetype=mimetype)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.set_etag(f"{body.digest}-{encoding or 'identity'}")
+    response.headers["Cache-Control"] = cache_control
+    return response.make_conditional(request)
+
+def load_asset(path):
+    # path relative to static/; raises OSError if there is no such file
+    asset = None if app.debug else _assets.get(path)
+    if asset is None:
+        full_path = safe_join(app.static_folder, path)
+        if full_path is None:
+            raise FileNotFoundError(path)
+        with open(full_path, "rb") as f:
+            body = precompress(f.read())
+        stem, extension = os.path.splitext(path)
+        asset = Asset(path, f"{stem}.{body.digest}{extension}",
+                      mimetypes.guess_type(path)[0] or "application/octet-stream", body)
+        _assets[path] = asset
+        _asset_paths[asset.hashed_path] = path
+    return asset
+
+def asset_url(path):
+    return url_for('static_asset', filename=load_asset(path).hashed_path)
+
+app.jinja_env.globals['asset_url'] = asset_url
+
+def render_page(template):
+    # Page shells take no per-request context: the first render is kept for the life of the process
+    body = None if app.debug else _page_shells.get(template)
+    if body is None:
+        body = precompress(render_template(template).encode("utf-8"))
+        _page_shells[template] = body
+    return precompressed_response(body, "text/html", "private, no-cache")
+
+@app.route("/assets/<path:filename>")
+def static_asset(filename):
+    path = _asset_paths.get(filename)
+    if path is None:
+        # Not a hash this process handed out (another worker's newer page, or a stale link):
+        # serve the current file, but don't let it be cached under this name
+        stem, extension = os.path.splitext(filename)
+        path = stem.rsplit(".", 1)[0] + extension
+    try:
+        asset = load_asset(path)
+    except OSError:
+        return jsonify({"error": "Not found"}), 404
+    cache_control = f"public, max-age={ASSET_MAX_AGE}, immutable" if asset.hashed_path == filename else "no-cache"
+    return precompressed_response(asset.body, asset.mimetype, cache_control)
 
 # Page routes
 @app.route("/")
 def index():
-    return render_template("index.html")
+    return render_page("index.html")
 
 @app.route("/login")
 def login():
-    return render_template("login.html")
+    return render_page("login.html")
 
 @app.route("/register")
 def register():
-    return render_template("registration.html")
+    return render_page("registration.html")
 
 @app.route("/customer")
 def customer():
     # Check if user is logged in as customer
     if session.get('role') != 'customer':
         return redirect(url_for('login'))
-    return render_template("customer.html")
+    return render_page("customer.html")
 
 @app.route("/dashboard")
 def dashboard():
     # Check if user is logged in as agent
     if session.get('role') != 'agent':
         return redirect(url_for('login'))
-    return render_template("dashboard.html")
+    return render_page("dashboard.html")
 
 @app.route("/agent/chat/<int:conversation_id>")
 def agent_chat(conversation_id):
     # Check if user is logged in as agent
     if session.get('role') != 'agent':
         return redirect(url_for('login'))
-    return render_template("agentchat.html", conversation_id=conversation_id)
+    return render_page("agentchat.html")  # The page reads the conversation id from its URL
 
 @app.route("/agent/analytics")
 def agent_analytics_page():
     if session.get('role') != 'agent':
         return redirect(url_for('login'))
-    return render_template("analytics.html")
+    return render_page("analytics.html")
 
 @app.route("/agent/upload")
 def agent_upload_page():
     if session.get('role') != 'agent':
         return redirect(url_for('login'))
-    return render_template("upload.html")
+    return render_page("upload.html")
 
 @app.route("/agent/settings")
 def agent_settings_page():
     if session.get('role') != 'agent':
         return redirect(url_for('login'))
-    return render_template("settings.html")
+    return render_page("settings.html")
 
 # Authentication endpoints
 @app.route("/api/login", methods=["POST"])
@@ -186,6 +2058,300 @@ def api_register():
         }
     })
 
+# Duplicate detection
+# Every message gets a fingerprint: a SHA-1 of its normalized text (case, accents, punctuation and
+# spacing ignored) and a 64-bit SimHash of its words. A customer message identical to
+# one of their open messages from the last DEDUP_WINDOW_HOURS is not stored again: it is folded into
+# that message (duplicate_count, last_duplicate_at). One that differs in only a few SimHash bits
+# (DEDUP_SIMHASH_DISTANCE) is stored with duplicate_of pointing at it. Imports skip every row whose
+# text the customer already has in a live message, so uploading the same file twice adds nothing.
+# Lookups only read the customer's own rows (ix_message_customer_timestamp / _content_hash). Without
+# INGEST_BATCHING two identical messages arriving at the same moment can both be stored.
+DEDUP_WINDOW_HOURS = float(os.environ.get('DEDUP_WINDOW_HOURS', 24))  # 0 = never fold live messages
+DEDUP_SIMHASH_DISTANCE = int(os.environ.get('DEDUP_SIMHASH_DISTANCE', 8))  # -1 = no near duplicates
+DEDUP_MIN_WORDS = 4  # Shorter messages are only matched exactly
+SIMHASH_BITS = 64
+SIMHASH_MASK = (1 << SIMHASH_BITS) - 1
+SIMHASH_MAX_FEATURES = 65535  # Vote counters are 16 bits wide
+WORD_PATTERN = re.compile(r"\w+")
+
+def normalized_words(text):
+    if text.isascii():
+        return WORD_PATTERN.findall(text.lower())
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return WORD_PATTERN.findall("".join(c for c in text if not unicodedata.combining(c)))
+
+@functools.lru_cache(maxsize=65536)
+def simhash_feature(feature):
+    # The feature's 64-bit hash with every bit widened to a 16-bit counter, so adding these up
+    # counts the votes for all bits at once
+    bits = format(int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big"), "064b")
+    return int.from_bytes(bits.replace("0", "\0\0").replace("1", "\0\1").encode("latin-1"), "big")
+
+def simhash(features):
+    # Signed so it fits a BIGINT column
+    features = features[:SIMHASH_MAX_FEATURES]
+    votes = struct.unpack(f">{SIMHASH_BITS}H", sum(map(simhash_feature, features)).to_bytes(2 * SIMHASH_BITS, "big"))
+    value = int("".join("1" if 2 * count > len(features) else "0" for count in votes), 2)
+    return value - (1 << SIMHASH_BITS) if value >> (SIMHASH_BITS - 1) else value
+
+def hamming_distance(a, b):
+    return bin((a ^ b) & SIMHASH_MASK).count("1")
+
+def message_fingerprint(text):
+    # (content_hash, simhash); simhash is None for messages too short to compare loosely
+    words = normalized_words(text)
+    digest = hashlib.sha1(" ".join(words).encode()).hexdigest()
+    if len(words) < DEDUP_MIN_WORDS:
+        return digest, None
+    return digest, simhash(words)
+
+def find_duplicates(values, any_status=False):
+    # Fingerprints Message insert values in place and matches them against the customers' stored
+    # messages. Returns (folds, repeats): {index: id of the stored message with the same text} and
+    # {index: index of an earlier value with the same text}; the rest are new. Near duplicates of a
+    # recent open message get duplicate_of. any_status: exact matches count against every live
+    # message of the customer, not just recent open ones (imports).
+    for value in values:
+        value["content_hash"], value["simhash"] = message_fingerprint(value["message_text"])
+    customer_ids = sorted({value["customer_id"] for value in values})
+    recent = {}  # customer_id -> [(id, content_hash, simhash)], newest first
+    stored = {}  # (customer_id, content_hash) -> id
+    if DEDUP_WINDOW_HOURS > 0:
+        since = datetime.utcnow() - timedelta(hours=DEDUP_WINDOW_HOURS)
+        for chunk in id_chunks(customer_ids):
+            rows = db.session.query(Message.id, Message.customer_id, Message.content_hash, Message.simhash).filter(
+                Message.customer_id.in_(chunk), Message.status == 'Open', Message.timestamp >= since
+            ).order_by(Message.timestamp.desc(), Message.id.desc())
+            for message_id, customer_id, digest, fingerprint in rows:
+                recent.setdefault(customer_id, []).append((message_id, digest, fingerprint))
+                stored.setdefault((customer_id, digest), message_id)
+    if any_status:
+        digests = sorted({value["content_hash"] for value in values})
+        for chunk in id_chunks(customer_ids):
+            for digest_chunk in id_chunks(digests):
+                rows = db.session.query(Message.id, Message.customer_id, Message.content_hash).filter(
+                    Message.customer_id.in_(chunk), Message.content_hash.in_(digest_chunk)
+                )
+                for message_id, customer_id, digest in rows:
+                    stored.setdefault((customer_id, digest), message_id)
+    
+    folds, repeats, first = {}, {}, {}
+    for index, value in enumerate(values):
+        key = (value["customer_id"], value["content_hash"])
+        if key in stored:
+            folds[index] = stored[key]
+        elif key in first:
+            repeats[index] = first[key]
+        else:
+            first[key] = index
+            value["duplicate_of"] = None
+            if value["simhash"] is not None and DEDUP_SIMHASH_DISTANCE >= 0:
+                value["duplicate_of"] = next((
+                    message_id for message_id, digest, fingerprint in recent.get(value["customer_id"], [])
+                    if fingerprint is not None and hamming_distance(fingerprint, value["simhash"]) <= DEDUP_SIMHASH_DISTANCE
+                ), None)
+    return folds, repeats
+
+def fold_duplicates(counts):
+    # counts: {message_id: identical messages received}
+    M = Message.__table__
+    db.session.execute(
+        db.update(M).where(M.c.id == db.bindparam("mid")).values(
+            duplicate_count=db.func.coalesce(M.c.duplicate_count, 0) + db.bindparam("n"),
+            last_duplicate_at=datetime.utcnow()
+        ),
+        [{"mid": message_id, "n": n} for message_id, n in counts.items()]
+    )
+
+def backfill_fingerprints(batch_size=5000):
+    # Messages stored before fingerprints existed; returns how many were filled in
+    M = Message.__table__
+    count = 0
+    while True:
+        rows = db.session.execute(
+            db.select(M.c.id, M.c.message_text).where(M.c.content_hash.is_(None)).limit(batch_size)
+        ).all()
+        if not rows:
+            return count
+        updates = []
+        for message_id, text in rows:
+            digest, fingerprint = message_fingerprint(text)
+            updates.append({"mid": message_id, "digest": digest, "fingerprint": fingerprint})
+        db.session.execute(
+            db.update(M).where(M.c.id == db.bindparam("mid")).values(
+                content_hash=db.bindparam("digest"), simhash=db.bindparam("fingerprint")
+            ).execution_options(synchronize_session=False),
+            updates
+        )
+        db.session.commit()
+        count += len(rows)
+
+# Message ingestion
+# New customer messages are written with one INSERT ... RETURNING plus the summary and rollup
+# updates (insert_messages). With INGEST_BATCHING=1 a writer thread per process collects what
+# arrives within INGEST_FLUSH_MS (up to INGEST_BATCH_SIZE messages) and commits it as one
+# transaction, so a burst costs one commit per batch instead of one per message; each request
+# waits for its batch and still answers with its message's id and timestamp. A full queue answers
+# 429 rather than letting requests pile up behind the single SQLite writer. MESSAGE_RATE_PER_MINUTE
+# caps how fast one customer can post (token bucket per process, with MESSAGE_RATE_BURST).
+INGEST_BATCHING = os.environ.get('INGEST_BATCHING', '0') == '1'
+INGEST_FLUSH_MS = float(os.environ.get('INGEST_FLUSH_MS', 5))
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 200))
+INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', 2000))
+INGEST_WAIT_SECONDS = 30  # How long a request waits for its batch to commit
+MESSAGE_RATE_PER_MINUTE = float(os.environ.get('MESSAGE_RATE_PER_MINUTE', 0))  # 0 = unlimited
+MESSAGE_RATE_BURST = int(os.environ.get('MESSAGE_RATE_BURST', 10))
+
+class RateLimiter:
+    # Token bucket per key. Buckets that have refilled completely are dropped when the table grows,
+    # so memory is bounded by the number of recently active keys.
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self._buckets = {}
+        self._prune_at = 10000
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        # 0 if allowed, otherwise seconds until the key has a token again
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self._prune_at:
+                refill = self.burst / self.rate
+                self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < refill}
+                self._prune_at = max(10000, 2 * len(self._buckets))
+            return 0
+
+message_rate_limiter = RateLimiter(MESSAGE_RATE_PER_MINUTE, MESSAGE_RATE_BURST)
+
+MESSAGE_RETURNING = (Message.id, Message.customer_id, Message.message_text, Message.urgency,
+                     Message.urgency_terms, Message.status, Message.timestamp)
+
+def insert_messages(values):
+    # Insert, fold into summaries and rollups, commit; returns a (row, duplicate) pair per value, in
+    # order. A value repeating an open message gets that message's row (MESSAGE_RETURNING) back with
+    # duplicate=True instead of being inserted (see find_duplicates).
+    folds, repeats = find_duplicates(values)
+    new = [index for index in range(len(values)) if index not in folds and index not in repeats]
+    inserted = db.session.execute(
+        db.insert(Message).returning(*MESSAGE_RETURNING, sort_by_parameter_order=True), [values[i] for i in new]
+    ).all() if new else []
+    ids = dict(zip(new, (row.id for row in inserted)))
+    ids.update(folds)
+    ids.update((index, ids[earlier]) for index, earlier in repeats.items())
+    rows = {row.id: row for row in inserted}
+    if folds or repeats:
+        fold_duplicates(Counter(ids[index] for index in itertools.chain(folds, repeats)))
+        rows.update((row.id, row) for row in db.session.execute(
+            db.select(*MESSAGE_RETURNING).where(Message.id.in_({ids[index] for index in folds}))
+        ))
+    summary_add_messages(inserted)
+    rollup_messages(inserted)
+    db.session.commit()
+    return [(rows[ids[index]], index in folds or index in repeats) for index in range(len(values))]
+
+def publish_new_messages(rows):
+    # "message" events for the rows from insert_messages, plus one inbox update per conversation
+    if not rows:
+        return
+    events = [(["agents", customer_channel(row.customer_id)], "message", {
+        "id": row.id,
+        "message_text": row.message_text,
+        "urgency": row.urgency,
+        "timestamp": row.timestamp.isoformat(),
+        "status": row.status,
+        "urgency_terms": row.urgency_terms.split(",") if row.urgency_terms else [],
+        "replies": [],
+        "customer_id": row.customer_id
+    }) for row in rows]
+    customer_ids = {row.customer_id for row in rows}
+    summaries = ConversationSummary.query.filter(ConversationSummary.customer_id.in_(customer_ids)).populate_existing()
+    customers = user_cache.get_many(customer_ids)
+    events += [(["agents"], "conversation", serialize_conversation(summary, customers[summary.customer_id]))
+               for summary in summaries if summary.customer_id in customers]
+    publish_events(events)
+
+class PendingMessage:
+    __slots__ = ("values", "done", "row", "duplicate", "error")
+
+    def __init__(self, values):
+        self.values = values
+        self.done = threading.Event()
+        self.row = None
+        self.duplicate = False
+        self.error = None
+
+class MessageBatcher:
+    # Group commit: requests enqueue, one writer thread drains the queue into batched transactions
+    def __init__(self, batch_size, flush_ms, queue_size):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_ms / 1000
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, values):
+        # Raises queue.Full when the writer can't keep up
+        with self._lock:
+            # Started lazily so each gunicorn worker gets its own writer, and again if it ever died
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+                self._thread.start()
+        pending = PendingMessage(values)
+        self.queue.put_nowait(pending)
+        return pending
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            # Nothing may escape the loop: a dead writer would leave every later message waiting
+            with app.app_context():
+                try:
+                    self._write(batch)
+                except Exception as exc:
+                    db.session.rollback()
+                    app.logger.exception("Message batch failed")
+                    for pending in batch:
+                        if not pending.done.is_set():
+                            pending.error = exc
+                            pending.done.set()
+
+    def _write(self, batch):
+        try:
+            rows = insert_messages([pending.values for pending in batch])
+        except Exception as exc:
+            db.session.rollback()
+            if len(batch) == 1:
+                app.logger.exception("Could not insert message")
+                batch[0].error = exc
+                batch[0].done.set()
+                return
+            # Isolate the bad message instead of failing the whole batch
+            for pending in batch:
+                self._write([pending])
+            return
+        for pending, (row, duplicate) in zip(batch, rows):
+            pending.row, pending.duplicate = row, duplicate
+            pending.done.set()
+        publish_new_messages([row for row, duplicate in rows if not duplicate])
+
+message_batcher = MessageBatcher(INGEST_BATCH_SIZE, INGEST_FLUSH_MS, INGEST_QUEUE_SIZE)
+
 # Customer chat functionality
 @app.route("/api/customer/message", methods=["POST"])
 def customer_send_message():
@@ -199,68 +2365,812 @@ def customer_send_message():
         return jsonify({"error": "Message text is required"}), 400
     
     # Find customer user
-    customer = db.session.get(User, session.get('user_id'))
+    customer = user_cache.get(session.get('user_id'))
     if not customer or customer.role != 'customer':
         return jsonify({"error": "Customer not found"}), 404
     
+    retry_after = message_rate_limiter.acquire(customer.id)
+    if retry_after:
+        return jsonify({"error": "You are sending messages too quickly, please wait a moment"}), 429, \
+            {"Retry-After": str(math.ceil(retry_after))}
+    
     # Create message with urgency detection
-    urgency = detect_urgency(message_text)
-    message = Message(
-        customer_id=customer.id,
-        message_text=message_text,
-        urgency=urgency
-    )
+    urgency = score_urgency(message_text)
+    values = {
+        "customer_id": customer.id,
+        "message_text": message_text,
+        "urgency": urgency.urgency,
+        "urgency_terms": ",".join(urgency.terms)[:255] or None,
+        "urgency_source": urgency.source,
+        "status": "Open",
+        "timestamp": datetime.utcnow()
+    }
     
-    db.session.add(message)
-    db.session.commit()
+    if INGEST_BATCHING:
+        # Written by the next group commit
+        try:
+            pending = message_batcher.submit(values)
+        except queue.Full:
+            return jsonify({"error": "We are receiving a lot of messages, please try again shortly"}), 429, \
+                {"Retry-After": "1"}
+        db.session.close()  # Hand the pooled connection back: the writer needs one while we wait
+        if not pending.done.wait(INGEST_WAIT_SECONDS) or pending.error is not None:
+            return jsonify({"error": "Message could not be saved, please try again"}), 503
+        message, duplicate = pending.row, pending.duplicate
+    else:
+        message, duplicate = insert_messages([values])[0]
+        if not duplicate:
+            publish_new_messages([message])
     
+    # A repeat of an open message answers with that message
     return jsonify({
         "success": True,
+        "duplicate": duplicate,
         "message": {
             "id": message.id,
             "message_text": message.message_text,
             "urgency": message.urgency,
+            "urgency_terms": message.urgency_terms.split(",") if message.urgency_terms else [],
             "timestamp": message.timestamp.isoformat()
         }
     })
 
-@app.route("/api/customer/messages", methods=["GET"])
-def customer_get_messages():
-    if session.get('role') != 'customer':
+@app.route("/api/customer/messages", methods=["GET"])
+def customer_get_messages():
+    if session.get('role') != 'customer':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    # Find customer user
+    customer = user_cache.get(session.get('user_id'))
+    if not customer or customer.role != 'customer':
+        return jsonify({"error": "Customer not found"}), 404
+    
+    scope = Message.query.filter_by(customer_id=customer.id)
+    change = latest_change(scope, Message.updated_at, Message.id)
+    etag, not_modified = not_modified_response(f"customer:{customer.id}", change)
+    if not_modified:
+        return not_modified
+    
+    # ?since=<cursor>: only messages that are new or changed (status, replies) after the cursor
+    since = request.args.get("since")
+    if since:
+        try:
+            after = parse_sync_cursor(since)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+        messages = iter_threads(
+            scope.filter(db.tuple_(Message.updated_at, Message.id) > after).order_by(Message.updated_at, Message.id)
+        )
+        response = stream_json(
+            (message_to_dict(msg) for msg in messages),
+            {"cursor": sync_cursor(*change) if change else since}, "messages"
+        )
+        return with_sync_headers(response, etag, change)
+    
+    # All messages for this customer, streamed with their replies in batches
+    messages = iter_threads(scope.order_by(Message.timestamp.desc()))
+    if wants_archived():
+        messages = itertools.chain(messages, archived_threads(customer.id, newest_first=True))
+    
+    return with_sync_headers(stream_json(message_to_dict(msg) for msg in messages), etag, change)
+
+# Delta sync and conditional GET
+# List endpoints return an X-Sync-Cursor header (the newest (updated_at, id) they included) and accept it
+# back as ?since= to get only what changed. ETag/Last-Modified come from the same newest change, so an
+# unchanged list answers 304 before any rows are loaded. Extra values after (updated_at, id), like the
+# inbox's archive generation, ride along in the cursor and the ETag.
+# updated_at comes from the app clock before commit, so a transaction that waited on the write lock can
+# commit rows older than a cursor already handed out. Deltas therefore rescan SYNC_RESCAN_SECONDS behind
+# the cursor (clients skip ids they already have), and lists only answer 304 once their newest change is
+# older than that window.
+SYNC_RESCAN_SECONDS = int(os.environ.get('SYNC_RESCAN_SECONDS', SQLITE_BUSY_TIMEOUT // 1000 + 15))
+
+def sync_cursor(updated_at, row_id, *extra):
+    return encode_cursor([updated_at.isoformat(), row_id, *extra]) if updated_at else None
+
+def parse_sync_cursor(cursor, extra=0):
+    # Returns where to resume from, (updated_at, id) moved back by the rescan window, followed by the
+    # `extra` values if any
+    values = decode_cursor(cursor)
+    if not values or len(values) != 2 + extra:
+        raise ValueError("Invalid cursor")
+    after = (datetime.fromisoformat(values[0]) - timedelta(seconds=SYNC_RESCAN_SECONDS), int(values[1]))
+    return (after, *values[2:]) if extra else after
+
+def latest_change(query, updated_col, id_col):
+    return query.with_entities(updated_col, id_col).order_by(updated_col.desc(), id_col.desc()).first()
+
+def not_modified_response(scope, change):
+    # Returns (etag, 304 response or None)
+    updated_at = change[0] if change else None
+    state = "|".join(str(value) for value in change) if change else ""
+    etag = hashlib.sha1(f"{scope}|{state}|{request.query_string.decode()}".encode("utf-8")).hexdigest()
+    if updated_at and updated_at > datetime.utcnow() - timedelta(seconds=SYNC_RESCAN_SECONDS):
+        return etag, None  # Recent changes: an older row may still commit without moving the newest one
+    if request.if_none_match:
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return etag, response
+    elif updated_at and request.if_modified_since:
+        if updated_at.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since:
+            response = Response(status=304)
+            response.set_etag(etag)
+            return etag, response
+    return etag, None
+
+def with_sync_headers(response, etag, change):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    if change:
+        response.last_modified = change[0].replace(tzinfo=timezone.utc)
+        response.headers["X-Sync-Cursor"] = sync_cursor(*change)
+    return response
+
+def backfill_sync_columns():
+    # Rows written before updated_at existed
+    db.session.execute(db.update(Message).where(Message.updated_at.is_(None)).values(
+        updated_at=Message.timestamp
+    ).execution_options(synchronize_session=False))
+    db.session.execute(db.update(ConversationSummary).where(ConversationSummary.updated_at.is_(None)).values(
+        updated_at=ConversationSummary.last_activity
+    ).execution_options(synchronize_session=False))
+    db.session.commit()
+
+# Conversation summary helpers
+# Cursors are opaque to the client: base64 of the sort key of the last row on the page
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw.decode("utf-8"))
+        if not isinstance(values, list):
+            return None
+        return values
+    except (ValueError, TypeError):
+        return None
+
+def conversation_aggregate(customer_ids=None):
+    # One grouped pass over Message: per customer stats, used to rebuild/verify the summary table
+    query = db.session.query(
+        Message.customer_id.label("customer_id"),
+        db.func.max(Message.timestamp).label("last_activity"),
+        db.func.count(Message.id).label("message_count"),
+        db.func.sum(db.case((Message.urgency == 'Urgent', 1), else_=0)).label("urgent_count"),
+        db.func.sum(db.case((Message.status == 'Open', 1), else_=0)).label("open_count"),
+        db.func.sum(db.case(
+            (db.and_(Message.urgency == 'Urgent', Message.status == 'Open'), 1), else_=0
+        )).label("open_urgent_count")
+    )
+    if customer_ids is not None:
+        query = query.filter(Message.customer_id.in_(customer_ids))
+    return query.group_by(Message.customer_id).subquery()
+
+def summary_priority(open_count, open_urgent_count):
+    return db.case((open_urgent_count > 0, 2), (open_count > 0, 1), else_=0)
+
+def summary_delta_statement():
+    # Count deltas for one conversation as a single UPDATE (executemany-able), so concurrent
+    # writers don't lose updates. `status_mid`/`new_status` refresh latest_status when that message changed.
+    S = ConversationSummary.__table__
+    open_expr = S.c.open_count + db.bindparam('opened')
+    open_urgent_expr = S.c.open_urgent_count + db.bindparam('open_urgent')
+    return db.update(S).where(S.c.customer_id == db.bindparam('cid')).values(
+        message_count=S.c.message_count + db.bindparam('messages'),
+        urgent_count=S.c.urgent_count + db.bindparam('urgent'),
+        open_count=open_expr,
+        open_urgent_count=open_urgent_expr,
+        priority=summary_priority(open_expr, open_urgent_expr),
+        latest_status=db.case(
+            (S.c.latest_message_id == db.bindparam('status_mid'), db.bindparam('new_status')),
+            else_=S.c.latest_status
+        )
+    )
+
+def summary_latest_statement():
+    # Move the preview to a newer message (no-op when the stored one is newer)
+    S = ConversationSummary.__table__
+    return db.update(S).where(
+        S.c.customer_id == db.bindparam('cid'),
+        db.or_(
+            S.c.last_activity < db.bindparam('ts'),
+            db.and_(S.c.last_activity == db.bindparam('ts'), S.c.latest_message_id < db.bindparam('mid'))
+        )
+    ).values(
+        latest_message_id=db.bindparam('mid'),
+        latest_preview=db.bindparam('preview'),
+        latest_urgency=db.bindparam('urgency'),
+        latest_status=db.bindparam('status'),
+        last_activity=db.bindparam('ts')
+    )
+
+def summary_delta(customer_id, messages=0, urgent=0, opened=0, open_urgent=0, status_of=None):
+    return {
+        "cid": customer_id, "messages": messages, "urgent": urgent, "opened": opened, "open_urgent": open_urgent,
+        "status_mid": status_of.id if status_of is not None else None,
+        "new_status": status_of.status if status_of is not None else None
+    }
+
+def bump_conversation_summary(customer_id, messages=0, urgent=0, opened=0, open_urgent=0,
+                              latest=None, status_of=None):
+    # `latest` is a newly added Message that may become the preview, `status_of` a Message whose status changed
+    mark_messages_changed()
+    mark_queue_changed([customer_id])
+    db.session.flush()
+    updated = db.session.execute(
+        summary_delta_statement(),
+        summary_delta(customer_id, messages, urgent, opened, open_urgent, status_of)
+    ).rowcount
+    
+    if not updated:
+        # First message of a new conversation (or a summary that was never built):
+        # the messages are already flushed, so recompute this one conversation
+        rebuild_conversation_summaries([customer_id])
+        return
+    
+    if latest is not None:
+        db.session.execute(summary_latest_statement(), [summary_latest(latest)])
+
+def summary_latest(message):
+    return {
+        "cid": message.customer_id, "mid": message.id, "ts": message.timestamp,
+        "preview": message.message_text[:SUMMARY_PREVIEW_LENGTH],
+        "urgency": message.urgency, "status": message.status
+    }
+
+def summary_add_messages(messages):
+    # `messages` must be flushed so they have ids; all touched conversations are updated with
+    # two executemany UPDATEs, conversations without a summary row are built in one INSERT ... SELECT
+    by_customer = {}
+    for message in messages:
+        by_customer.setdefault(message.customer_id, []).append(message)
+    if not by_customer:
+        return
+    mark_messages_changed()
+    mark_queue_changed(by_customer)
+    S = ConversationSummary
+    known = {row[0] for row in db.session.query(S.customer_id).filter(S.customer_id.in_(by_customer))}
+    new = [customer_id for customer_id in by_customer if customer_id not in known]
+    if new:
+        rebuild_conversation_summaries(new)
+    deltas = []
+    latest = []
+    for customer_id, group in by_customer.items():
+        if customer_id not in known:
+            continue
+        deltas.append(summary_delta(
+            customer_id,
+            messages=len(group),
+            urgent=sum(1 for m in group if m.urgency == 'Urgent'),
+            opened=sum(1 for m in group if m.status == 'Open'),
+            open_urgent=sum(1 for m in group if m.urgency == 'Urgent' and m.status == 'Open')
+        ))
+        latest.append(summary_latest(max(group, key=lambda m: (m.timestamp, m.id))))
+    if deltas:
+        db.session.execute(summary_delta_statement(), deltas)
+        db.session.execute(summary_latest_statement(), latest)
+
+def mark_messages_changed():
+    # Message counts changed in this transaction: drop cached stats once it commits
+    db.session.info['messages_changed'] = True
+
+def mark_queue_changed(customer_ids=None):
+    # These conversations' open messages may have changed: refresh their queue entries before
+    # the transaction commits. None refreshes the whole queue.
+    if customer_ids is None:
+        db.session.info['queue_changed'] = None
+    elif db.session.info.get('queue_changed', ()) is not None:
+        db.session.info.setdefault('queue_changed', set()).update(customer_ids)
+
+def set_message_status(message, status):
+    # Change one message's status and keep its conversation summary in step
+    if message.status == status:
+        return
+    delta = 1 if status == 'Open' else -1
+    rollup_status_change(message.status, status)
+    message.status = status
+    bump_conversation_summary(
+        message.customer_id,
+        opened=delta,
+        open_urgent=delta if message.urgency == 'Urgent' else 0,
+        status_of=message
+    )
+
+def bulk_set_status(conditions, status):
+    # Set-based status change: one UPDATE ... RETURNING per condition (callers chunk long id lists),
+    # then the touched conversations' summaries are rebuilt in bulk.
+    # Returns (number of messages changed, set of customer ids touched)
+    changed = 0
+    customer_ids = set()
+    for condition in conditions:
+        rows = db.session.execute(
+            db.update(Message).where(condition, Message.status != status).values(status=status)
+            .returning(Message.customer_id).execution_options(synchronize_session=False)
+        ).all()
+        changed += len(rows)
+        customer_ids.update(row[0] for row in rows)
+    touched = sorted(customer_ids)
+    for start in range(0, len(touched), BULK_STATUS_CHUNK):
+        rebuild_conversation_summaries(touched[start:start + BULK_STATUS_CHUNK])
+    rollup_status_change('Resolved' if status == 'Open' else 'Open', status, changed)
+    return changed, customer_ids
+
+def rebuild_conversation_summaries(customer_ids=None):
+    # Recompute summaries from scratch (all conversations, or just the given customers)
+    mark_messages_changed()
+    mark_queue_changed(customer_ids)
+    S = ConversationSummary
+    agg = conversation_aggregate(customer_ids)
+    latest_id = db.session.query(Message.id).filter(
+        Message.customer_id == agg.c.customer_id
+    ).order_by(Message.timestamp.desc(), Message.id.desc()).limit(1).correlate(agg).scalar_subquery()
+    latest = aliased(Message)
+    select = db.select(
+        agg.c.customer_id,
+        latest.id,
+        db.func.substr(latest.message_text, 1, SUMMARY_PREVIEW_LENGTH),
+        latest.urgency,
+        latest.status,
+        agg.c.last_activity,
+        agg.c.message_count,
+        agg.c.urgent_count,
+        agg.c.open_count,
+        agg.c.open_urgent_count,
+        summary_priority(agg.c.open_count, agg.c.open_urgent_count),
+        db.literal(datetime.utcnow(), db.DateTime)
+    ).select_from(agg).join(latest, latest.id == latest_id)
+    
+    delete = db.delete(S)
+    if customer_ids is not None:
+        delete = delete.where(S.customer_id.in_(customer_ids))
+    db.session.execute(delete)
+    db.session.execute(db.insert(S).from_select([
+        'customer_id', 'latest_message_id', 'latest_preview', 'latest_urgency', 'latest_status',
+        'last_activity', 'message_count', 'urgent_count', 'open_count', 'open_urgent_count', 'priority',
+        'updated_at'
+    ], select))
+
+def verify_conversation_summaries():
+    # Compare the stored summaries with a fresh aggregation, returns list of mismatching customer ids
+    S = ConversationSummary
+    fields = ['message_count', 'urgent_count', 'open_count', 'open_urgent_count']
+    fresh = {row.customer_id: row for row in db.session.query(conversation_aggregate()).all()}
+    stored = {row.customer_id: row for row in S.query.all()}
+    mismatched = []
+    for customer_id in set(fresh) | set(stored):
+        a, b = fresh.get(customer_id), stored.get(customer_id)
+        if a is None or b is None or any(getattr(a, f) != getattr(b, f) for f in fields) \
+                or a.last_activity != b.last_activity:
+            mismatched.append(customer_id)
+    return sorted(mismatched)
+
+def serialize_conversations(summaries):
+    # Customers for a page of summaries come from the profile cache (one query for any misses)
+    customers = user_cache.get_many([summary.customer_id for summary in summaries])
+    return [serialize_conversation(summary, customers[summary.customer_id])
+            for summary in summaries if summary.customer_id in customers]
+
+def serialize_conversation(summary, customer):
+    return {
+        "id": summary.latest_message_id, # Use latest message ID as conversation reference
+        "customer_id": customer.id,
+        "customer_name": customer.name,
+        "customer_email": customer.email,
+        "customer_phone": customer.phone,
+        "account_type": customer.account_type,
+        "message_text": summary.latest_preview, # Latest message preview
+        "urgency": "Urgent" if summary.open_urgent_count > 0 else summary.latest_urgency, # Upgrade thread urgency if ANY open message is urgent
+        "timestamp": summary.last_activity.isoformat(),
+        "status": summary.status, # If ANY message is Open, the conversation is Open
+        "message_count": summary.message_count,
+        "has_urgent": summary.open_urgent_count > 0
+    }
+
+# Work queue
+# Open conversations ordered by SLA deadline: each open message is due SLA_MINUTES[urgency] after
+# it arrived and a conversation is due with its earliest message, so urgent threads come first
+# unless a normal one has waited past its own deadline. Write paths mark the conversations they
+# touch (mark_queue_changed) and their entries are recomputed just before the transaction commits.
+# Agents take the head of the queue with an atomic claim that expires after QUEUE_LEASE_SECONDS
+# unless renewed, so two agents never get the same conversation and an abandoned claim returns to
+# the queue by itself. The next item is one index seek on (due_at, customer_id), skipping only
+# conversations that are currently claimed.
+SLA_MINUTES = {
+    'Urgent': int(os.environ.get('SLA_URGENT_MINUTES', 60)),
+    'Normal': int(os.environ.get('SLA_NORMAL_MINUTES', 24 * 60)),
+}
+QUEUE_LEASE_SECONDS = int(os.environ.get('QUEUE_LEASE_SECONDS', 300))
+QUEUE_CLAIM_ATTEMPTS = 5  # Candidates tried when other agents keep winning the race
+
+def refresh_queue(customer_ids=None):
+    # Recompute the entries of these conversations (or all) from their open messages. Claims on
+    # conversations that stay open are kept; conversations with nothing open leave the queue.
+    Q = QueueEntry
+    chunks = [None] if customer_ids is None else [
+        sorted(customer_ids)[start:start + BULK_STATUS_CHUNK]
+        for start in range(0, len(customer_ids), BULK_STATUS_CHUNK)
+    ]
+    for chunk in chunks:
+        query = db.session.query(
+            Message.customer_id,
+            db.func.min(db.case((Message.urgency == 'Urgent', Message.timestamp))),
+            db.func.min(db.case((Message.urgency == 'Urgent', None), else_=Message.timestamp))
+        ).filter(Message.status == 'Open')
+        stale = db.delete(Q).where(~db.exists().where(Message.customer_id == Q.customer_id, Message.status == 'Open'))
+        if chunk is not None:
+            query = query.filter(Message.customer_id.in_(chunk))
+            stale = stale.where(Q.customer_id.in_(chunk))
+        entries = []
+        for customer_id, urgent_since, normal_since in query.group_by(Message.customer_id):
+            deadlines = []
+            if urgent_since is not None:
+                deadlines.append(urgent_since + timedelta(minutes=SLA_MINUTES['Urgent']))
+            if normal_since is not None:
+                deadlines.append(normal_since + timedelta(minutes=SLA_MINUTES['Normal']))
+            entries.append({
+                "customer_id": customer_id,
+                "due_at": min(deadlines),
+                "priority": 2 if urgent_since is not None else 1,
+                "waiting_since": min(t for t in (urgent_since, normal_since) if t is not None)
+            })
+        db.session.execute(stale.execution_options(synchronize_session=False))
+        upsert_replace(Q, ["customer_id"], entries, ["due_at", "priority", "waiting_since"])
+
+def claimable(now):
+    return db.or_(QueueEntry.claim_expires_at.is_(None), QueueEntry.claim_expires_at < now)
+
+def claim_next_conversation(agent_id, agent_name):
+    # Returns the claimed QueueEntry, or None when every open conversation is taken. An agent works
+    # one conversation at a time: asking again while holding a live claim renews and returns it.
+    Q = QueueEntry
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=QUEUE_LEASE_SECONDS)
+    held = Q.query.filter(Q.claimed_by == agent_id, Q.claim_expires_at >= now).first()
+    if held is not None:
+        held.claim_expires_at = expires
+        db.session.commit()
+        return held
+    for _ in range(QUEUE_CLAIM_ATTEMPTS):
+        # FOR UPDATE SKIP LOCKED lets concurrent claims on PostgreSQL pass each other; the
+        # conditional UPDATE is what makes the claim atomic everywhere
+        customer_id = db.session.query(Q.customer_id).filter(claimable(now)).order_by(
+            Q.due_at, Q.customer_id
+        ).limit(1).with_for_update(skip_locked=True).scalar()
+        if customer_id is None:
+            db.session.rollback()
+            return None
+        claimed = db.session.execute(db.update(Q).where(Q.customer_id == customer_id, claimable(now)).values(
+            claimed_by=agent_id, claimed_by_name=agent_name, claim_expires_at=expires
+        ).execution_options(synchronize_session=False)).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Q, customer_id)
+    return None
+
+def renew_claim(customer_id, agent_id):
+    # Extend the agent's live claim; False if it expired or belongs to someone else
+    Q = QueueEntry
+    now = datetime.utcnow()
+    return db.session.execute(db.update(Q).where(
+        Q.customer_id == customer_id, Q.claimed_by == agent_id, Q.claim_expires_at >= now
+    ).values(claim_expires_at=now + timedelta(seconds=QUEUE_LEASE_SECONDS)).execution_options(
+        synchronize_session=False
+    )).rowcount > 0
+
+def release_claim(customer_id, agent_id):
+    Q = QueueEntry
+    return db.session.execute(db.update(Q).where(Q.customer_id == customer_id, Q.claimed_by == agent_id).values(
+        claimed_by=None, claimed_by_name=None, claim_expires_at=None
+    ).execution_options(synchronize_session=False)).rowcount > 0
+
+def serialize_queue_entries(entries):
+    # Queue fields plus the conversation (summary and customer) for each entry
+    now = datetime.utcnow()
+    ids = [entry.customer_id for entry in entries]
+    summaries = {s.customer_id: s for s in ConversationSummary.query.filter(ConversationSummary.customer_id.in_(ids))}
+    customers = user_cache.get_many(ids)
+    items = []
+    for entry in entries:
+        item = entry.to_dict(now)
+        summary, customer = summaries.get(entry.customer_id), customers.get(entry.customer_id)
+        item["conversation"] = serialize_conversation(summary, customer) if summary and customer else None
+        items.append(item)
+    return items
+
+def ensure_queue():
+    # Existing databases predate the queue table: build it once
+    if QueueEntry.query.first() is None and Message.query.filter(Message.status == 'Open').first() is not None:
+        refresh_queue()
+        db.session.commit()
+
+@app.route("/api/agent/queue", methods=["GET"])
+def agent_get_queue():
+    # Peek at the next unclaimed conversations and the agent's own claim
+    if session.get('role') != 'agent':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    limit = request.args.get("limit", 20, type=int)
+    if limit is None or limit < 1:
+        return jsonify({"error": "Invalid limit"}), 400
+    limit = min(limit, 100)
+    
+    Q = QueueEntry
+    now = datetime.utcnow()
+    head = Q.query.filter(claimable(now)).order_by(Q.due_at, Q.customer_id).limit(limit).all()
+    mine = Q.query.filter(Q.claimed_by == session.get('user_id'), Q.claim_expires_at >= now).first()
+    size, claimed, overdue = db.session.query(
+        db.func.count(Q.customer_id),
+        db.func.coalesce(db.func.sum(db.case((Q.claim_expires_at >= now, 1), else_=0)), 0),
+        db.func.coalesce(db.func.sum(db.case((Q.due_at < now, 1), else_=0)), 0)
+    ).one()
+    
+    return jsonify({
+        "size": size,
+        "claimed": claimed,
+        "overdue": overdue,
+        "claim": serialize_queue_entries([mine])[0] if mine else None,
+        "next": serialize_queue_entries(head)
+    })
+
+@app.route("/api/agent/queue/claim", methods=["POST"])
+def agent_claim_conversation():
+    if session.get('role') != 'agent':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    entry = claim_next_conversation(session.get('user_id'), session.get('user_name'))
+    return jsonify({
+        "success": True,
+        "claim": serialize_queue_entries([entry])[0] if entry else None
+    })
+
+@app.route("/api/agent/queue/<int:customer_id>/claim", methods=["PATCH", "DELETE"])
+def agent_update_claim(customer_id):
+    # PATCH renews the lease, DELETE hands the conversation back to the queue
+    if session.get('role') != 'agent':
         return jsonify({"error": "Unauthorized"}), 401
     
-    # Find customer user
-    customer = db.session.get(User, session.get('user_id'))
-    if not customer or customer.role != 'customer':
-        return jsonify({"error": "Customer not found"}), 404
+    if request.method == "DELETE":
+        released = release_claim(customer_id, session.get('user_id'))
+        db.session.commit()
+        if not released:
+            return jsonify({"error": "Conversation is not claimed by you"}), 409
+        return jsonify({"success": True})
+    
+    renewed = renew_claim(customer_id, session.get('user_id'))
+    db.session.commit()
+    if not renewed:
+        return jsonify({"error": "Claim expired or held by another agent"}), 409
+    entry = db.session.get(QueueEntry, customer_id)
+    return jsonify({"success": True, "claim": entry.to_dict()})
+
+# Archiving
+# Conversations with nothing open and no activity for ARCHIVE_AFTER_DAYS move, messages and replies
+# together, to ArchivedMessage/ArchivedReply on the 'archive' bind, so the inbox, stats and search
+# only work through live rows. A batch is first copied to the archive and committed, then deleted
+# from the live tables; a batch interrupted in between is copied again (rows already archived are
+# skipped). Search and conversation history reach archived rows with ?include_archived=1.
+# Rollups and response time histograms keep their history, but rebuild-rollups and
+# backfill-response-times only see live messages.
+ARCHIVE_AFTER_DAYS = float(os.environ.get('ARCHIVE_AFTER_DAYS', 180))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 200))  # conversations per batch
+ARCHIVE_INTERVAL = int(os.environ.get('ARCHIVE_INTERVAL', 0))  # seconds between background runs, 0 = CLI only
+ARCHIVE_CHUNK = 500  # ids per IN (...)
+
+ARCHIVE_FTS5_SCHEMA = """CREATE VIRTUAL TABLE IF NOT EXISTS archived_message_search USING fts5(
+    message_text, reply_text, customer_name, customer_email,
+    tokenize = 'unicode61 remove_diacritics 2'
+)"""
+
+class ArchiveSearchBackend(FTS5SearchBackend):
+    # Archived rows never change, so there are no triggers: archive_batch() writes the index
+    table = "archived_message_search"
+    bind_key = "archive"
+
+    @classmethod
+    def setup(cls):
+        cls.execute(ARCHIVE_FTS5_SCHEMA)
+
+    @classmethod
+    def add(cls, entries):
+        # entries: (message_id, customer_id, message_text, reply_text)
+        customers = user_cache.get_many([entry[1] for entry in entries])
+        rows = []
+        for message_id, customer_id, message_text, reply_text in entries:
+            customer = customers.get(customer_id)
+            rows.append({
+                "id": message_id, "message_text": message_text, "reply_text": reply_text,
+                "name": customer.name if customer else "", "email": customer.email if customer else ""
+            })
+        if rows:
+            cls.execute(f"""
+                INSERT INTO {cls.table} (rowid, message_text, reply_text, customer_name, customer_email)
+                VALUES (:id, :message_text, :reply_text, :name, :email)
+            """, rows)
+
+    @classmethod
+    def remove(cls, message_ids):
+        cls.execute(f"DELETE FROM {cls.table} WHERE rowid = :id", [{"id": i} for i in message_ids])
+
+    @classmethod
+    def rebuild(cls):
+        cls.execute(f"DELETE FROM {cls.table}")
+        last_id = 0
+        while True:
+            messages = load_threads(ArchivedMessage.query.filter(ArchivedMessage.id > last_id).order_by(
+                ArchivedMessage.id
+            ).limit(ARCHIVE_CHUNK), ArchivedMessage)
+            if not messages:
+                break
+            cls.add([(msg.id, msg.customer_id, msg.message_text, " ".join(r.reply_text for r in msg.replies))
+                     for msg in messages])
+            last_id = messages[-1].id
+
+class ArchiveLikeSearchBackend(LikeSearchBackend):
+    # Non-SQLite (or no FTS5) archives: message text only, newest first
+    @staticmethod
+    def search(query, limit, offset):
+        rows = db.session.query(ArchivedMessage.id, ArchivedMessage.message_text).filter(
+            ArchivedMessage.message_text.contains(query)
+        ).order_by(ArchivedMessage.timestamp.desc()).limit(limit).offset(offset).all()
+        return [(row.id, None, row.message_text[:200]) for row in rows]
+
+    @staticmethod
+    def add(entries):
+        pass
+
+    @staticmethod
+    def remove(message_ids):
+        pass
+
+_archive_search_backend = None
+
+def get_archive_search_backend():
+    global _archive_search_backend
+    if _archive_search_backend is None:
+        _archive_search_backend = ArchiveSearchBackend if ArchiveSearchBackend.available() \
+            else ArchiveLikeSearchBackend
+    return _archive_search_backend
+
+def ensure_archive_search():
+    global _archive_search_backend
+    if db.engines['archive'].dialect.name != 'sqlite':
+        return
+    try:
+        ArchiveSearchBackend.setup()
+    except Exception:
+        db.session.rollback()  # SQLite compiled without FTS5
+        return
+    empty = ArchiveSearchBackend.execute(f"SELECT 1 FROM {ArchiveSearchBackend.table} LIMIT 1").first() is None
+    if empty and ArchivedMessage.query.first() is not None:
+        ArchiveSearchBackend.rebuild()
+    db.session.commit()
+    _archive_search_backend = ArchiveSearchBackend
+
+def wants_archived():
+    return request.args.get("include_archived", "").lower() in ("1", "true", "yes")
+
+def archived_threads(customer_id, newest_first=False):
+    # A customer's archived messages with replies. Whole conversations are archived at once, so they
+    # are all older than the customer's live messages. Delta sync (?since=) never includes them:
+    # archived rows don't change.
+    order = ArchivedMessage.timestamp.desc() if newest_first else ArchivedMessage.timestamp.asc()
+    return iter_threads(ArchivedMessage.query.filter_by(customer_id=customer_id).order_by(order), ArchivedMessage)
+
+def id_chunks(ids):
+    return [ids[start:start + ARCHIVE_CHUNK] for start in range(0, len(ids), ARCHIVE_CHUNK)]
+
+def archivable_customers(cutoff, limit):
+    # Conversations with every message resolved and untouched since the cutoff. Message and reply ids
+    # are AUTOINCREMENT, so deleting the newest rows never lets a new row take an archived id.
+    S = ConversationSummary
+    active = db.session.query(Message.id).filter(
+        Message.customer_id == S.customer_id,
+        db.or_(Message.updated_at >= cutoff, Message.status != 'Resolved')
+    )
+    rows = db.session.query(S.customer_id).filter(
+        S.priority == 0, S.open_count == 0, S.last_activity < cutoff, ~active.exists()
+    ).order_by(S.last_activity, S.customer_id).limit(limit)
+    return [row[0] for row in rows]
+
+def archive_batch(cutoff, limit=ARCHIVE_BATCH_SIZE):
+    # Move up to `limit` conversations to the archive; returns (conversations, messages) moved
+    customer_ids = archivable_customers(cutoff, limit)
+    if not customer_ids:
+        return 0, 0
+    M, R = Message.__table__, Reply.__table__
+    messages = [dict(row) for chunk in id_chunks(customer_ids)
+                for row in db.session.execute(db.select(M).where(M.c.customer_id.in_(chunk))).mappings()]
+    message_ids = [row["id"] for row in messages]
+    replies = [dict(row) for chunk in id_chunks(message_ids)
+               for row in db.session.execute(db.select(R).where(R.c.message_id.in_(chunk))).mappings()]
+    search = get_archive_search_backend()
     
-    # Get all messages for this customer
-    messages = Message.query.filter_by(customer_id=customer.id).order_by(Message.timestamp.desc()).all()
+    # 1. Copy to the archive
+    copied = {row[0] for chunk in id_chunks(message_ids)
+              for row in db.session.query(ArchivedMessage.id).filter(ArchivedMessage.id.in_(chunk))}
+    now = datetime.utcnow()
+    new_messages = [dict(row, archived_at=now) for row in messages if row["id"] not in copied]
+    new_replies = [row for row in replies if row["message_id"] not in copied]
+    if new_messages:
+        db.session.execute(db.insert(ArchivedMessage), new_messages)
+    if new_replies:
+        db.session.execute(db.insert(ArchivedReply), new_replies)
+    reply_texts = {}
+    for row in sorted(new_replies, key=lambda r: (r["timestamp"] or now, r["id"])):
+        reply_texts.setdefault(row["message_id"], []).append(row["reply_text"])
+    search.add([(row["id"], row["customer_id"], row["message_text"], " ".join(reply_texts.get(row["id"], [])))
+                for row in new_messages])
+    db.session.commit()
     
-    result = []
-    for msg in messages:
-        # Get replies for this message
-        replies = Reply.query.filter_by(message_id=msg.id).order_by(Reply.timestamp.asc()).all()
-        
-        message_data = {
-            "id": msg.id,
-            "message_text": msg.message_text,
-            "urgency": msg.urgency,
-            "timestamp": msg.timestamp.isoformat(),
-            "status": msg.status,
-            "replies": [
-                {
-                    "id": reply.id,
-                    "agent_name": reply.agent_name,
-                    "reply_text": reply.reply_text,
-                    "timestamp": reply.timestamp.isoformat()
-                }
-                for reply in replies
-            ]
-        }
-        result.append(message_data)
+    # 2. Delete the live rows, except messages that changed since step 1 read them
+    moved = set()
+    for chunk in id_chunks(message_ids):
+        unchanged = db.select(M.c.id).where(M.c.id.in_(chunk), M.c.updated_at < cutoff, M.c.status == 'Resolved')
+        db.session.execute(db.delete(R).where(R.c.message_id.in_(unchanged)))
+        moved.update(row[0] for row in db.session.execute(db.delete(M).where(M.c.id.in_(unchanged)).returning(M.c.id)))
+    rebuild_conversation_summaries(customer_ids)
+    db.session.commit()
     
-    return jsonify(result)
+    # 3. Drop the copies of messages that stayed live, log what moved
+    kept = [message_id for message_id in message_ids if message_id not in moved]
+    for chunk in id_chunks(kept):
+        db.session.execute(db.delete(ArchivedReply).where(ArchivedReply.message_id.in_(chunk)))
+        db.session.execute(db.delete(ArchivedMessage).where(ArchivedMessage.id.in_(chunk)))
+        search.remove(chunk)
+    moved_rows = [row for row in messages if row["id"] in moved]
+    conversations = len({row["customer_id"] for row in moved_rows})
+    db.session.add(ArchiveRun(
+        cutoff=cutoff, conversations=conversations, messages=len(moved_rows),
+        urgent_messages=sum(1 for row in moved_rows if row["urgency"] == 'Urgent'),
+        replies=sum(1 for row in replies if row["message_id"] in moved)
+    ))
+    db.session.commit()
+    return conversations, len(moved_rows)
+
+def archive_generation():
+    # Id of the newest archive run (0 before the first); changes whenever conversations leave the inbox
+    return db.session.query(db.func.max(ArchiveRun.id)).scalar() or 0
+
+def archive_conversations(older_than_days=None, batch_size=ARCHIVE_BATCH_SIZE, progress=None):
+    # Archive every eligible conversation, one batch per transaction; returns (conversations, messages)
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    totals = [0, 0]
+    while True:
+        conversations, messages = archive_batch(cutoff, batch_size)
+        if not messages:
+            break
+        totals[0] += conversations
+        totals[1] += messages
+        if progress:
+            progress(*totals)
+    if totals[0]:
+        publish_event(["agents"], "resync", {})  # Archived conversations leave the inbox
+    return tuple(totals)
+
+_archiver = None
+
+def start_archiver():
+    # Background thread that archives idle conversations every ARCHIVE_INTERVAL seconds (if set)
+    global _archiver
+    if _archiver is not None or ARCHIVE_INTERVAL <= 0:
+        return
+
+    def run():
+        while True:
+            time.sleep(ARCHIVE_INTERVAL)
+            with app.app_context():
+                try:
+                    archive_conversations()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception("Archiving failed")
+
+    _archiver = threading.Thread(target=run, name="archiver", daemon=True)
+    _archiver.start()
 
 # Agent dashboard functionality
 @app.route("/api/agent/messages", methods=["GET"])
@@ -268,75 +3178,95 @@ def agent_get_messages():
     if session.get('role') != 'agent':
         return jsonify({"error": "Unauthorized"}), 401
     
-    # Get all messages ordered by timestamp (newest first)
-    messages = Message.query.order_by(Message.timestamp.desc()).all()
+    # Reads come from the ConversationSummary table, so cost is O(page size). Archiving deletes summary
+    # rows without touching the newest updated_at, so the archive generation is part of the change too.
+    S = ConversationSummary
+    generation = archive_generation()
+    change = latest_change(S.query, S.updated_at, S.customer_id)
+    if change:
+        change = (*change, generation)
+    etag, not_modified = not_modified_response(f"inbox|{generation}", change)
+    if not_modified:
+        return not_modified
     
-    # Group by customer_id to create "conversations"
-    conversations = {}
+    sort_key = (S.priority, S.last_activity, S.customer_id)
+    query = S.query
     
-    for msg in messages:
-        if msg.customer_id not in conversations:
-            # Get customer info
-            customer = db.session.get(User, msg.customer_id)
-            if not customer:
-                continue
-                
-            conversations[msg.customer_id] = {
-                "id": msg.id, # Use latest message ID as conversation reference
-                "customer_id": msg.customer_id,
-                "customer_name": customer.name,
-                "customer_email": customer.email,
-                "customer_phone": customer.phone,
-                "account_type": customer.account_type,
-                "message_text": msg.message_text, # Latest message preview
-                "urgency": msg.urgency, 
-                "timestamp": msg.timestamp.isoformat(),
-                "status": msg.status,
-                "message_count": 0,
-                "has_urgent": False
-            }
-        
-        # Update conversation stats
-        conversations[msg.customer_id]["message_count"] += 1
-        if msg.urgency == "Urgent" and msg.status == "Open":
-            conversations[msg.customer_id]["has_urgent"] = True
-            conversations[msg.customer_id]["urgency"] = "Urgent" # Upgrade thread urgency if ANY open message is urgent
-            
-        # If ANY message is Open, the conversation is Open
-        if msg.status == "Open":
-            conversations[msg.customer_id]["status"] = "Open"
-
-    # Convert to list
-    result = list(conversations.values())
-    
-    # Custom sort: 
+    # ?since=<cursor>: only conversations that changed after the cursor. A delta can't say which
+    # conversations were archived, so after an archive run it answers "reload": the client fetches
+    # the full list again.
+    since = request.args.get("since")
+    if since:
+        try:
+            after, cursor_generation = parse_sync_cursor(since, extra=1)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+        if cursor_generation != generation:
+            response = jsonify({"conversations": [], "cursor": sync_cursor(*change) if change else None, "reload": True})
+            return with_sync_headers(response, etag, change)
+        rows = query.filter(db.tuple_(S.updated_at, S.customer_id) > after).order_by(S.updated_at, S.customer_id).all()
+        response = jsonify({
+            "conversations": serialize_conversations(rows),
+            "cursor": sync_cursor(*change) if change else since
+        })
+        return with_sync_headers(response, etag, change)
+    
+    # Sort:
     # 1. Urgent AND Open (Most critical)
     # 2. Open (Pending)
     # 3. Timestamp (Recent first)
-    result.sort(key=lambda x: (
-        1 if x["has_urgent"] and x["status"] == "Open" else 0,
-        1 if x["status"] == "Open" else 0,
-        x["timestamp"]
-    ), reverse=True)
+    query = query.order_by(*[col.desc() for col in sort_key])
+    
+    # Without limit/cursor return every conversation (what the dashboard expects)
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        return with_sync_headers(jsonify(serialize_conversations(query.all())), etag, change)
+    
+    limit = request.args.get("limit", 50, type=int)
+    if limit is None or limit < 1:
+        return jsonify({"error": "Invalid limit"}), 400
+    limit = min(limit, 200)
+    
+    cursor = request.args.get("cursor")
+    if cursor:
+        values = decode_cursor(cursor)
+        if not values or len(values) != 3:
+            return jsonify({"error": "Invalid cursor"}), 400
+        try:
+            after = (int(values[0]), datetime.fromisoformat(values[1]), int(values[2]))
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid cursor"}), 400
+        query = query.filter(db.tuple_(*sort_key) < after)
     
-    return jsonify(result)
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last.priority, last.last_activity.isoformat(), last.customer_id])
+    
+    return with_sync_headers(jsonify({
+        "conversations": serialize_conversations(rows),
+        "next_cursor": next_cursor
+    }), etag, change)
 
 @app.route("/api/agent/stats", methods=["GET"])
 def agent_get_stats():
     if session.get('role') != 'agent':
         return jsonify({"error": "Unauthorized"}), 401
     
+    # All counts come from the cached single-pass status/urgency breakdown
     # 1. Total Messages
-    total_vol = Message.query.count()
+    total_vol = count_messages()
     
     # 2. Urgent Conversations (Open & Urgent)
-    urgent_count = Message.query.filter_by(urgency='Urgent', status='Open').count()
+    urgent_count = count_messages(status='Open', urgency='Urgent')
     
     # 3. Pending Responses (Total Open)
-    pending_count = Message.query.filter_by(status='Open').count()
+    pending_count = count_messages(status='Open')
     
-    # 4. Avg Response Time (Mocked for internship level as logic is complex)
-    response_time = "5m" 
+    # 4. Avg first response time over the last 7 days (from the response time histograms)
+    since = (datetime.utcnow() - timedelta(days=6)).date()
+    response_time = format_duration(response_time_stats("all", start=since).get("all", {}).get("mean"))
 
     return jsonify({
         "total_messages": total_vol,
@@ -350,55 +3280,52 @@ def agent_search_messages():
     if session.get('role') != 'agent':
         return jsonify({"error": "Unauthorized"}), 401
     
-    query = request.args.get("query", "")
+    query = request.args.get("query", "").strip()
+    limit = request.args.get("limit", 20, type=int)
+    offset = request.args.get("offset", 0, type=int)
+    
+    if limit is None or limit < 1 or offset is None or offset < 0:
+        return jsonify({"error": "Invalid limit or offset"}), 400
+    limit = min(limit, 100)
     
     if not query:
-        return jsonify([])
+        return jsonify({"results": [], "next_offset": None})
     
-    # Search in message text and customer names/emails
-    messages = Message.query.join(User, Message.customer_id == User.id).filter(
-        db.or_(
-            Message.message_text.contains(query),
-            User.name.contains(query),
-            User.email.contains(query)
-        )
-    ).order_by(
-        db.case((Message.urgency == 'Urgent', 1), else_=2),
-        Message.timestamp.desc()
-    ).all()
+    # Ranked hits from the search index (message text, replies, customer name/email)
+    backend = get_search_backend()
+    if wants_archived():
+        # Live hits first, then archived ones, each in its own index's rank order: bm25 scores depend on
+        # the statistics of the index they come from, so live and archived ranks can't be compared
+        window = offset + limit + 1
+        hits = [(hit, False) for hit in backend.search(query, window, 0)]
+        if len(hits) < window:
+            hits += [(hit, True) for hit in get_archive_search_backend().search(query, window - len(hits), 0)]
+        hits = hits[offset:offset + limit + 1]
+    else:
+        hits = [(hit, False) for hit in backend.search(query, limit + 1, offset)]
+    next_offset = offset + limit if len(hits) > limit else None
+    hits = hits[:limit]
     
-    result = []
-    for msg in messages:
-        # Get customer info
-        customer = db.session.get(User, msg.customer_id)
-        
-        # Get replies for this message
-        replies = Reply.query.filter_by(message_id=msg.id).order_by(Reply.timestamp.asc()).all()
-        
-        message_data = {
-            "id": msg.id,
-            "customer_id": msg.customer_id,
-            "customer_name": customer.name if customer else "Unknown",
-            "customer_email": customer.email if customer else None,
-            "customer_phone": customer.phone if customer else None,
-            "account_type": customer.account_type if customer else None,
-            "message_text": msg.message_text,
-            "urgency": msg.urgency,
-            "timestamp": msg.timestamp.isoformat(),
-            "status": msg.status,
-            "replies": [
-                {
-                    "id": reply.id,
-                    "agent_name": reply.agent_name,
-                    "reply_text": reply.reply_text,
-                    "timestamp": reply.timestamp.isoformat()
-                }
-                for reply in replies
-            ]
-        }
-        result.append(message_data)
+    # Hydrate the page of hits with customers and replies in a constant number of queries
+    live_ids = [hit[0] for hit, archived in hits if not archived]
+    archived_ids = [hit[0] for hit, archived in hits if archived]
+    messages = load_threads(Message.query.filter(Message.id.in_(live_ids))) if live_ids else []
+    if archived_ids:
+        messages += load_threads(ArchivedMessage.query.filter(ArchivedMessage.id.in_(archived_ids)), ArchivedMessage)
+    by_id = {(msg.id, isinstance(msg, ArchivedMessage)): msg for msg in messages}
+    customers = user_cache.get_many([msg.customer_id for msg in messages])
+    
+    def results():
+        for (message_id, rank, snippet), archived in hits:
+            msg = by_id.get((message_id, archived))
+            if not msg:
+                continue
+            message_data = message_to_dict(msg, customers)
+            message_data["snippet"] = highlight_snippet(snippet)
+            message_data["rank"] = rank
+            yield message_data
     
-    return jsonify(result)
+    return stream_json(results(), {"next_offset": next_offset, "backend": backend.name}, "results")
 
 @app.route("/api/agent/message/<int:message_id>/status", methods=["PATCH"])
 def agent_update_message_status(message_id):
@@ -414,9 +3341,14 @@ def agent_update_message_status(message_id):
     message = db.session.get(Message, message_id)
     if not message:
         return jsonify({"error": "Message not found"}), 404
-    message.status = status
+    set_message_status(message, status)
     db.session.commit()
     
+    publish_event(["agents", customer_channel(message.customer_id)], "status", {
+        "customer_id": message.customer_id, "message_id": message.id, "status": message.status
+    })
+    publish_conversation(message.customer_id)
+    
     return jsonify({
         "success": True,
         "message": {
@@ -425,6 +3357,33 @@ def agent_update_message_status(message_id):
         }
     })
 
+@app.route("/api/agent/message/<int:message_id>/urgency", methods=["PATCH"])
+def agent_update_message_urgency(message_id):
+    if session.get('role') != 'agent':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    data = request.json
+    urgency = data.get("urgency")
+    
+    if urgency not in ["Urgent", "Normal"]:
+        return jsonify({"error": "Invalid urgency"}), 400
+    
+    message = db.session.get(Message, message_id)
+    if not message:
+        return jsonify({"error": "Message not found"}), 404
+    set_message_urgency(message, urgency)
+    db.session.commit()
+    
+    publish_conversation(message.customer_id)
+    
+    return jsonify({
+        "success": True,
+        "message": {
+            "id": message.id,
+            "urgency": message.urgency
+        }
+    })
+
 @app.route("/api/agent/conversation/<int:customer_id>/status", methods=["PATCH"])
 def agent_update_conversation_status(customer_id):
     if session.get('role') != 'agent':
@@ -436,21 +3395,117 @@ def agent_update_conversation_status(customer_id):
     if status not in ["Open", "Resolved"]:
         return jsonify({"error": "Invalid status"}), 400
     
-    # Update all messages for this customer
-    messages = Message.query.filter_by(customer_id=customer_id).all()
-    count = 0
-    for message in messages:
-        message.status = status
-        count += 1
-        
+    # One UPDATE for all of this customer's messages that aren't in the target status yet
+    count = Message.query.filter(
+        Message.customer_id == customer_id, Message.status != status
+    ).update({Message.status: status}, synchronize_session=False)
+    rollup_status_change('Resolved' if status == 'Open' else 'Open', status, count)
+    
+    S = ConversationSummary
+    updated = S.query.filter(S.customer_id == customer_id).update({
+        S.open_count: S.message_count if status == 'Open' else 0,
+        S.open_urgent_count: S.urgent_count if status == 'Open' else 0,
+        S.latest_status: status,
+        S.priority: summary_priority(
+            S.message_count if status == 'Open' else 0,
+            S.urgent_count if status == 'Open' else 0
+        )
+    }, synchronize_session=False)
+    if not updated and Message.query.filter(Message.customer_id == customer_id).first():
+        rebuild_conversation_summaries([customer_id])
+    mark_messages_changed()
+    mark_queue_changed([customer_id])
     db.session.commit()
     
+    publish_event(["agents", customer_channel(customer_id)], "status", {
+        "customer_id": customer_id, "message_id": None, "status": status
+    })
+    publish_conversation(customer_id)
+    
     return jsonify({
         "success": True,
         "updated_count": count,
         "status": status
     })
 
+@app.route("/api/agent/status/batch", methods=["POST"])
+def agent_batch_update_status():
+    # Body: {"status": "Open"|"Resolved"} plus exactly one of
+    #   "customer_ids": [...], "message_ids": [...],
+    #   "filter": {"urgency": "Normal", "status": "Open", "older_than_days": 3}
+    # "dry_run": true only counts the messages that would change.
+    if session.get('role') != 'agent':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    data = request.json or {}
+    status = data.get("status")
+    if status not in ["Open", "Resolved"]:
+        return jsonify({"error": "Invalid status"}), 400
+    
+    selectors = [key for key in ("customer_ids", "message_ids", "filter") if data.get(key) is not None]
+    if len(selectors) != 1:
+        return jsonify({"error": "Provide exactly one of customer_ids, message_ids or filter"}), 400
+    selector = selectors[0]
+    
+    if selector == "filter":
+        spec = data["filter"]
+        if not isinstance(spec, dict):
+            return jsonify({"error": "Invalid filter"}), 400
+        conditions = []
+        if spec.get("urgency") is not None:
+            if spec["urgency"] not in ["Urgent", "Normal"]:
+                return jsonify({"error": "Invalid urgency"}), 400
+            conditions.append(Message.urgency == spec["urgency"])
+        if spec.get("status") is not None:
+            if spec["status"] not in ["Open", "Resolved"]:
+                return jsonify({"error": "Invalid filter status"}), 400
+            conditions.append(Message.status == spec["status"])
+        if spec.get("older_than_days") is not None:
+            days = spec["older_than_days"]
+            if not isinstance(days, (int, float)) or isinstance(days, bool) or days < 0:
+                return jsonify({"error": "Invalid older_than_days"}), 400
+            conditions.append(Message.timestamp < datetime.utcnow() - timedelta(days=days))
+        if not conditions:
+            return jsonify({"error": "Filter needs at least one of urgency, status, older_than_days"}), 400
+        conditions = [db.and_(*conditions)]
+    else:
+        ids = data[selector]
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return jsonify({"error": f"{selector} must be a list of integers"}), 400
+        if len(ids) > BULK_STATUS_MAX_IDS:
+            return jsonify({"error": f"At most {BULK_STATUS_MAX_IDS} ids per request"}), 400
+        column = Message.customer_id if selector == "customer_ids" else Message.id
+        ids = sorted(set(ids))
+        conditions = [column.in_(ids[start:start + BULK_STATUS_CHUNK])
+                      for start in range(0, len(ids), BULK_STATUS_CHUNK)]
+    
+    if data.get("dry_run"):
+        count = sum(
+            Message.query.filter(condition, Message.status != status).count() for condition in conditions
+        )
+        return jsonify({"success": True, "dry_run": True, "status": status, "updated_count": count})
+    
+    count, customer_ids = bulk_set_status(conditions, status)
+    db.session.commit()
+    
+    if len(customer_ids) > BULK_EVENT_LIMIT:
+        publish_event(["agents"], "resync", {})
+    else:
+        for customer_id in sorted(customer_ids):
+            if selector == "customer_ids":
+                # Whole conversations changed; id/filter batches may only touch some messages
+                publish_event(["agents", customer_channel(customer_id)], "status", {
+                    "customer_id": customer_id, "message_id": None, "status": status
+                })
+            publish_conversation(customer_id)
+    
+    return jsonify({
+        "success": True,
+        "status": status,
+        "updated_count": count,
+        "conversation_count": len(customer_ids)
+    })
+
 # Agent chat functionality
 @app.route("/api/agent/chat/<int:customer_id>", methods=["GET"])
 def agent_get_conversation(customer_id):
@@ -458,50 +3513,44 @@ def agent_get_conversation(customer_id):
         return jsonify({"error": "Unauthorized"}), 401
     
     # Get customer info
-    customer = db.session.get(User, customer_id)
+    customer = user_cache.get(customer_id)
     if not customer:
         return jsonify({"error": "Customer not found"}), 404
         
-    # Get all messages for this customer
-    messages_db = Message.query.filter_by(customer_id=customer_id).order_by(Message.timestamp.asc()).all()
+    scope = Message.query.filter_by(customer_id=customer_id)
+    change = latest_change(scope, Message.updated_at, Message.id)
+    etag, not_modified = not_modified_response(f"chat:{customer_id}", change)
+    if not_modified:
+        return not_modified
     
-    message_list = []
-    for msg in messages_db:
-        # Get replies for this message
-        replies = Reply.query.filter_by(message_id=msg.id).order_by(Reply.timestamp.asc()).all()
-        
-        message_data = {
-            "id": msg.id,
-            "message_text": msg.message_text,
-            "urgency": msg.urgency,
-            "timestamp": msg.timestamp.isoformat(),
-            "status": msg.status,
-            "replies": [
-                {
-                    "id": reply.id,
-                    "agent_name": reply.agent_name,
-                    "reply_text": reply.reply_text,
-                    "timestamp": reply.timestamp.isoformat()
-                }
-                for reply in replies
-            ]
-        }
-        message_list.append(message_data)
-    
-    # Construct response
-    response_data = {
-        "customer": {
-            "id": customer.id,
-            "name": customer.name,
-            "email": customer.email,
-            "phone": customer.phone,
-            "account_type": customer.account_type or "Standard",
-            "department": customer.department 
-        },
-        "messages": message_list
-    }
+    # ?since=<cursor> (or ?after_id=<message id>): only new/changed messages
+    since = request.args.get("since")
+    after_id = request.args.get("after_id", type=int)
+    if since or after_id is not None:
+        if since:
+            try:
+                after = parse_sync_cursor(since)
+            except ValueError:
+                return jsonify({"error": "Invalid cursor"}), 400
+            changed = scope.filter(db.tuple_(Message.updated_at, Message.id) > after)
+        else:
+            changed = scope.filter(Message.id > after_id)
+        messages_db = iter_threads(changed.order_by(Message.timestamp.asc()))
+        response = stream_json(
+            (message_to_dict(msg) for msg in messages_db),
+            {"cursor": sync_cursor(*change) if change else since}, "messages"
+        )
+        return with_sync_headers(response, etag, change)
+    
+    # All messages for this customer, streamed with their replies in batches
+    messages_db = iter_threads(scope.order_by(Message.timestamp.asc()))
+    if wants_archived():
+        messages_db = itertools.chain(archived_threads(customer_id), messages_db)
     
-    return jsonify(response_data)
+    response = stream_json(
+        (message_to_dict(msg) for msg in messages_db), {"customer": customer_to_dict(customer)}, "messages"
+    )
+    return with_sync_headers(response, etag, change)
 
 @app.route("/api/agent/reply", methods=["POST"])
 def agent_send_reply():
@@ -529,12 +3578,23 @@ def agent_send_reply():
     )
     
     db.session.add(reply)
-    db.session.commit()
     
-    # Also update message status to resolved
-    message.status = "Resolved"
+    # Also update message status to resolved (same transaction as the reply)
+    now = datetime.utcnow()
+    reply.timestamp = now
+    message.updated_at = now  # Delta sync picks up the new reply through its message
+    record_first_response(message, agent_name, now)
+    rollup_record(now, replies=1)
+    set_message_status(message, "Resolved")
+    renew_claim(message.customer_id, session.get('user_id'))  # Replying keeps the agent's claim alive
     db.session.commit()
     
+    publish_event(["agents", customer_channel(message.customer_id)], "reply", {
+        "customer_id": message.customer_id, "message_id": message.id, "status": message.status,
+        "reply": reply_to_dict(reply)
+    })
+    publish_conversation(message.customer_id)
+    
     return jsonify({
         "success": True,
         "reply": {
@@ -546,6 +3606,220 @@ def agent_send_reply():
         }
     })
 
+# CSV import
+# Rows are read from the upload stream a chunk at a time; each chunk resolves its emails with one IN (...)
+# query (plus a per-import email -> id cache), bulk inserts new customers and messages, and commits.
+# A bad row (or a chunk the database rejects) is recorded in `errors` and the import carries on.
+# Rows the customer already has a live message for are skipped, so re-uploading a file adds nothing.
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_ERRORS = 100
+IMPORT_HEADER_NAMES = {"name", "customer_name", "email", "customer_email", "message", "message_text"}
+
+def is_header_row(row):
+    return len(row) >= 2 and "@" not in row[1] and row[1].strip().lower() in IMPORT_HEADER_NAMES
+
+def resolve_customer_ids(rows, email_cache):
+    # rows: (line, name, email, ...) tuples; fills email_cache with ids for every email in the chunk
+    missing = {row[2] for row in rows if row[2] not in email_cache}
+    if missing:
+        for user_id, email in db.session.query(User.id, User.email).filter(User.email.in_(missing)):
+            email_cache[email] = user_id
+    new_customers = {}
+    for row in rows:
+        if row[2] not in email_cache and row[2] not in new_customers:
+            new_customers[row[2]] = {
+                "name": row[1], "email": row[2], "role": "customer",
+                "account_type": "Standard", "created_at": datetime.utcnow()
+            }
+    if new_customers:
+        db.session.execute(db.insert(User), list(new_customers.values()))
+        for user_id, email in db.session.query(User.id, User.email).filter(User.email.in_(new_customers)):
+            email_cache[email] = user_id
+
+def import_chunk(rows, email_cache):
+    # rows: (line, name, email, message_text, explicit_urgency) tuples; returns (messages inserted,
+    # duplicates skipped). Rows whose text the customer already has, or that repeat an earlier row, are skipped.
+    resolve_customer_ids(rows, email_cache)
+    scores = detect_urgency_batch([row[3] for row in rows])
+    now = datetime.utcnow()
+    values = [{
+        "customer_id": email_cache[email],
+        "message_text": message_text,
+        "urgency": explicit_urgency or score.urgency,
+        "urgency_terms": ",".join(score.terms)[:255] or None,
+        "urgency_source": "import" if explicit_urgency else score.source,
+        "status": "Open",
+        "timestamp": now
+    } for (line, name, email, message_text, explicit_urgency), score in zip(rows, scores)]
+    folds, repeats = find_duplicates(values, any_status=True)
+    values = [value for index, value in enumerate(values) if index not in folds and index not in repeats]
+    if not values:
+        return 0, len(rows)
+    inserted = db.session.execute(
+        db.insert(Message).returning(
+            Message.id, Message.customer_id, Message.message_text, Message.urgency, Message.status, Message.timestamp
+        ),
+        values
+    ).all()
+    # Fold the new messages into their conversation summaries in the same transaction
+    summary_add_messages(inserted)
+    rollup_messages(inserted)
+    return len(inserted), len(folds) + len(repeats)
+
+def import_messages_csv(text_stream, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    # Expected columns: name, email, message, urgency (optional)
+    # `progress(result)` is called after every committed chunk
+    result = {"count": 0, "duplicates": 0, "failed": 0, "rows": 0, "errors": []}
+    email_cache = {}
+
+    def fail(line, error):
+        result["failed"] += 1
+        if len(result["errors"]) < IMPORT_MAX_ERRORS:
+            result["errors"].append({"row": line, "error": error})
+
+    def insert(rows):
+        # One savepoint per attempt: a failure only undoes these rows
+        with db.session.begin_nested():
+            inserted, duplicates = import_chunk(rows, email_cache)
+        result["count"] += inserted
+        result["duplicates"] += duplicates
+
+    def flush(chunk):
+        try:
+            insert(chunk)
+        except OperationalError as e:
+            # Locked or unavailable database: retrying row by row would only fail slower
+            db.session.rollback()
+            email_cache.clear()  # ids inserted by the rolled back chunk are gone
+            for row in chunk:
+                fail(row[0], f"Database error: {e.__class__.__name__}")
+        except Exception:
+            # Some row broke the bulk insert: retry one row at a time so only the bad ones fail
+            email_cache.clear()
+            for row in chunk:
+                try:
+                    insert([row])
+                except Exception as e:
+                    email_cache.pop(row[2], None)
+                    fail(row[0], f"Database error: {e.__class__.__name__}")
+        db.session.commit()
+        if progress:
+            progress(result)
+
+    chunk = []
+    for line, row in enumerate(csv.reader(text_stream), start=1):
+        if line == 1 and is_header_row(row):
+            continue  # Skip header
+        if not any(cell.strip() for cell in row):
+            continue  # Skip blank lines
+        result["rows"] += 1
+        if len(row) < 3:
+            fail(line, "Expected at least 3 columns: name, email, message")
+            continue
+        name, email, message_text = row[0].strip(), row[1].strip(), row[2].strip()
+        if "@" not in email:
+            fail(line, "Invalid email")
+            continue
+        if not message_text:
+            fail(line, "Message text is required")
+            continue
+        # Smart Urgency Detection: explicit value wins, otherwise auto-detect
+        raw_urgency = row[3].strip().lower() if len(row) > 3 else ""
+        explicit_urgency = raw_urgency.capitalize() if raw_urgency in ['urgent', 'normal'] else None
+        chunk.append((line, name or email.split("@")[0], email, message_text, explicit_urgency))
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    return result
+
+# Background import jobs
+# Uploads are spooled to instance/uploads and imported by a small in-process thread pool,
+# with progress written to the ImportJob row after every chunk.
+IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', 2))
+_import_executor = None
+_import_executor_lock = threading.Lock()
+
+def get_import_executor():
+    global _import_executor
+    with _import_executor_lock:
+        if _import_executor is None:
+            _import_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="import")
+        return _import_executor
+
+def upload_folder():
+    path = os.path.join(app.instance_path, 'uploads')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def submit_import_job(job_id):
+    get_import_executor().submit(run_import_job, job_id)
+
+def run_import_job(job_id):
+    with app.app_context():
+        # Claim the job atomically so two workers never run the same file
+        claimed = ImportJob.query.filter_by(id=job_id, state='queued').update(
+            {ImportJob.state: 'running', ImportJob.started_at: datetime.utcnow()}, synchronize_session=False
+        )
+        db.session.commit()
+        if not claimed:
+            return
+        job = db.session.get(ImportJob, job_id)
+
+        def progress(result):
+            job.rows_processed = result["rows"]
+            job.rows_failed = result["failed"]
+            job.messages_imported = result["count"]
+            job.duplicates_skipped = result["duplicates"]
+            job.errors = json.dumps(result["errors"])
+            db.session.commit()
+            publish_event(["agents"], "import", job_event(job))
+
+        try:
+            with open(job.path, encoding="utf-8-sig", newline="") as f:
+                result = import_messages_csv(f, progress=progress)
+            progress(result)
+            if not result["rows"]:
+                job.state, job.error = 'failed', "Empty CSV"
+            else:
+                job.state = 'completed'
+        except UnicodeDecodeError:
+            db.session.rollback()
+            job.state, job.error = 'failed', "File must be UTF-8 encoded"
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception("Import job %s failed", job_id)
+            job.state, job.error = 'failed', str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        # Imports touch many conversations at once, dashboards reload their inbox on this event
+        publish_event(["agents"], "import", job_event(job))
+        try:
+            os.remove(job.path)
+        except OSError:
+            pass
+
+def job_event(job):
+    data = job.to_dict()
+    data.pop("errors")
+    return data
+
+def fail_interrupted_import_jobs():
+    # Jobs interrupted by a restart can't be resumed safely (rows already committed). Only call this
+    # before any worker runs: under gunicorn from the master, never per worker, where it would fail
+    # jobs that a sibling worker is still running.
+    ImportJob.query.filter_by(state='running').update(
+        {ImportJob.state: 'failed', ImportJob.error: "Interrupted by server restart",
+         ImportJob.finished_at: datetime.utcnow()}, synchronize_session=False
+    )
+    db.session.commit()
+
+def resume_import_jobs():
+    # Queued jobs can be picked up by any process; run_import_job's claim lets only one of them run each
+    for job in ImportJob.query.filter_by(state='queued').all():
+        submit_import_job(job.id)
+
 @app.route("/api/agent/upload-messages", methods=["POST"])
 def agent_upload_messages():
     if session.get('role') != 'agent':
@@ -561,74 +3835,194 @@ def agent_upload_messages():
     if not file.filename.endswith('.csv'):
         return jsonify({"error": "File must be a CSV"}), 400
 
-    try:
-        # Parse CSV
-        stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-        csv_input = csv.reader(stream)
-        
-        # Skip header if present (heuristic: check first row)
-        # Assuming format: name, email, message, urgency
-        rows = list(csv_input)
-        if not rows:
-            return jsonify({"error": "Empty CSV"}), 400
-            
-        count = 0
-        
-        for row in rows:
-            if len(row) < 3: 
-                continue # Skip invalid rows
-                
-            name = row[0].strip()
-            email = row[1].strip()
-            message_text = row[2].strip()
-            
-            # Smart Urgency Detection
-            raw_urgency = row[3].strip() if len(row) > 3 else ""
-            if raw_urgency.lower() in ['urgent', 'normal']:
-                urgency = raw_urgency.capitalize()
-            else:
-                # Auto-detect if not explicitly specified or invalid
-                urgency = detect_urgency(message_text)
-            
-            # Find or Create Customer
-            customer = User.query.filter_by(email=email).first()
-            if not customer:
-                customer = User(
-                    name=name,
-                    email=email,
-                    role='customer',
-                    account_type='Standard'
+    # Spool to disk and hand off to the import workers; the client polls the job for progress
+    path = os.path.join(upload_folder(), f"{uuid.uuid4().hex}.csv")
+    file.save(path)
+    job = ImportJob(
+        filename=file.filename[:255],
+        path=path,
+        state='queued',
+        created_by=session.get('user_id')
+    )
+    db.session.add(job)
+    db.session.commit()
+    submit_import_job(job.id)
+    
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "status_url": url_for('agent_get_upload_job', job_id=job.id)
+    }), 202
+
+@app.route("/api/agent/upload-jobs/<int:job_id>", methods=["GET"])
+def agent_get_upload_job(job_id):
+    if session.get('role') != 'agent':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    job = db.session.get(ImportJob, job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    return jsonify(job.to_dict())
+
+# Bulk export
+# Messages with their replies and customer fields as CSV (one row per message, replies as a JSON
+# list) or NDJSON. Rows come from a server-side cursor EXPORT_BATCH_SIZE at a time on a connection
+# of their own, with one query per batch for its replies and one for its customers, so memory stays
+# flat for any export size and nothing is loaded into the ORM session.
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {"csv": ("text/csv", "csv"), "ndjson": ("application/x-ndjson", "ndjson")}
+EXPORT_CSV_COLUMNS = [
+    "message_id", "customer_id", "customer_name", "customer_email", "customer_phone", "account_type",
+    "message_text", "urgency", "urgency_terms", "status", "timestamp", "updated_at", "first_response_at",
+    "first_response_seconds", "first_responder", "duplicate_count", "duplicate_of", "archived", "reply_count", "replies"
+]
+
+def export_record(row, customer, replies, archived):
+    return {
+        "message_id": row.id,
+        "customer_id": row.customer_id,
+        "customer_name": customer.name if customer else None,
+        "customer_email": customer.email if customer else None,
+        "customer_phone": customer.phone if customer else None,
+        "account_type": customer.account_type if customer else None,
+        "message_text": row.message_text,
+        "urgency": row.urgency,
+        "urgency_terms": row.urgency_terms,
+        "status": row.status,
+        "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+        "first_response_at": row.first_response_at.isoformat() if row.first_response_at else None,
+        "first_response_seconds": row.first_response_seconds,
+        "first_responder": row.first_responder,
+        "duplicate_count": row.duplicate_count or 0,
+        "duplicate_of": row.duplicate_of,
+        "archived": archived,
+        "replies": [{
+            "id": reply.id,
+            "agent_name": reply.agent_name,
+            "reply_text": reply.reply_text,
+            "timestamp": reply.timestamp.isoformat() if reply.timestamp else None
+        } for reply in replies]
+    }
+
+def export_batches(engine, statement, reply_table):
+    # (message rows, {message_id: [reply rows]}) per EXPORT_BATCH_SIZE messages
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE).execute(statement)
+        for batch in result.partitions():
+            replies = {}
+            for reply in conn.execute(db.select(reply_table).where(
+                reply_table.c.message_id.in_([row.id for row in batch])
+            ).order_by(reply_table.c.timestamp, reply_table.c.id)):
+                replies.setdefault(reply.message_id, []).append(reply)
+            yield batch, replies
+
+def export_records(start=None, end=None, status=None, urgency=None, include_archived=False):
+    # Export dicts ordered by (timestamp, message_id); start is inclusive, end exclusive. Archived
+    # messages are merged in from their own cursor. Engines are resolved now, rows are read lazily
+    # (after the request context is gone when streamed).
+    sources = [(db.engine, Message.__table__, Reply.__table__, False)]
+    if include_archived:
+        sources.append((db.engines['archive'], ArchivedMessage.__table__, ArchivedReply.__table__, True))
+    users_engine = db.engine
+    U = User.__table__
+
+    def records(engine, messages, replies, archived, users_conn):
+        conditions = []
+        if start is not None:
+            conditions.append(messages.c.timestamp >= start)
+        if end is not None:
+            conditions.append(messages.c.timestamp < end)
+        if status:
+            conditions.append(messages.c.status == status)
+        if urgency:
+            conditions.append(messages.c.urgency == urgency)
+        statement = db.select(messages).where(*conditions).order_by(messages.c.timestamp, messages.c.id)
+        for batch, batch_replies in export_batches(engine, statement, replies):
+            customers = {row.id: row for row in users_conn.execute(
+                db.select(U.c.id, U.c.name, U.c.email, U.c.phone, U.c.account_type).where(
+                    U.c.id.in_({row.customer_id for row in batch})
                 )
-                db.session.add(customer)
-                db.session.commit() # Commit to get ID
-            
-            # Create Message
-            msg = Message(
-                customer_id=customer.id,
-                message_text=message_text,
-                urgency=urgency,
-                status='Open',
-                timestamp=datetime.utcnow()
-            )
-            db.session.add(msg)
-            count += 1
-            
-        db.session.commit()
-        
-        return jsonify({"success": True, "count": count})
-        
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+            )}
+            for row in batch:
+                yield export_record(row, customers.get(row.customer_id), batch_replies.get(row.id, []), archived)
+
+    def merged():
+        with users_engine.connect() as users_conn:
+            streams = [records(*source, users_conn) for source in sources]
+            try:
+                yield from heapq.merge(*streams, key=lambda record: (record["timestamp"] or "", record["message_id"]))
+            finally:
+                for stream in streams:
+                    stream.close()  # Returns the cursors' connections if the client went away
+    return merged()
+
+def export_csv_chunks(records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_COLUMNS)
+    for record in records:
+        record["reply_count"] = len(record["replies"])
+        record["replies"] = json.dumps(record["replies"], ensure_ascii=False)
+        writer.writerow([record[column] for column in EXPORT_CSV_COLUMNS])
+        if buffer.tell() >= STREAM_CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+def export_chunks(records, export_format):
+    if export_format == "csv":
+        return export_csv_chunks(records)
+    return json_chunks(records, ndjson=True)
+
+@app.route("/api/agent/export", methods=["GET"])
+def agent_export_messages():
+    # ?format=csv|ndjson&start=&end= (ISO dates or timestamps, end exclusive)&status=&urgency=&include_archived=1
+    if session.get('role') != 'agent':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    export_format = request.args.get("format", "csv")
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    status = request.args.get("status")
+    if status and status not in ("Open", "Resolved"):
+        return jsonify({"error": "Invalid status"}), 400
+    urgency = request.args.get("urgency")
+    if urgency and urgency not in ("Urgent", "Normal"):
+        return jsonify({"error": "Invalid urgency"}), 400
+    bounds = {}
+    for name in ("start", "end"):
+        value = request.args.get(name)
+        if value:
+            try:
+                bounds[name] = datetime.fromisoformat(value)
+            except ValueError:
+                return jsonify({"error": f"Invalid {name}, use YYYY-MM-DD or an ISO timestamp"}), 400
+    
+    records = export_records(status=status, urgency=urgency, include_archived=wants_archived(), **bounds)
+    chunks = export_chunks(records, export_format)
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    response = Response(mimetype=mimetype)
+    if accepts_gzip():
+        chunks = gzip_chunks(chunks)
+        response.headers["Content-Encoding"] = "gzip"
+    response.response = chunks
+    response.vary.add("Accept-Encoding")
+    filename = f"messages-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{extension}"
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
 
 @app.route("/api/agent/analytics", methods=["GET"])
 def agent_analytics_api():
     if session.get('role') != 'agent':
         return jsonify({"error": "Unauthorized"}), 401
     
-    total = Message.query.count()
-    open_msgs = Message.query.filter_by(status='Open').count()
-    urgent = Message.query.filter_by(urgency='Urgent').count() # All urgent messages
-    resolved = Message.query.filter_by(status='Resolved').count()
+    total = count_messages()
+    open_msgs = count_messages(status='Open')
+    urgent = count_messages(urgency='Urgent') # All urgent messages
+    resolved = count_messages(status='Resolved')
     
     return jsonify({
         "total": total,
@@ -637,10 +4031,117 @@ def agent_analytics_api():
         "resolved": resolved
     })
 
+# Server-Sent Events
+SSE_KEEPALIVE_SECONDS = 15
+SSE_STREAM_SECONDS = int(os.environ.get('SSE_STREAM_SECONDS', 300))  # Browsers reconnect automatically
+# Every open stream holds a worker thread for up to SSE_STREAM_SECONDS, so a process only streams to
+# SSE_MAX_STREAMS clients and keeps its other threads for requests. Above the cap /api/events answers
+# 503 and pages fall back to polling.
+SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 8))
+_sse_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+def format_sse(event_id, event_type, data):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+@app.route("/api/events")
+def event_stream():
+    role = session.get('role')
+    user_id = session.get('user_id')
+    if role == 'agent':
+        channels = ["agents"]
+    elif role == 'customer' and user_id:
+        channels = [customer_channel(user_id)]
+    else:
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    if not _sse_slots.acquire(blocking=False):
+        response = jsonify({"error": "Too many live connections, poll instead"})
+        response.headers["Retry-After"] = str(SSE_STREAM_SECONDS)
+        return response, 503
+    try:
+        subscription = event_bus.subscribe(channels)
+    except Exception:
+        _sse_slots.release()
+        raise
+    
+    def generate():
+        yield "retry: 3000\n\n"
+        yield format_sse(None, "ready", {"channels": channels})
+        deadline = time.monotonic() + SSE_STREAM_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            event = subscription.get(timeout=min(SSE_KEEPALIVE_SECONDS, remaining))
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(*event)
+    
+    def close():
+        subscription.close()
+        _sse_slots.release()
+    
+    response = Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+    # On close rather than a finally in generate(): a response closed before its first chunk never
+    # runs the generator, and the slot would leak
+    response.call_on_close(close)
+    return response
+
+@app.route("/api/agent/analytics/response-times", methods=["GET"])
+def agent_response_times_api():
+    if session.get('role') != 'agent':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    dimension = request.args.get("dimension", "all")
+    if dimension not in ["all", "agent", "urgency"]:
+        return jsonify({"error": "Invalid dimension"}), 400
+    
+    days = request.args.get("days", 7, type=int)
+    if days is None or days < 1:
+        return jsonify({"error": "Invalid days"}), 400
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+    
+    return jsonify({
+        "dimension": dimension,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "stats": response_time_stats(dimension, start=start, end=end)
+    })
+
+@app.route("/api/agent/analytics/trends", methods=["GET"])
+def agent_trends_api():
+    if session.get('role') != 'agent':
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    granularity = request.args.get("granularity", "day")
+    if granularity not in ["hour", "day"]:
+        return jsonify({"error": "Invalid granularity"}), 400
+    
+    days = request.args.get("days", 2 if granularity == 'hour' else 30, type=int)
+    if days is None or days < 1 or (granularity == 'hour' and days > ROLLUP_HOURLY_DAYS):
+        return jsonify({"error": "Invalid days"}), 400
+    end = datetime.utcnow()
+    start = end - timedelta(days=days) + (timedelta(hours=1) if granularity == 'hour' else timedelta(days=1))
+    
+    return jsonify({
+        "granularity": granularity,
+        "series": rollup_series(granularity, start, end)
+    })
+
 @app.route('/api/session')
 def get_session():
     if session.get('user_id') and session.get('role'):
-        user = db.session.get(User, session.get('user_id'))
+        user = user_cache.get(session.get('user_id'))
         if user:
             return jsonify({
                 'user': {
@@ -660,6 +4161,216 @@ def logout():
     session.pop('role', None)
     return redirect(url_for('index'))
 
+# Maintenance commands
+@app.cli.command("rebuild-summaries")
+@click.option("--verify", is_flag=True, help="Only compare stored summaries with a fresh aggregation.")
+def rebuild_summaries_command(verify):
+    """Rebuild (or verify) the conversation summary table from the Message table."""
+    if verify:
+        mismatched = verify_conversation_summaries()
+        if mismatched:
+            click.echo(f"{len(mismatched)} conversation summaries out of date: {mismatched[:20]}")
+            raise SystemExit(1)
+        click.echo("Conversation summaries OK")
+        return
+    rebuild_conversation_summaries()
+    db.session.commit()
+    click.echo(f"Rebuilt {ConversationSummary.query.count()} conversation summaries")
+
+def ensure_columns():
+    # create_all() never alters existing tables: add new nullable columns to older databases
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(db.text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+
+SEARCH_TRIGGERS = re.findall(r"CREATE TRIGGER IF NOT EXISTS (\w+)", " ".join(FTS5_SCHEMA))
+
+def ensure_autoincrement():
+    # Archiving deletes the newest rows too, and SQLite reuses the largest rowid unless the table is
+    # AUTOINCREMENT. Databases created before message/reply were get those tables rebuilt once (ids
+    # kept), and neither sequence ever starts below an id already in the archive.
+    if db.engine.dialect.name != 'sqlite':
+        return
+    tables = [(Message.__table__, ArchivedMessage), (Reply.__table__, ArchivedReply)]
+    archived = {table.name: db.session.query(db.func.max(model.id)).scalar() or 0 for table, model in tables}
+    db.session.commit()
+    with db.engine.begin() as conn:
+        for table, _ in tables:
+            sql = conn.execute(db.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                               {"name": table.name}).scalar()
+            if sql is not None and "AUTOINCREMENT" not in sql.upper():
+                rebuild_with_autoincrement(conn, table)
+            if archived[table.name]:
+                params = {"name": table.name, "seq": archived[table.name]}
+                conn.execute(db.text("INSERT INTO sqlite_sequence (name, seq) SELECT :name, 0 "
+                                     "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"), params)
+                conn.execute(db.text("UPDATE sqlite_sequence SET seq = max(seq, :seq) WHERE name = :name"), params)
+
+def rebuild_with_autoincrement(conn, table):
+    # SQLite can't alter a primary key: copy into a new table, drop the old one and rename. Its indexes
+    # go with the old table and the search triggers are dropped first (they name it); ensure_indexes
+    # and ensure_search_index put both back. The search index itself keeps its rows.
+    for name in SEARCH_TRIGGERS:
+        conn.execute(db.text(f"DROP TRIGGER IF EXISTS {name}"))
+    staging = f"{table.name}_rebuild"
+    ddl = str(CreateTable(table).compile(dialect=conn.dialect))
+    ddl = re.sub(rf'CREATE TABLE "?{table.name}"? ', f"CREATE TABLE {staging} ", ddl, count=1)
+    conn.execute(db.text(ddl))
+    columns = ", ".join(f'"{column.name}"' for column in table.columns)
+    conn.execute(db.text(f'INSERT INTO {staging} ({columns}) SELECT {columns} FROM "{table.name}"'))
+    conn.execute(db.text(f'DROP TABLE "{table.name}"'))
+    conn.execute(db.text(f'ALTER TABLE {staging} RENAME TO "{table.name}"'))
+
+def ensure_indexes():
+    # create_all() skips indexes on tables that already exist, so add any missing ones
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+@app.cli.command("rebuild-search-index")
+def rebuild_search_index_command():
+    """Recreate the full-text search index from messages, replies and customers."""
+    ensure_search_index()
+    backend = get_search_backend()
+    backend.rebuild()
+    db.session.commit()
+    click.echo(f"Rebuilt search index ({backend.name})")
+
+@app.cli.command("backfill-response-times")
+def backfill_response_times_command():
+    """Recompute first-response times and response time histograms from existing replies."""
+    count = backfill_response_times()
+    db.session.commit()
+    click.echo(f"Backfilled first response times for {count} messages")
+
+@app.cli.command("compact-rollups")
+def compact_rollups_command():
+    """Merge hourly analytics rollups older than the retention window into daily rollups."""
+    count = compact_rollups()
+    db.session.commit()
+    click.echo(f"Compacted {count} hourly rollups")
+
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    """Recompute analytics rollups from messages and replies."""
+    rebuild_rollups()
+    db.session.commit()
+    click.echo(f"Rebuilt {MessageRollup.query.count()} rollups")
+
+@app.cli.command("train-urgency-model")
+@click.option("--labels", type=click.Choice(["reviewed", "all"]), default="reviewed", show_default=True,
+              help="reviewed: urgency set by an agent or an import file; all: every resolved message.")
+@click.option("--bits", default=18, show_default=True, help="2**bits hash buckets, 4 bytes each in the model file.")
+@click.option("--threshold", default=0.5, show_default=True, help="Urgent above this probability.")
+@click.option("--output", "-o", default=URGENCY_MODEL_FILE, show_default=True)
+def train_urgency_model_command(labels, bits, threshold, output):
+    """Train the urgency classifier from resolved messages; workers pick up the new file by themselves."""
+    try:
+        model, report = train_urgency_model(labels, bits, threshold)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    model.save(output)
+    click.echo(f"Trained on {report['trained_on']['Urgent']} urgent and {report['trained_on']['Normal']} normal messages")
+    for name, metrics in report.get("holdout", {}).items():
+        click.echo(f"  {name:5} on {metrics['examples']} held out: accuracy {metrics['accuracy']}, "
+                   f"precision {metrics['precision']}, recall {metrics['recall']}")
+    click.echo(f"Saved {output}")
+
+@app.cli.command("export-messages")
+@click.option("--format", "export_format", type=click.Choice(sorted(EXPORT_FORMATS)), default="csv", show_default=True)
+@click.option("--output", "-o", default="-", show_default=True, help="File to write, - for stdout.")
+@click.option("--start", type=click.DateTime(), help="Messages sent at or after this time.")
+@click.option("--end", type=click.DateTime(), help="Messages sent before this time.")
+@click.option("--status", type=click.Choice(["Open", "Resolved"]))
+@click.option("--urgency", type=click.Choice(["Urgent", "Normal"]))
+@click.option("--include-archived", is_flag=True, help="Also export archived conversations.")
+@click.option("--gzip", "compress", is_flag=True, help="Gzip the output.")
+def export_messages_command(export_format, output, start, end, status, urgency, include_archived, compress):
+    """Export messages with their replies and customer fields as CSV or NDJSON."""
+    count = 0
+
+    def counted(records):
+        nonlocal count
+        for record in records:
+            count += 1
+            yield record
+
+    chunks = export_chunks(counted(export_records(start, end, status, urgency, include_archived)), export_format)
+    if compress:
+        chunks = gzip_chunks(chunks)
+    with click.open_file(output, "wb") as out:
+        for chunk in chunks:
+            out.write(chunk)
+    click.echo(f"Exported {count} messages", err=True)
+
+@app.cli.command("archive-conversations")
+@click.option("--older-than-days", type=float, default=None,
+              help=f"Archive conversations idle for this many days (default ARCHIVE_AFTER_DAYS={ARCHIVE_AFTER_DAYS:g}).")
+@click.option("--batch-size", default=ARCHIVE_BATCH_SIZE, show_default=True, help="Conversations per transaction.")
+def archive_conversations_command(older_than_days, batch_size):
+    """Move long-resolved conversations out of the live tables into the archive."""
+    conversations, messages = archive_conversations(
+        older_than_days, batch_size,
+        progress=lambda c, m: click.echo(f"  {c} conversations, {m} messages")
+    )
+    click.echo(f"Archived {conversations} conversations ({messages} messages)")
+
+@app.cli.command("rebuild-archive-search-index")
+def rebuild_archive_search_index_command():
+    """Recreate the full-text search index of archived messages."""
+    ensure_archive_search()
+    backend = get_archive_search_backend()
+    if backend is ArchiveSearchBackend:
+        backend.rebuild()
+        db.session.commit()
+    click.echo(f"Rebuilt archive search index ({backend.name})")
+
+def ensure_rollups():
+    # Existing databases predate the rollup table: build it once
+    if MessageRollup.query.first() is None and Message.query.first() is not None:
+        rebuild_rollups()
+        db.session.commit()
+
+def ensure_conversation_summaries():
+    # Existing databases predate the summary table: build it once
+    if ConversationSummary.query.first() is None and Message.query.first() is not None:
+        rebuild_conversation_summaries()
+        db.session.commit()
+
+def init_db():
+    # Create or upgrade the schema and derived tables; safe to run on every start
+    db.create_all()
+    ensure_columns()
+    ensure_autoincrement()
+    ensure_indexes()
+    backfill_sync_columns()
+    backfill_fingerprints()
+    ensure_conversation_summaries()
+    ensure_search_index()
+    ensure_archive_search()
+    ensure_rollups()
+    ensure_queue()
+
+def start_background_tasks():
+    # Per-process work: resume queued imports, compact rollups, archive idle conversations
+    resume_import_jobs()
+    start_rollup_compactor()
+    start_archiver()
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Create or upgrade the database schema, indexes and derived tables."""
+    init_db()
+    click.echo(f"Initialized {db.engine.url.render_as_string(hide_password=True)}")
+
 # For development/testing purposes
 if __name__ == "__main__":
     # Create a new database file to ensure schema is updated
@@ -667,5 +4378,7 @@ if __name__ == "__main__":
     #     os.remove('support.db')
     
     with app.app_context():
-        db.create_all()
+        init_db()
+        fail_interrupted_import_jobs()
+        start_background_tasks()
     app.run(debug=True, host='0.0.0.0')
\ No newline at end of file
@@ -0,0 +1,37 @@
+# Benchmark tooling: synthetic datasets (benchmarks.generate), endpoint latency harness
+# (benchmarks.run), report comparison (benchmarks.compare) and the urgency classifier against
+# the keyword rules (benchmarks.urgency). Run from the repository root:
+#
+#   python -m benchmarks.generate --customers 100000 --messages-per-customer 10
+#   python -m benchmarks.run --output before.json
+#   python -m benchmarks.compare before.json after.json
+#   python -m benchmarks.urgency
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATABASE_URL = 'sqlite:///benchmark.db'  # instance/benchmark.db
+
+def sqlite_path(database_url):
+    # Filesystem path of a SQLite URL, resolved like Flask-SQLAlchemy does (relative to instance/)
+    if not database_url.startswith('sqlite:'):
+        return None
+    path = database_url.split(':///', 1)[1] if ':///' in database_url else ''
+    if path in ('', ':memory:'):
+        return None
+    if not os.path.isabs(path):
+        path = os.path.join(REPO_ROOT, 'instance', path)
+    return path
+
+def load_app(database_url):
+    # app.py reads DATABASE_URL at import time, so it must be set before the first import
+    module = sys.modules.get('app')
+    if module is not None:
+        if module.DATABASE_URL != database_url:
+            raise RuntimeError(f"app already loaded with {module.DATABASE_URL}")
+        return module
+    os.environ['DATABASE_URL'] = database_url
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    import app
+    return app
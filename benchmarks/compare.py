@@ -0,0 +1,52 @@
+# Compare two benchmark reports endpoint by endpoint; exits non-zero on regressions so it can
+# gate CI or a bisect run.
+import json
+
+import click
+
+METRICS = ["p50_ms", "p95_ms", "p99_ms", "queries_per_request"]
+
+def change(before, after):
+    if before is None or after is None:
+        return None
+    if before == 0:
+        return 0.0 if after == 0 else float("inf")
+    return (after - before) / before
+
+@click.command()
+@click.argument("before", type=click.File())
+@click.argument("after", type=click.File())
+@click.option("--metric", "metrics", multiple=True, default=["p95_ms", "queries_per_request"], show_default=True,
+              type=click.Choice(METRICS), help="Metrics that count as regressions (repeatable)")
+@click.option("--threshold", default=0.2, show_default=True, help="Allowed relative increase, 0.2 = 20%")
+@click.option("--min-ms", default=1.0, show_default=True, help="Ignore latency changes smaller than this")
+def main(before, after, metrics, threshold, min_ms):
+    """Show per-endpoint changes between two reports from benchmarks.run."""
+    old, new = json.load(before), json.load(after)
+    click.echo(f"before: {old['meta'].get('commit')}  {old['meta'].get('dataset')}")
+    click.echo(f"after:  {new['meta'].get('commit')}  {new['meta'].get('dataset')}")
+    regressions = []
+    click.echo(f"{'endpoint':28}" + "".join(f"{metric:>26}" for metric in METRICS))
+    for name in sorted(set(old["endpoints"]) | set(new["endpoints"])):
+        a, b = old["endpoints"].get(name), new["endpoints"].get(name)
+        if a is None or b is None:
+            click.echo(f"{name:28} {'only in before' if b is None else 'only in after'}")
+            continue
+        cells = []
+        for metric in METRICS:
+            delta = change(a.get(metric), b.get(metric))
+            if delta is None:
+                cells.append(f"{'-':>26}")
+                continue
+            cells.append(f"{a[metric]:>10} -> {b[metric]:<8} {delta:+7.0%}")
+            small = metric.endswith("_ms") and b[metric] - a[metric] < min_ms
+            if metric in metrics and delta > threshold and not small:
+                regressions.append(f"{name} {metric} {a[metric]} -> {b[metric]}")
+        click.echo(f"{name:28}" + "".join(cells))
+    if regressions:
+        click.echo("\nRegressions:\n  " + "\n  ".join(regressions))
+        raise SystemExit(1)
+    click.echo("\nNo regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# Synthetic dataset generator. The same options and seed always produce the same rows (timestamps
+# relative to generation time), so reports from different commits measure identical workloads.
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import click
+
+from benchmarks import DEFAULT_DATABASE_URL, load_app, sqlite_path
+
+FIRST_NAMES = ["Amit", "Riya", "Rahul", "Priya", "Arjun", "Neha", "Vikram", "Sneha", "Karan", "Anjali",
+               "Rohan", "Pooja", "Sanjay", "Meera", "Aditya", "Kavya", "Nikhil", "Isha", "Varun", "Divya"]
+LAST_NAMES = ["Sharma", "Verma", "Gupta", "Singh", "Patel", "Kumar", "Reddy", "Iyer", "Nair", "Das"]
+
+# Most urgent texts contain words from the default urgency rules and most normal ones don't, but
+# like real traffic some normal questions say "help" or "loan" and some urgent ones use neither,
+# so the keyword rules are measurably wrong (see benchmarks.urgency)
+URGENT_TEMPLATES = [
+    "My loan disbursement is delayed for {days} days, please help",
+    "Urgent: money debited twice from account ending {digits}",
+    "Loan approval still pending after {days} days, this is a serious problem",
+    "There is an issue with my EMI payment of Rs {amount}, need help immediately",
+    "Disbursal delayed again, I need the money for {purpose}",
+    "Account ending {digits} was charged Rs {amount} that I never spent, please block my card now",
+    "Nobody has answered me for {days} days and the bank is threatening a penalty",
+]
+NORMAL_TEMPLATES = [
+    "How do I update my {field} on the profile page?",
+    "Can I get a statement for {month}?",
+    "What documents are required for {purpose}?",
+    "Thanks for the quick response last time about {field}",
+    "Is it possible to change the EMI date to the {day}th?",
+    "Where can I download the interest certificate for {month}?",
+    "Can you help me find the loan agreement for {purpose}?",
+    "Thanks for the help with my {field}, no problem anymore",
+    "Is there a fee if I prepay my loan in {month}?",
+]
+FIELDS = ["address", "phone number", "email", "nominee", "bank account", "PAN details"]
+MONTHS = ["January", "February", "March", "April", "May", "June",
+          "July", "August", "September", "October", "November", "December"]
+PURPOSES = ["home renovation", "education", "a medical emergency", "a car purchase", "my business"]
+REPLY_TEMPLATES = [
+    "Thanks for reaching out, we have escalated this to the loans team.",
+    "We have updated your request, please check again in 24 hours.",
+    "The document list has been sent to your registered email.",
+    "Your issue is resolved, please let us know if anything else comes up.",
+]
+
+def message_text(rng, urgent):
+    template = rng.choice(URGENT_TEMPLATES if urgent else NORMAL_TEMPLATES)
+    return template.format(
+        days=rng.randint(2, 30), digits=rng.randint(1000, 9999), amount=rng.randint(1, 90) * 500,
+        purpose=rng.choice(PURPOSES), field=rng.choice(FIELDS), month=rng.choice(MONTHS),
+        day=rng.randint(1, 28)
+    )
+
+def reset_database(app_module, database_url):
+    path = sqlite_path(database_url)
+    if path:
+        # Every bind, or a pooled archive connection would keep the old file open
+        for engine in app_module.db.engines.values():
+            engine.dispose()
+        archive_path = sqlite_path(str(app_module.db.engines["archive"].url))
+        for base in {path, archive_path or path}:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(base + suffix):
+                    os.remove(base + suffix)
+    else:
+        app_module.db.drop_all()
+
+def generate(app_module, customers, messages_per_customer, reply_ratio, urgent_ratio, agents, days,
+             seed, batch_size, end=None, echo=print):
+    # Rows go in with plain bulk INSERTs; summaries, search index, rollups and response time
+    # histograms are then derived in one pass each, exactly like an upgraded database.
+    A = app_module
+    db = A.db
+    rng = random.Random(seed)
+    end = end or datetime.utcnow().replace(microsecond=0)
+    span = days * 86400
+    db.create_all()
+
+    db.session.execute(db.insert(A.User), [{
+        "name": f"Agent {i + 1}", "email": f"agent{i + 1}@bench.local", "role": "agent",
+        "department": "Support", "created_at": end - timedelta(seconds=span)
+    } for i in range(agents)])
+    agent_names = [f"Agent {i + 1}" for i in range(agents)]
+
+    totals = {"customers": 0, "messages": 0, "replies": 0}
+    started = time.monotonic()
+    for first in range(0, customers, batch_size):
+        count = min(batch_size, customers - first)
+        db.session.execute(db.insert(A.User), [{
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "email": f"customer{first + i + 1}@bench.local", "role": "customer", "account_type": "Standard",
+            "created_at": end - timedelta(seconds=span)
+        } for i in range(count)])
+        emails = [f"customer{first + i + 1}@bench.local" for i in range(count)]
+        ids = dict(db.session.query(A.User.email, A.User.id).filter(A.User.email.in_(emails)).all())
+
+        messages = []
+        for email in emails:
+            # Mean of messages_per_customer, at least one per customer
+            n = max(1, int(rng.expovariate(1 / messages_per_customer) + 0.5))
+            for _ in range(n):
+                urgent = rng.random() < urgent_ratio
+                timestamp = end - timedelta(seconds=rng.randint(0, span))
+                replied = rng.random() < reply_ratio
+                messages.append((ids[email], urgent, timestamp, replied))
+        rows = [{
+            "customer_id": customer_id, "message_text": message_text(rng, urgent),
+            "urgency": "Urgent" if urgent else "Normal", "status": "Resolved" if replied else "Open",
+            "timestamp": timestamp, "updated_at": timestamp
+        } for customer_id, urgent, timestamp, replied in messages]
+        inserted = db.session.execute(
+            db.insert(A.Message).returning(A.Message.id, sort_by_parameter_order=True), rows
+        ).all()
+
+        replies = []
+        updates = []
+        for (message_id,), (customer_id, urgent, timestamp, replied) in zip(inserted, messages):
+            if not replied:
+                continue
+            # Urgent messages get answered faster on average
+            delay = rng.expovariate(1 / (1800 if urgent else 7200))
+            replied_at = min(end, timestamp + timedelta(seconds=delay))
+            replies.append({
+                "message_id": message_id, "agent_name": rng.choice(agent_names),
+                "reply_text": rng.choice(REPLY_TEMPLATES), "timestamp": replied_at
+            })
+            updates.append({"mid": message_id, "at": replied_at})
+        if replies:
+            db.session.execute(db.insert(A.Reply), replies)
+            M = A.Message.__table__
+            db.session.execute(
+                db.update(M).where(M.c.id == db.bindparam("mid")).values(updated_at=db.bindparam("at")), updates
+            )
+        db.session.commit()
+        totals["customers"] += count
+        totals["messages"] += len(rows)
+        totals["replies"] += len(replies)
+        echo(f"  {totals['customers']} customers, {totals['messages']} messages, "
+             f"{totals['replies']} replies ({time.monotonic() - started:.0f}s)")
+
+    echo("Building derived tables...")
+    A.init_db()
+    A.backfill_response_times()
+    db.session.commit()
+    totals["seconds"] = round(time.monotonic() - started, 1)
+    return totals
+
+@click.command()
+@click.option("--database-url", default=DEFAULT_DATABASE_URL, show_default=True)
+@click.option("--customers", default=10000, show_default=True)
+@click.option("--messages-per-customer", default=10.0, show_default=True, help="Mean, exponentially distributed")
+@click.option("--reply-ratio", default=0.6, show_default=True, help="Share of messages that got a reply (and were resolved)")
+@click.option("--urgent-ratio", default=0.2, show_default=True)
+@click.option("--agents", default=20, show_default=True)
+@click.option("--days", default=90, show_default=True, help="Messages are spread over this many days")
+@click.option("--seed", default=1, show_default=True)
+@click.option("--batch-size", default=2000, show_default=True, help="Customers per transaction")
+@click.option("--reset/--no-reset", default=True, show_default=True, help="Start from an empty database")
+def main(database_url, customers, messages_per_customer, reply_ratio, urgent_ratio, agents, days, seed,
+         batch_size, reset):
+    """Fill a database with a reproducible synthetic support workload."""
+    A = load_app(database_url)
+    with A.app.app_context():
+        if reset:
+            reset_database(A, database_url)
+        click.echo(f"Generating into {A.db.engine.url.render_as_string(hide_password=True)}")
+        totals = generate(A, customers, messages_per_customer, reply_ratio, urgent_ratio, agents, days,
+                          seed, batch_size, echo=click.echo)
+    click.echo(f"Done: {totals}")
+
+if __name__ == "__main__":
+    main()
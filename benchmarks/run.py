@@ -0,0 +1,442 @@
+# Endpoint latency harness. Drives every /api route either in-process through the Flask test
+# client or over HTTP against gunicorn (query counts then come from the Server-Timing header),
+# and writes a JSON report that benchmarks.compare can diff across commits.
+import http.cookiejar
+import io
+import json
+import math
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import event
+
+from benchmarks import DEFAULT_DATABASE_URL, REPO_ROOT, load_app, sqlite_path
+
+UPLOAD_CSV = "name,email,message\n" + "".join(
+    f"Bench {i},bench-upload{i}@bench.local,Loan disbursement delayed please help {i}\n" for i in range(20)
+)
+SSE_REQUESTS = 10  # Event streams hold a server thread each, so they get fewer iterations
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+class Samples:
+    # rng-driven request parameters, picked from the dataset up front
+    def __init__(self, A, seed):
+        db = A.db
+        rng = random.Random(seed)
+        self.A = A
+        self.rng = rng
+        agent = db.session.query(A.User.id, A.User.name, A.User.email).filter(A.User.role == 'agent').order_by(A.User.id).first()
+        self.agent_id, self.agent_name, self.agent_email = agent if agent else (None, None, None)
+        customers = [row[0] for row in db.session.query(A.ConversationSummary.customer_id)
+                     .order_by(A.ConversationSummary.customer_id).limit(5000)]
+        if not customers or not self.agent_email:
+            raise click.ClickException("Database has no agents or conversations; run benchmarks.generate first")
+        self.customer_ids = customers
+        self.customer_emails = dict(db.session.query(A.User.id, A.User.email).filter(A.User.id.in_(customers)))
+        self.message_ids = [row[0] for row in db.session.query(A.Message.id).order_by(A.Message.id).limit(5000)]
+        # One full day of messages for the export scenario: the last complete day in the dataset
+        latest = db.session.query(db.func.max(A.Message.timestamp)).scalar()
+        self.export_day = (latest or datetime.utcnow()).date() - timedelta(days=1)
+        self.search_terms = ["loan", "delayed", "statement", "profile", "money", "certificate", "urgent help"]
+        # The job status endpoint needs an existing job; a finished one keeps the timing stable
+        self.job_id = db.session.query(db.func.max(A.ImportJob.id)).scalar()
+        if self.job_id is None:
+            job = A.ImportJob(filename="bench.csv", path="", state="completed", finished_at=datetime.utcnow())
+            db.session.add(job)
+            db.session.commit()
+            self.job_id = job.id
+        self.held = None
+
+    def customer_id(self):
+        return self.rng.choice(self.customer_ids)
+
+    def message_id(self):
+        return self.rng.choice(self.message_ids)
+
+    def claim(self):
+        # Hands the benchmark agent an unclaimed queue entry directly (untimed) for the renew/release
+        # scenarios; returns its customer id
+        A = self.A
+        Q = A.QueueEntry
+        entry = Q.query.filter(Q.claimed_by.is_(None)).order_by(Q.priority.desc(), Q.due_at).first()
+        if entry is None:
+            raise click.ClickException("No unclaimed conversations left in the work queue")
+        entry.claimed_by, entry.claimed_by_name = self.agent_id, self.agent_name
+        entry.claim_expires_at = datetime.utcnow() + timedelta(seconds=A.QUEUE_LEASE_SECONDS)
+        A.db.session.commit()
+        return entry.customer_id
+
+    def held_claim(self):
+        if self.held is None:
+            self.held = self.claim()
+        return self.held
+
+def scenarios(samples):
+    # name -> (role, rule, builder); builder returns (method, path, json_body, extra). Status
+    # changes alternate so repeated runs leave the data roughly where it started.
+    s = samples
+    flip = {"value": "Open", "urgency": "Normal"}
+
+    def toggled():
+        flip["value"] = "Resolved" if flip["value"] == "Open" else "Open"
+        return flip["value"]
+
+    def toggled_urgency():
+        flip["urgency"] = "Urgent" if flip["urgency"] == "Normal" else "Normal"
+        return flip["urgency"]
+
+    return {
+        "login": ("none", "/api/login", lambda: ("POST", "/api/login", {"email": s.agent_email, "role": "agent"}, {})),
+        "register": ("none", "/api/register", lambda: ("POST", "/api/register", {
+            "name": "Bench Register", "email": f"bench-register-{time.time_ns()}@bench.local", "role": "customer"
+        }, {})),
+        "session": ("agent", "/api/session", lambda: ("GET", "/api/session", None, {})),
+        "dashboard_page": ("agent", "/dashboard", lambda: ("GET", "/dashboard", None, {})),
+        "customer_send_message": ("customer", "/api/customer/message", lambda: (
+            "POST", "/api/customer/message", {"message": "Benchmark: loan disbursement delayed, please help"}, {}
+        )),
+        "customer_messages": ("customer", "/api/customer/messages", lambda: ("GET", "/api/customer/messages", None, {})),
+        "agent_inbox": ("agent", "/api/agent/messages", lambda: ("GET", "/api/agent/messages", None, {})),
+        "agent_inbox_page": ("agent", "/api/agent/messages", lambda: ("GET", "/api/agent/messages?limit=50", None, {})),
+        "agent_stats": ("agent", "/api/agent/stats", lambda: ("GET", "/api/agent/stats", None, {})),
+        "agent_search": ("agent", "/api/agent/search", lambda: (
+            "GET", f"/api/agent/search?query={urllib.request.quote(s.rng.choice(s.search_terms))}", None, {}
+        )),
+        "message_status": ("agent", "/api/agent/message/<int:message_id>/status", lambda: (
+            "PATCH", f"/api/agent/message/{s.message_id()}/status", {"status": toggled()}, {}
+        )),
+        "message_urgency": ("agent", "/api/agent/message/<int:message_id>/urgency", lambda: (
+            "PATCH", f"/api/agent/message/{s.message_id()}/urgency", {"urgency": toggled_urgency()}, {}
+        )),
+        "conversation_status": ("agent", "/api/agent/conversation/<int:customer_id>/status", lambda: (
+            "PATCH", f"/api/agent/conversation/{s.customer_id()}/status", {"status": toggled()}, {}
+        )),
+        "batch_status_dry_run": ("agent", "/api/agent/status/batch", lambda: ("POST", "/api/agent/status/batch", {
+            "status": "Resolved", "filter": {"urgency": "Normal", "status": "Open", "older_than_days": 30},
+            "dry_run": True
+        }, {})),
+        "batch_status": ("agent", "/api/agent/status/batch", lambda: ("POST", "/api/agent/status/batch", {
+            "status": toggled(), "customer_ids": [s.customer_id() for _ in range(20)]
+        }, {})),
+        "agent_conversation": ("agent", "/api/agent/chat/<int:customer_id>", lambda: (
+            "GET", f"/api/agent/chat/{s.customer_id()}", None, {}
+        )),
+        "agent_reply": ("agent", "/api/agent/reply", lambda: ("POST", "/api/agent/reply", {
+            "message_id": s.message_id(), "reply_text": "Benchmark reply"
+        }, {})),
+        "upload_messages": ("agent", "/api/agent/upload-messages", lambda: (
+            "POST", "/api/agent/upload-messages", None, {"upload": UPLOAD_CSV}
+        )),
+        "upload_job": ("agent", "/api/agent/upload-jobs/<int:job_id>", lambda: (
+            "GET", f"/api/agent/upload-jobs/{s.job_id}", None, {}
+        )),
+        "analytics": ("agent", "/api/agent/analytics", lambda: ("GET", "/api/agent/analytics", None, {})),
+        "analytics_response_times": ("agent", "/api/agent/analytics/response-times", lambda: (
+            "GET", "/api/agent/analytics/response-times?dimension=agent&days=30", None, {}
+        )),
+        "analytics_trends": ("agent", "/api/agent/analytics/trends", lambda: (
+            "GET", "/api/agent/analytics/trends?granularity=day&days=90", None, {}
+        )),
+        "queue_peek": ("agent", "/api/agent/queue", lambda: ("GET", "/api/agent/queue", None, {})),
+        # The first claim takes the queue head, later ones renew the benchmark agent's claim
+        "queue_claim": ("agent", "/api/agent/queue/claim", lambda: ("POST", "/api/agent/queue/claim", None, {})),
+        "queue_claim_renew": ("agent", "/api/agent/queue/<int:customer_id>/claim", lambda: (
+            "PATCH", f"/api/agent/queue/{s.held_claim()}/claim", None, {}
+        )),
+        # Each release gets a conversation claimed for it while the plan is built
+        "queue_claim_release": ("agent", "/api/agent/queue/<int:customer_id>/claim", lambda: (
+            "DELETE", f"/api/agent/queue/{s.claim()}/claim", None, {}
+        )),
+        "export_day": ("agent", "/api/agent/export", lambda: (
+            "GET", f"/api/agent/export?format=ndjson&start={s.export_day}&end={s.export_day + timedelta(days=1)}",
+            None, {}
+        )),
+        "events_first_event": ("agent", "/api/events", lambda: ("GET", "/api/events", None, {"stream": True})),
+    }
+
+class ClientDriver:
+    # In-process: one test client per role, SQL statements counted per request
+    def __init__(self, A, samples):
+        self.A = A
+        self.clients = {"none": A.app.test_client()}
+        for role, email in (("agent", samples.agent_email),
+                            ("customer", samples.customer_emails[samples.customer_ids[0]])):
+            client = A.app.test_client()
+            client.post("/api/login", json={"email": email, "role": role})
+            self.clients[role] = client
+        self.queries = 0
+        self.thread = threading.get_ident()
+        event.listen(A.db.engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        if threading.get_ident() == self.thread:
+            self.queries += 1
+
+    def request(self, role, method, path, body, extra):
+        client = self.clients[role]
+        self.queries = 0
+        if "upload" in extra:
+            data = {"file": (io.BytesIO(extra["upload"].encode()), "bench.csv")}
+            response = client.open(path, method=method, data=data, content_type="multipart/form-data")
+        elif extra.get("stream"):
+            response = client.open(path, method=method, buffered=False)
+            for chunk in response.response:
+                if b"event: ready" in (chunk if isinstance(chunk, bytes) else chunk.encode()):
+                    break
+            response.close()
+        else:
+            response = client.open(path, method=method, json=body)
+            response.get_data()
+        return response.status_code, self.queries
+
+    def close(self):
+        event.remove(self.A.db.engine, "before_cursor_execute", self._count)
+
+def server_query_count(headers):
+    # The app reports its SQL statement count in Server-Timing: db;dur=..;desc="N queries"
+    match = re.search(r'db;[^,]*desc="(\d+) queries"', headers.get("Server-Timing") or "")
+    return int(match.group(1)) if match else None
+
+class HTTPDriver:
+    # Over the network; one cookie-carrying opener per role and thread
+    def __init__(self, base_url, samples):
+        self.base_url = base_url.rstrip("/")
+        self.samples = samples
+        self.local = threading.local()
+
+    def opener(self, role):
+        openers = getattr(self.local, "openers", None)
+        if openers is None:
+            openers = self.local.openers = {}
+        if role not in openers:
+            opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+            if role != "none":
+                email = self.samples.agent_email if role == "agent" else \
+                    self.samples.customer_emails[self.samples.customer_ids[0]]
+                self._open(opener, "POST", "/api/login", {"email": email, "role": role}, {})
+            openers[role] = opener
+        return openers[role]
+
+    def _open(self, opener, method, path, body, extra):
+        headers = {}
+        data = None
+        if "upload" in extra:
+            boundary = "benchboundary"
+            data = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"bench.csv\"\r\n"
+                    f"Content-Type: text/csv\r\n\r\n{extra['upload']}\r\n--{boundary}--\r\n").encode()
+            headers["Content-Type"] = f"multipart/form-data; boundary={boundary}"
+        elif body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        try:
+            with opener.open(req, timeout=60) as response:
+                if extra.get("stream"):
+                    while b"event: ready" not in response.readline():
+                        pass
+                else:
+                    response.read()
+                return response.status, server_query_count(response.headers)
+        except urllib.error.HTTPError as error:
+            return error.code, server_query_count(error.headers)
+
+    def request(self, role, method, path, body, extra):
+        return self._open(self.opener(role), method, path, body, extra)
+
+    def close(self):
+        pass
+
+def summarize(latencies, statuses, queries, wall):
+    latencies = sorted(latencies)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    counts = {}
+    for status in statuses:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    return {
+        "requests": len(latencies),
+        "errors": sum(1 for status in statuses if status >= 400),
+        "status_codes": counts,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "max_ms": ms(latencies[-1]) if latencies else None,
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+def run_scenario(driver, role, builder, requests, warmup, concurrency):
+    for _ in range(warmup):
+        driver.request(role, *builder())
+    lock = threading.Lock()
+    latencies, statuses, queries = [], [], []
+    plan = [builder() for _ in range(requests)]  # Built up front so parameter choice isn't timed
+
+    def worker(jobs):
+        for job in jobs:
+            started = time.perf_counter()
+            status, count = driver.request(role, *job)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses.append(status)
+                if count is not None:
+                    queries.append(count)
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        worker(plan)
+    else:
+        threads = [threading.Thread(target=worker, args=(plan[i::concurrency],)) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return summarize(latencies, statuses, queries, time.perf_counter() - started)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_gunicorn(database_url, workers):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, PORT=str(port), WEB_CONCURRENCY=str(workers),
+               SSE_STREAM_SECONDS="1")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise click.ClickException("gunicorn exited: " + process.stderr.read().decode()[-2000:])
+        try:
+            urllib.request.urlopen(base_url + "/login", timeout=1).read()
+            return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise click.ClickException("gunicorn did not start in time")
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+@click.command()
+@click.option("--database-url", default=DEFAULT_DATABASE_URL, show_default=True)
+@click.option("--mode", type=click.Choice(["client", "http"]), default="client", show_default=True)
+@click.option("--base-url", help="HTTP mode: server to test (default: start a local gunicorn)")
+@click.option("--workers", default=2, show_default=True, help="gunicorn workers when started locally")
+@click.option("--requests", "requests_per_endpoint", default=200, show_default=True)
+@click.option("--warmup", default=5, show_default=True)
+@click.option("--concurrency", default=1, show_default=True, help="Parallel clients per endpoint (HTTP mode)")
+@click.option("--only", multiple=True, help="Run only these scenarios (repeatable)")
+@click.option("--seed", default=1, show_default=True)
+@click.option("--copy/--no-copy", default=True, show_default=True,
+              help="Run against a temporary copy of a SQLite database so writes don't accumulate")
+@click.option("--output", default="benchmark-report.json", show_default=True)
+def main(database_url, mode, base_url, workers, requests_per_endpoint, warmup, concurrency, only, seed, copy,
+         output):
+    """Measure latency, throughput and query counts for every API endpoint."""
+    source = sqlite_path(database_url)
+    tempdir = None
+    if copy and source:
+        if not os.path.exists(source):
+            raise click.ClickException(f"{source} not found; run benchmarks.generate first")
+        tempdir = tempfile.mkdtemp(prefix="messageflow-bench-")
+        with sqlite3.connect(source) as src, sqlite3.connect(os.path.join(tempdir, "bench.db")) as dst:
+            src.backup(dst)
+        database_url = "sqlite:///" + os.path.join(tempdir, "bench.db")
+
+    A = load_app(database_url)
+    process = None
+    try:
+        with A.app.app_context():
+            A.init_db()
+            samples = Samples(A, seed)
+            dataset = {
+                "customers": A.User.query.filter_by(role='customer').count(),
+                "messages": A.Message.query.count(),
+                "replies": A.Reply.query.count(),
+            }
+            if mode == "client":
+                driver = ClientDriver(A, samples)
+            else:
+                if not base_url:
+                    for engine in A.db.engines.values():
+                        engine.dispose()
+                    process, base_url = start_gunicorn(database_url, workers)
+                driver = HTTPDriver(base_url, samples)
+
+            table = scenarios(samples)
+            covered = {rule for role, rule, builder in table.values()}
+            api_rules = sorted({rule.rule for rule in A.app.url_map.iter_rules() if rule.rule.startswith("/api/")})
+            results = {}
+            for name, (role, rule, builder) in table.items():
+                if only and name not in only:
+                    continue
+                count = min(requests_per_endpoint, SSE_REQUESTS) if rule == "/api/events" else requests_per_endpoint
+                results[name] = run_scenario(driver, role, builder, count, warmup,
+                                             concurrency if mode == "http" else 1)
+                result = results[name]
+                click.echo(f"{name:28} p50 {result['p50_ms']:>9} ms  p95 {result['p95_ms']:>9} ms  "
+                           f"p99 {result['p99_ms']:>9} ms  {result['throughput_rps']:>8} req/s  "
+                           f"errors {result['errors']}")
+            driver.close()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if tempdir:
+            shutil.rmtree(tempdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "mode": mode,
+            "base_url": base_url if mode == "http" else None,
+            "requests_per_endpoint": requests_per_endpoint,
+            "concurrency": concurrency if mode == "http" else 1,
+            "seed": seed,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "dataset": dataset,
+        },
+        "endpoints": results,
+        "uncovered_routes": [rule for rule in api_rules if rule not in covered],
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    if report["uncovered_routes"]:
+        click.echo(f"Routes without a scenario: {', '.join(report['uncovered_routes'])}")
+    click.echo(f"Wrote {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# Urgency classifier benchmark. Trains the hashed n-gram model on the resolved messages of a
+# benchmark database (every tenth one held out, as train-urgency-model does), then compares it with
+# the keyword rules on the held out messages: accuracy, precision and recall for Urgent, and the
+# cost per message when scoring one message at a time (live traffic) and import-sized batches.
+# Model timings leave out the keyword pass that still runs alongside it for urgency_terms.
+import json
+import os
+import tempfile
+import time
+
+import click
+
+from benchmarks import DEFAULT_DATABASE_URL, load_app
+
+def per_message_us(score, texts, batch_size, rounds):
+    # Best of `rounds` passes over texts, in microseconds per message
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for start in range(0, len(texts), batch_size):
+            score(texts[start:start + batch_size])
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best / len(texts) * 1e6, 2)
+
+@click.command()
+@click.option("--database-url", default=DEFAULT_DATABASE_URL, show_default=True)
+@click.option("--labels", type=click.Choice(["reviewed", "all"]), default="all", show_default=True,
+              help="Generated datasets only carry 'all' labels")
+@click.option("--bits", default=18, show_default=True)
+@click.option("--batch-size", default=1000, show_default=True, help="Messages per batch (the import chunk size)")
+@click.option("--limit", default=20000, show_default=True, help="Held out messages used for timing")
+@click.option("--rounds", default=3, show_default=True)
+@click.option("--output", help="Also write the report as JSON")
+def main(database_url, labels, bits, batch_size, limit, rounds, output):
+    """Compare the trained urgency model with the keyword rules: accuracy and latency."""
+    A = load_app(database_url)
+    with A.app.app_context():
+        started = time.perf_counter()
+        try:
+            model, report = A.train_urgency_model(labels, bits)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        report["train_seconds"] = round(time.perf_counter() - started, 1)
+        M = A.Message
+        texts = [row[0] for row in A.db.session.query(M.message_text).filter(
+            M.status == 'Resolved', M.id % 10 == 0
+        ).order_by(M.id).limit(limit)]
+    if not texts:
+        raise click.ClickException("No held out messages")
+
+    rules = A.get_urgency_matcher()
+    timings = {
+        "rules": {
+            "single_us": per_message_us(lambda batch: rules.score(batch[0]), texts, 1, rounds),
+            "batch_us": per_message_us(rules.score_batch, texts, batch_size, rounds)
+        }
+    }
+    # Time the model as workers use it: memory-mapped from its file, with and without numpy
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "urgency_model.bin")
+        model.save(path)
+        report["model_bytes"] = os.path.getsize(path)
+        variants = [("model", A.numpy), ("model_pure_python", None)] if A.numpy is not None else [("model", None)]
+        numpy_module = A.numpy
+        try:
+            for name, numpy in variants:
+                A.numpy = numpy
+                loaded = A.UrgencyModel.load(path)
+                timings[name] = {
+                    "single_us": per_message_us(loaded.probabilities, texts, 1, rounds),
+                    "batch_us": per_message_us(loaded.probabilities, texts, batch_size, rounds)
+                }
+                del loaded
+        finally:
+            A.numpy = numpy_module
+    report["timings"] = timings
+
+    click.echo(f"Trained on {report['trained_on']} in {report['train_seconds']}s, model file {report['model_bytes']} bytes")
+    for name, metrics in report.get("holdout", {}).items():
+        click.echo(f"{name:18} accuracy {metrics['accuracy']:.4f}  precision {metrics['precision']:.4f}  "
+                   f"recall {metrics['recall']:.4f}  f1 {metrics['f1']:.4f}  ({metrics['examples']} held out)")
+    for name, timing in timings.items():
+        click.echo(f"{name:18} {timing['single_us']:8.2f} us/message single  {timing['batch_us']:8.2f} us/message "
+                   f"in batches of {batch_size}")
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        click.echo(f"Wrote {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# gunicorn settings for `gunicorn app:app` (picked up automatically from the working directory)
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+timeout = 120
+
+# Thread budget: each SSE client holds one thread of its worker for a whole stream (SSE_STREAM_SECONDS),
+# so only half of every worker's threads may stream and the rest stay free for requests. The app turns
+# away streams above that with 503 and the pages poll instead; capacity is workers * SSE_MAX_STREAMS.
+os.environ.setdefault('SSE_MAX_STREAMS', str(max(threads // 2, 1)))
+
+# /metrics answers only loopback clients unless METRICS_TOKEN is set; with a reverse proxy on this
+# host every request arrives from loopback, so set the token there.
+
+if workers > 1:
+    # Live updates must reach SSE clients connected to other workers
+    os.environ.setdefault('EVENT_BUS', 'database')
+
+
+def on_starting(server):
+    # Schema setup and import job recovery run once in the master, before any worker serves requests
+    from app import app, fail_interrupted_import_jobs, init_db
+    with app.app_context():
+        init_db()
+        fail_interrupted_import_jobs()
+
+
+def post_fork(server, worker):
+    # Engine connections must not be shared across the fork, including the archive bind's
+    from app import app, db, start_background_tasks
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+        start_background_tasks()
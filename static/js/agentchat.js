@@ -0,0 +1,493 @@
+const chatMessages = document.getElementById('chatMessages');
+const messageInput = document.getElementById('messageInput');
+const sendButton = document.getElementById('sendButton');
+const charCount = document.getElementById('charCount');
+const statusBtn = document.getElementById('statusBtn');
+const statusMenu = document.getElementById('statusMenu');
+const statusText = document.getElementById('statusText');
+const toast = document.getElementById('toast');
+const toastMessage = document.getElementById('toastMessage');
+const navbar = document.getElementById('navbar');
+
+// Create typing indicator dynamically
+const typingIndicator = document.createElement('div');
+typingIndicator.className = 'typing-indicator hidden';
+typingIndicator.id = 'typingIndicator';
+typingIndicator.innerHTML = `
+    <div class="message-avatar"></div>
+    <div class="typing-bubble">
+        <div class="typing-dot"></div>
+        <div class="typing-dot"></div>
+        <div class="typing-dot"></div>
+    </div>
+`;
+const customerName = document.getElementById('customerName');
+const customerId = document.getElementById('customerId');
+const customerAvatar = document.getElementById('customerAvatar');
+const urgencyBadge = document.getElementById('urgencyBadge');
+
+// Get customer ID from URL path
+const customerIdParam = window.location.pathname.split('/')[3]; // Extract customer ID from URL (/agent/chat/:id)
+
+const cannedResponses = {
+    investigating: "Thank you for bringing this to my attention. I'm investigating this issue right now and will have an update for you shortly.",
+    resolved: "Great news! I've resolved this issue for you. Everything should be working properly now. Please let me know if you need anything else.",
+    escalate: "I'm escalating this to our technical team to ensure we resolve this quickly. I'll keep you updated on the progress.",
+    followup: "Thank you for your patience. I'll follow up with you shortly with more information."
+};
+
+async function init() {
+    await loadConversation();
+    attachEventListeners();
+    scrollToBottom();
+    connectEvents();
+    keepClaim();
+}
+
+// Opened from "Take Next": renew the work queue claim while the page stays open
+function keepClaim() {
+    if (!new URLSearchParams(window.location.search).has('claimed')) return;
+    const timer = setInterval(async () => {
+        const response = await fetch(`/api/agent/queue/${customerIdParam}/claim`, { method: 'PATCH' });
+        if (!response.ok) clearInterval(timer);  // Resolved, released or taken over
+    }, 60000);
+}
+
+// Messages/replies already on screen, and where to resume delta sync from
+const shownReplyIds = new Set();
+const shownMessageIds = new Set();
+let latestMessageId = null;
+let syncCursor = null;
+
+function trackMessage(msg) {
+    shownMessageIds.add(msg.id);
+    if (latestMessageId === null || msg.id > latestMessageId) {
+        latestMessageId = msg.id;
+    }
+}
+
+// Fetch only what changed since the last sync and append it
+async function syncConversation() {
+    if (!syncCursor) {
+        await loadConversation();
+        return;
+    }
+    const response = await fetch(`/api/agent/chat/${customerIdParam}?since=${encodeURIComponent(syncCursor)}`);
+    if (response.status === 304) return;
+    const data = await response.json();
+    if (data.error) throw new Error(data.error);
+    data.messages.forEach(msg => {
+        if (!shownMessageIds.has(msg.id)) {
+            trackMessage(msg);
+            addMessageToChat(msg.message_text, 'customer', msg.timestamp);
+        }
+        msg.replies.forEach(reply => {
+            if (!shownReplyIds.has(reply.id)) {
+                shownReplyIds.add(reply.id);
+                addMessageToChat(reply.reply_text, 'agent', reply.timestamp);
+            }
+        });
+    });
+    syncCursor = data.cursor;
+}
+
+// New customer messages and other agents' replies arrive over Server-Sent Events
+function connectEvents() {
+    if (!window.EventSource) return;
+    const events = new EventSource('/api/events');
+    events.addEventListener('message', (e) => {
+        const msg = JSON.parse(e.data);
+        if (String(msg.customer_id) !== customerIdParam || shownMessageIds.has(msg.id)) return;
+        trackMessage(msg);
+        addMessageToChat(msg.message_text, 'customer', msg.timestamp);
+        scrollToBottom();
+    });
+    events.addEventListener('reply', (e) => {
+        const data = JSON.parse(e.data);
+        if (String(data.customer_id) !== customerIdParam || shownReplyIds.has(data.reply.id)) return;
+        shownReplyIds.add(data.reply.id);
+        addMessageToChat(data.reply.reply_text, 'agent', data.reply.timestamp);
+        scrollToBottom();
+    });
+    events.addEventListener('status', (e) => {
+        const data = JSON.parse(e.data);
+        if (String(data.customer_id) !== customerIdParam || data.message_id) return;
+        statusBtn.className = `status-btn ${data.status.toLowerCase()}`;
+        statusText.textContent = data.status;
+    });
+    events.onerror = () => {
+        // Closed for good (503 when the server is at its stream limit): poll instead
+        if (events.readyState === EventSource.CLOSED) {
+            setInterval(() => syncConversation().catch(error => console.error('Error syncing conversation:', error)), 30000);
+        }
+    };
+}
+
+// Load user data from localStorage or session
+async function loadUserData() {
+    try {
+        // First try to get user data from localStorage
+        const userData = localStorage.getItem('messageflow_user');
+        if (userData) {
+            const user = JSON.parse(userData);
+            // Update UI with user data if needed
+        }
+
+        // Then try to get from backend session
+        const response = await fetch('/api/session');
+        const sessionData = await response.json();
+
+        if (sessionData.user) {
+            // Update UI with session data if needed
+
+            // Update localStorage with session data if localStorage is empty
+            if (!userData) {
+                const userSession = {
+                    name: sessionData.user.name,
+                    email: sessionData.user.email,
+                    role: sessionData.user.role,
+                    loginTime: new Date().toISOString()
+                };
+                localStorage.setItem('messageflow_user', JSON.stringify(userSession));
+                localStorage.setItem('messageflow_role', sessionData.user.role);
+            }
+        }
+    } catch (error) {
+        console.error('Error loading user data:', error);
+    }
+}
+
+async function loadConversation() {
+    try {
+        // Load user data first
+        await loadUserData();
+
+        // Load conversation with specific customer
+        const response = await fetch(`/api/agent/chat/${customerIdParam}`);
+        const data = await response.json();
+
+        if (data.error) {
+            throw new Error(data.error);
+        }
+        syncCursor = response.headers.get('X-Sync-Cursor');
+
+        const { customer, messages } = data;
+
+        // Clear existing messages
+        chatMessages.innerHTML = '';
+
+        // Add date separator
+        const dateSeparator = document.createElement('div');
+        dateSeparator.className = 'date-separator';
+        dateSeparator.innerHTML = '<span>Today</span>';
+        chatMessages.appendChild(dateSeparator);
+
+        // Add messages
+        if (messages && messages.length > 0) {
+            messages.forEach(msg => {
+                trackMessage(msg);
+                if (msg.replies && msg.replies.length > 0) {
+                    // Add customer message
+                    addMessageToChat(msg.message_text, 'customer', msg.timestamp);
+
+                    // Add agent replies
+                    msg.replies.forEach(reply => {
+                        shownReplyIds.add(reply.id);
+                        addMessageToChat(reply.reply_text, 'agent', reply.timestamp);
+                    });
+                } else {
+                    // Add customer message
+                    addMessageToChat(msg.message_text, 'customer', msg.timestamp);
+                }
+            });
+        } else {
+            // Empty state (New conversation)
+            chatMessages.innerHTML = '<div class="date-separator"><span>No messages yet</span></div>';
+        }
+
+        // Add typing indicator at the end
+        chatMessages.appendChild(typingIndicator);
+        typingIndicator.classList.add('hidden');
+
+        // Update customer info
+        if (customer) {
+            customerName.textContent = customer.name || 'Customer';
+            customerId.textContent = `CUST-${customer.id}`;
+            customerAvatar.textContent = (customer.name || 'C').split(' ').map(n => n[0]).join('').toUpperCase();
+
+            // Update Quick Info Bar
+            const infoValues = document.querySelectorAll('.info-value');
+            if (infoValues.length >= 3) {
+                infoValues[0].textContent = customer.account_type || 'Standard'; // Account
+                // infoValues[1] is Last Active - defaulting or using timestamp from last message if available
+                if (messages && messages.length > 0) {
+                     infoValues[1].textContent = new Date(messages[messages.length-1].timestamp).toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
+                } else {
+                     infoValues[1].textContent = "Recently";
+                }
+            }
+        }
+
+        // Update status based on last message status
+        if (messages && messages.length > 0) {
+            const lastMsg = messages[messages.length - 1];
+            urgencyBadge.textContent = lastMsg.urgency || "Normal";
+            urgencyBadge.className = `badge ${(lastMsg.urgency || "normal").toLowerCase()}`;
+
+            if (lastMsg.status && lastMsg.status.toLowerCase() === 'resolved') {
+                statusBtn.className = 'status-btn resolved';
+                statusText.textContent = 'Resolved';
+            } else {
+                statusBtn.className = 'status-btn open';
+                statusText.textContent = 'Open';
+            }
+        } else {
+            statusBtn.className = 'status-btn open';
+            statusText.textContent = 'Open';
+            urgencyBadge.textContent = 'Normal';
+            urgencyBadge.className = 'badge normal';
+        }
+
+    } catch (error) {
+        console.error('Error loading conversation:', error);
+        showToast('Error loading conversation: ' + error.message);
+        chatMessages.innerHTML = `<div class="date-separator"><span style="color:red">Error loading chat</span></div>`;
+    }
+}
+
+function attachEventListeners() {
+    sendButton.addEventListener('click', sendMessage);
+
+    messageInput.addEventListener('keydown', (e) => {
+        if (e.key === 'Enter' && !e.shiftKey) {
+            e.preventDefault();
+            sendMessage();
+        }
+    });
+
+    messageInput.addEventListener('input', () => {
+        charCount.textContent = messageInput.value.length;
+        messageInput.style.height = 'auto';
+        messageInput.style.height = messageInput.scrollHeight + 'px';
+    });
+
+    statusBtn.addEventListener('click', (e) => {
+        e.stopPropagation();
+        statusMenu.classList.toggle('active');
+    });
+
+    document.addEventListener('click', () => {
+        statusMenu.classList.remove('active');
+    });
+
+    window.addEventListener('scroll', () => {
+        if (window.scrollY > 50) {
+            navbar.classList.add('scrolled');
+        } else {
+            navbar.classList.remove('scrolled');
+        }
+    });
+}
+
+async function sendMessage() {
+    const message = messageInput.value.trim();
+
+    if (message === '') {
+        return;
+    }
+
+    // Disable send button while sending
+    sendButton.disabled = true;
+    sendButton.textContent = 'Sending...';
+
+    try {
+        // Reply to the latest message in the thread; a delta sync picks up anything
+        // that arrived since the page loaded (a few hundred bytes, not the whole thread)
+        try {
+            await syncConversation();
+        } catch (e) {
+            console.error("Failed to sync conversation before reply", e);
+        }
+        const message_id = latestMessageId;
+
+        const response = await fetch('/api/agent/reply', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                message_id: message_id,
+                reply_text: message
+            })
+        });
+
+        const result = await response.json();
+
+        if (result.success) {
+            // Add the message to the chat (unless the live event already did)
+            if (!shownReplyIds.has(result.reply.id)) {
+                shownReplyIds.add(result.reply.id);
+                addMessage(message, 'agent');
+            }
+
+            messageInput.value = '';
+            charCount.textContent = '0';
+            messageInput.style.height = 'auto';
+
+            showToast('Message sent successfully');
+        } else {
+            showToast('Error sending message: ' + (result.error || 'Unknown error'));
+        }
+    } catch (error) {
+        console.error('Error sending message:', error);
+        showToast('Error sending message');
+    } finally {
+        // Re-enable send button
+        sendButton.disabled = false;
+        sendButton.innerHTML = '<span>Send</span><span>→</span>';
+    }
+}
+
+function addMessage(text, sender) {
+    addMessageToChat(text, sender, new Date().toISOString());
+}
+
+function addMessageToChat(text, sender, timestamp) {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `message ${sender}`;
+
+    const time = new Date(timestamp).toLocaleTimeString('en-US', { 
+        hour: 'numeric', 
+        minute: '2-digit',
+        hour12: true 
+    });
+
+    // Get sender's avatar
+    let avatar;
+    if (sender === 'agent') {
+        avatar = 'SA'; // Support Agent
+    } else {
+        // Use customer's initials
+        const customerInitials = document.getElementById('customerName').textContent.split(' ').map(n => n[0]).join('').toUpperCase();
+        avatar = customerInitials || 'C';
+    }
+
+    messageDiv.innerHTML = `
+        <div class="message-avatar">${avatar}</div>
+        <div class="message-content">
+            <div class="message-bubble">${escapeHtml(text)}</div>
+            <div class="message-meta">
+                <span>${time}</span>
+            </div>
+        </div>
+    `;
+
+    if (typingIndicator.parentNode === chatMessages) {
+        chatMessages.insertBefore(messageDiv, typingIndicator);
+    } else {
+        chatMessages.appendChild(messageDiv);
+    }
+}
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+function insertCannedResponse(type) {
+    const response = cannedResponses[type];
+    if (response) {
+        messageInput.value = response;
+        charCount.textContent = response.length;
+        messageInput.focus();
+
+        messageInput.style.height = 'auto';
+        messageInput.style.height = messageInput.scrollHeight + 'px';
+    }
+}
+
+window.insertCannedResponse = insertCannedResponse;
+
+async function changeStatus(status) {
+    const statusClasses = {
+        open: 'open',
+        resolved: 'resolved'
+    };
+
+    const statusTexts = {
+        open: 'Open',
+        resolved: 'Resolved'
+    };
+
+    try {
+        // Update status via API for the whole conversation
+        const response = await fetch(`/api/agent/conversation/${customerIdParam}/status`, {
+            method: 'PATCH',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                status: statusTexts[status]
+            })
+        });
+
+        const result = await response.json();
+
+        if (result.success) {
+            statusBtn.className = `status-btn ${statusClasses[status]}`;
+            statusText.textContent = statusTexts[status];
+        } else {
+            showToast('Error updating status: ' + (result.error || 'Unknown error'));
+        }
+    } catch (error) {
+        console.error('Error updating status:', error);
+        showToast('Error updating status');
+    }
+
+    statusMenu.classList.remove('active');
+
+    const message = status === 'resolved' 
+        ? 'Conversation marked as resolved' 
+        : 'Conversation reopened';
+    showToast(message);
+}
+
+window.changeStatus = changeStatus;
+
+function showToast(message) {
+    toastMessage.textContent = message;
+    toast.classList.add('show');
+
+    setTimeout(() => {
+        toast.classList.remove('show');
+    }, 3000);
+}
+
+function scrollToBottom() {
+    setTimeout(() => {
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+    }, 100);
+}
+
+// Update navigation and user info based on login status
+function updateUserInfo() {
+    const userData = localStorage.getItem('messageflow_user');
+    const userRole = localStorage.getItem('messageflow_role');
+
+    if (userData && userRole) {
+        const user = JSON.parse(userData);
+
+        // Update agent name in navigation
+        const agentNameElement = document.getElementById('agentName');
+        if (agentNameElement) {
+            agentNameElement.textContent = user.name || 'Support Agent';
+        }
+    }
+}
+
+// Initialize on load
+window.addEventListener('load', () => {
+    updateUserInfo();
+    init();
+});
@@ -0,0 +1,375 @@
+// DOM Elements
+const messagesArea = document.getElementById('messagesArea');
+const messageInput = document.getElementById('messageInput');
+const sendButton = document.getElementById('sendButton');
+const navbar = document.getElementById('navbar');
+const userName = document.getElementById('userName');
+const userAvatar = document.getElementById('userAvatar');
+
+// Load user data from localStorage or session
+async function loadUserData() {
+    try {
+        // First try to get user data from localStorage
+        const userData = localStorage.getItem('messageflow_user');
+        if (userData) {
+            const user = JSON.parse(userData);
+            userName.textContent = user.name || 'Customer';
+            const initials = user.name ? user.name.split(' ').map(n => n[0]).join('').toUpperCase() : '👤';
+            userAvatar.textContent = initials.length <= 2 ? initials : '👤';
+        }
+
+        // Then try to get from backend session
+        const response = await fetch('/api/session');
+        const sessionData = await response.json();
+
+        if (sessionData.user) {
+            userName.textContent = sessionData.user.name || 'Customer';
+            const initials = sessionData.user.name ? sessionData.user.name.split(' ').map(n => n[0]).join('').toUpperCase() : '👤';
+            userAvatar.textContent = initials.length <= 2 ? initials : '👤';
+
+            // Update localStorage with session data if localStorage is empty
+            if (!userData) {
+                const userSession = {
+                    name: sessionData.user.name,
+                    email: sessionData.user.email,
+                    role: sessionData.user.role,
+                    loginTime: new Date().toISOString()
+                };
+                localStorage.setItem('messageflow_user', JSON.stringify(userSession));
+                localStorage.setItem('messageflow_role', sessionData.user.role);
+            }
+        }
+    } catch (error) {
+        console.error('Error loading user data:', error);
+    }
+}
+
+// Update navigation based on login status
+function updateNavigation() {
+    const userData = localStorage.getItem('messageflow_user');
+    const userRole = localStorage.getItem('messageflow_role');
+
+    if (userData && userRole) {
+        // User is logged in, no need to change anything on customer page
+        // as logout button is already in the nav-user section
+    }
+}
+
+// Message storage
+let messages = [];
+
+// Format time
+function formatTime() {
+    const now = new Date();
+    return now.toLocaleTimeString('en-US', { 
+        hour: 'numeric', 
+        minute: '2-digit',
+        hour12: true 
+    });
+}
+
+// Create message element
+function createMessageElement(type, text, showTimestamp = true) {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `message ${type}`;
+
+    const avatar = document.createElement('div');
+    avatar.className = 'message-avatar';
+    avatar.textContent = type === 'bot' ? '🤖' : userAvatar.textContent;
+
+    const content = document.createElement('div');
+    content.className = 'message-content';
+
+    const bubble = document.createElement('div');
+    bubble.className = 'message-bubble';
+    bubble.textContent = text;
+
+    content.appendChild(bubble);
+
+    if (showTimestamp) {
+        const timestamp = document.createElement('div');
+        timestamp.className = 'message-timestamp';
+        timestamp.textContent = formatTime();
+        content.appendChild(timestamp);
+    }
+
+    messageDiv.appendChild(avatar);
+    messageDiv.appendChild(content);
+
+    return messageDiv;
+}
+
+// Add message to chat
+function addMessage(type, text, showTimestamp = true) {
+    const messageElement = createMessageElement(type, text, showTimestamp);
+    messagesArea.appendChild(messageElement);
+
+    // Store message
+    messages.push({ type, text, timestamp: new Date() });
+
+    // Scroll to bottom smoothly
+    setTimeout(() => {
+        messagesArea.scrollTo({
+            top: messagesArea.scrollHeight,
+            behavior: 'smooth'
+        });
+    }, 100);
+}
+
+// Show typing indicator
+function showTypingIndicator() {
+    const indicator = document.createElement('div');
+    indicator.className = 'message bot';
+    indicator.id = 'typingIndicator';
+
+    const avatar = document.createElement('div');
+    avatar.className = 'message-avatar';
+    avatar.textContent = '🤖';
+
+    const typingDiv = document.createElement('div');
+    typingDiv.className = 'typing-indicator show';
+
+    typingDiv.innerHTML = `
+        <div class="typing-dots">
+            <div class="typing-dot"></div>
+            <div class="typing-dot"></div>
+            <div class="typing-dot"></div>
+        </div>
+        <span style="font-size: 0.85rem; color: #6b7280;">typing...</span>
+    `;
+
+    indicator.appendChild(avatar);
+    indicator.appendChild(typingDiv);
+    messagesArea.appendChild(indicator);
+
+    // Scroll to bottom
+    messagesArea.scrollTo({
+        top: messagesArea.scrollHeight,
+        behavior: 'smooth'
+    });
+}
+
+// Remove typing indicator
+function removeTypingIndicator() {
+    const indicator = document.getElementById('typingIndicator');
+    if (indicator) {
+        indicator.remove();
+    }
+}
+
+// Bot response after customer message
+function sendBotAcknowledgement() {
+    showTypingIndicator();
+
+    const responses = [
+        "✅ Thanks for reaching out! Our support agents will review your message and get back to you shortly.",
+        "✅ Got it! Our team will respond to your message as soon as possible. Thanks for your patience! 😊",
+        "✅ Message received! A support agent will be with you shortly. Please stay tuned!",
+        "✅ Thank you for contacting us! Our support team will get back to you very soon. We appreciate your patience! 🙏"
+    ];
+
+    const response = responses[Math.floor(Math.random() * responses.length)];
+
+    setTimeout(() => {
+        removeTypingIndicator();
+        addMessage('bot', response);
+    }, 1500 + Math.random() * 1000); // Random delay between 1.5-2.5s
+}
+
+// Send customer message
+async function sendMessage() {
+    const text = messageInput.value.trim();
+
+    if (!text) return;
+
+    // Add customer message
+    addMessage('customer', text);
+
+    // Clear input
+    messageInput.value = '';
+    messageInput.style.height = 'auto';
+
+    // Reset button state
+    sendButton.disabled = false;
+
+    try {
+        // Send message to backend
+        const response = await fetch('/api/customer/message', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                message: text
+            })
+        });
+
+        const result = await response.json();
+
+        if (result.success && result.duplicate) {
+            addMessage('bot', "We already have this message and our team is on it, no need to send it again.");
+        } else if (result.success) {
+            // Send bot acknowledgement
+            sendBotAcknowledgement();
+        } else if (response.status === 429) {
+            addMessage('bot', `⏳ ${result.error}`);
+        } else {
+            addMessage('bot', '❌ Sorry, there was an issue sending your message. Please try again.');
+        }
+    } catch (error) {
+        console.error('Error sending message:', error);
+        addMessage('bot', '❌ Sorry, there was an issue sending your message. Please try again.');
+    }
+}
+
+// Replies already on screen, and where to resume delta sync from when polling
+const shownReplyIds = new Set();
+let syncCursor = null;
+
+function showReply(reply) {
+    if (shownReplyIds.has(reply.id)) return;
+    shownReplyIds.add(reply.id);
+    addMessage('bot', `🤖 Agent ${reply.agent_name}: ${reply.reply_text}`);
+}
+
+// Load conversation history from backend
+async function loadConversationHistory() {
+    try {
+        const response = await fetch('/api/customer/messages');
+        const messages = await response.json();
+        syncCursor = response.headers.get('X-Sync-Cursor');
+
+        if (messages.length > 0) {
+            messages.forEach(msg => {
+                // Add customer message
+                addMessage('customer', msg.message_text, true);
+
+                // Add replies if any
+                if (msg.replies && msg.replies.length > 0) {
+                    msg.replies.forEach(showReply);
+                }
+            });
+        } else {
+            // Show welcome messages if no conversation history
+            showWelcomeMessages();
+        }
+    } catch (error) {
+        console.error('Error loading conversation history:', error);
+        showWelcomeMessages(); // Show welcome if there's an error
+    }
+}
+
+// Fetch replies that arrived since the last sync (when live updates are unavailable)
+async function pollReplies() {
+    try {
+        const url = syncCursor ? `/api/customer/messages?since=${encodeURIComponent(syncCursor)}` : '/api/customer/messages';
+        const response = await fetch(url);
+        if (!response.ok) return;
+        const data = await response.json();
+        const messages = Array.isArray(data) ? data : data.messages;
+        messages.forEach(msg => (msg.replies || []).forEach(showReply));
+        syncCursor = (Array.isArray(data) ? response.headers.get('X-Sync-Cursor') : data.cursor) || syncCursor;
+    } catch (error) {
+        console.error('Error checking for replies:', error);
+    }
+}
+
+// Agent replies arrive live over Server-Sent Events
+function connectEvents() {
+    if (!window.EventSource) {
+        setInterval(pollReplies, 30000);
+        return;
+    }
+    const events = new EventSource('/api/events');
+    events.addEventListener('reply', (e) => {
+        showReply(JSON.parse(e.data).reply);
+    });
+    events.onerror = () => {
+        // Closed for good (503 when the server is at its stream limit): poll instead
+        if (events.readyState === EventSource.CLOSED) {
+            setInterval(pollReplies, 30000);
+        }
+    };
+}
+
+// Initial welcome messages
+function showWelcomeMessages() {
+    setTimeout(() => {
+        addMessage('bot', '👋 Hi there! Welcome to MessageFlow Support.');
+    }, 500);
+
+    setTimeout(() => {
+        addMessage('bot', 'How can I help you today? Feel free to describe your issue, and our support team will get back to you shortly.');
+    }, 1500);
+
+    // Optional: Add quick action buttons
+    setTimeout(() => {
+        const quickActionsDiv = document.createElement('div');
+        quickActionsDiv.className = 'message bot';
+        quickActionsDiv.innerHTML = `
+            <div class="message-avatar">🤖</div>
+            <div class="message-content">
+                <div class="quick-actions">
+                    <button class="quick-action-btn" onclick="setQuickMessage('I need help with my account')">Account Help</button>
+                    <button class="quick-action-btn" onclick="setQuickMessage('I have a billing question')">Billing Question</button>
+                    <button class="quick-action-btn" onclick="setQuickMessage('Technical issue')">Technical Issue</button>
+                </div>
+            </div>
+        `;
+        messagesArea.appendChild(quickActionsDiv);
+        messagesArea.scrollTo({
+            top: messagesArea.scrollHeight,
+            behavior: 'smooth'
+        });
+    }, 2000);
+}
+
+// Quick message setter
+function setQuickMessage(message) {
+    messageInput.value = message;
+    messageInput.focus();
+}
+
+// Make function global
+window.setQuickMessage = setQuickMessage;
+
+// Event Listeners
+sendButton.addEventListener('click', sendMessage);
+
+messageInput.addEventListener('keydown', (e) => {
+    if (e.key === 'Enter' && !e.shiftKey) {
+        e.preventDefault();
+        sendMessage();
+    }
+});
+
+// Auto-resize textarea
+messageInput.addEventListener('input', function() {
+    this.style.height = 'auto';
+    this.style.height = Math.min(this.scrollHeight, 120) + 'px';
+});
+
+// Navbar scroll effect
+window.addEventListener('scroll', () => {
+    if (window.scrollY > 50) {
+        navbar.classList.add('scrolled');
+    } else {
+        navbar.classList.remove('scrolled');
+    }
+});
+
+// Initialize
+window.addEventListener('load', () => {
+    loadUserData();
+    updateNavigation();
+    loadConversationHistory();
+    connectEvents();
+});
+
+// Check authentication
+const storedUser = localStorage.getItem('messageflow_user');
+if (!storedUser) {
+    console.log('No user logged in');
+    // Optionally redirect to login page
+    // window.location.href = '/login';
+}
@@ -0,0 +1,427 @@
+// State
+let messagesData = [];
+let selectedMessage = null;
+let currentFilter = 'all';
+let searchTerm = '';
+
+// DOM Elements
+const messageList = document.getElementById('messageList');
+const searchInput = document.getElementById('searchInput');
+const filterButtons = document.querySelectorAll('.filter-btn');
+const messageCount = document.getElementById('messageCount');
+const customerPreview = document.getElementById('customerPreview');
+const navbar = document.getElementById('navbar');
+
+// Initialize
+async function init() {
+    await Promise.all([loadMessages(), loadStats()]);
+    attachEventListeners();
+    connectEvents();
+}
+
+// Load user data from localStorage or session
+async function loadUserData() {
+    try {
+        // First try to get user data from localStorage
+        const userData = localStorage.getItem('messageflow_user');
+        if (userData) {
+            const user = JSON.parse(userData);
+            // Update UI with user data if needed
+        }
+
+        // Then try to get from backend session
+        const response = await fetch('/api/session');
+        const sessionData = await response.json();
+
+        if (sessionData.user) {
+            // Update UI with session data if needed
+
+            // Update localStorage with session data if localStorage is empty
+            if (!userData) {
+                const userSession = {
+                    name: sessionData.user.name,
+                    email: sessionData.user.email,
+                    role: sessionData.user.role,
+                    loginTime: new Date().toISOString()
+                };
+                localStorage.setItem('messageflow_user', JSON.stringify(userSession));
+                localStorage.setItem('messageflow_role', sessionData.user.role);
+            }
+        }
+    } catch (error) {
+        console.error('Error loading user data:', error);
+    }
+}
+
+// Load Stats
+async function loadStats() {
+    try {
+        const response = await fetch('/api/agent/stats');
+        const data = await response.json();
+
+        document.getElementById('kpiTotalMessages').textContent = data.total_messages;
+        document.getElementById('kpiUrgent').textContent = data.urgent_conversations;
+        document.getElementById('kpiPending').textContent = data.pending_responses;
+        document.getElementById('kpiResponseTime').textContent = data.avg_response_time;
+    } catch (error) {
+        console.error('Error loading stats:', error);
+    }
+}
+
+// Load messages from backend
+async function loadMessages() {
+    try {
+        const response = await fetch('/api/agent/messages');
+        messagesData = await response.json();
+        inboxCursor = response.headers.get('X-Sync-Cursor');
+
+        // Update message avatars and format data
+        messagesData = messagesData.map(formatConversation);
+
+        renderMessages();
+    } catch (error) {
+        console.error('Error loading messages:', error);
+        messageList.innerHTML = `
+            <div class="empty-state">
+                <div class="empty-state-icon">❌</div>
+                <h3>Error loading messages</h3>
+                <p>There was an issue connecting to the server</p>
+            </div>
+        `;
+    }
+}
+
+// Format a conversation from the API for the inbox
+function formatConversation(msg) {
+    return {
+        ...msg,
+        id: msg.id,
+        customerName: msg.customer_name,
+        customerId: `CUST-${msg.customer_id}`,
+        avatar: msg.customer_name.split(' ').map(n => n[0]).join('').toUpperCase(),
+        urgency: msg.urgency.toLowerCase(),
+        status: msg.status.toLowerCase(),
+        preview: msg.message_text,
+        timestamp: formatTimeAgo(new Date(msg.timestamp)),
+        accountType: msg.account_type || "Standard Account",
+        lastInteraction: "Recently", // Default value
+        loanStatus: "None" // Default value
+    };
+}
+
+// Replace (or add) one conversation pushed by the server
+function upsertConversation(conversation) {
+    const formatted = formatConversation(conversation);
+    messagesData = messagesData.filter(msg => msg.customer_id !== formatted.customer_id);
+    messagesData.unshift(formatted);
+    renderMessages();
+}
+
+// Fetch only the conversations that changed since the last load
+let inboxCursor = null;
+async function syncInbox() {
+    if (!inboxCursor) {
+        await loadMessages();
+        return;
+    }
+    try {
+        const response = await fetch(`/api/agent/messages?since=${encodeURIComponent(inboxCursor)}`);
+        if (response.status === 304) return;
+        const data = response.ok ? await response.json() : null;
+        // Conversations were archived (or the cursor is stale): start over from the full list
+        if (!data || data.reload) {
+            await loadMessages();
+            return;
+        }
+        data.conversations.forEach(upsertConversation);
+        inboxCursor = data.cursor;
+    } catch (error) {
+        console.error('Error syncing messages:', error);
+    }
+}
+
+// Live updates over Server-Sent Events instead of polling
+let statsTimer = null;
+function refreshStatsSoon() {
+    clearTimeout(statsTimer);
+    statsTimer = setTimeout(loadStats, 500);
+}
+
+function connectEvents() {
+    if (!window.EventSource) {
+        setInterval(loadMessages, 30000);
+        return;
+    }
+    const events = new EventSource('/api/events');
+    let connectedBefore = false;
+
+    events.addEventListener('ready', () => {
+        // After a reconnect we may have missed events, so reload once
+        if (connectedBefore) {
+            syncInbox();
+            refreshStatsSoon();
+        }
+        connectedBefore = true;
+    });
+    events.addEventListener('conversation', (e) => {
+        upsertConversation(JSON.parse(e.data));
+        refreshStatsSoon();
+    });
+    events.addEventListener('import', (e) => {
+        const job = JSON.parse(e.data);
+        if (job.state === 'completed') {
+            syncInbox();
+        }
+        refreshStatsSoon();
+    });
+    events.addEventListener('resync', () => {
+        syncInbox();
+        refreshStatsSoon();
+    });
+    events.onerror = () => {
+        // Closed for good (503 when the server is at its stream limit): poll instead
+        if (events.readyState === EventSource.CLOSED) {
+            setInterval(() => {
+                syncInbox();
+                loadStats();
+            }, 30000);
+        }
+    };
+}
+
+// Format time as 'X min ago'
+function formatTimeAgo(date) {
+    const now = new Date();
+    const diffMs = now - date;
+    const diffMins = Math.floor(diffMs / 60000);
+
+    if (diffMins < 1) return 'Just now';
+    if (diffMins < 60) return `${diffMins} min ago`;
+
+    const diffHours = Math.floor(diffMins / 60);
+    if (diffHours < 24) return `${diffHours} hour${diffHours !== 1 ? 's' : ''} ago`;
+
+    const diffDays = Math.floor(diffHours / 24);
+    return `${diffDays} day${diffDays !== 1 ? 's' : ''} ago`;
+}
+
+// Render Messages
+function renderMessages() {
+    const filteredMessages = getFilteredMessages();
+
+    // Update count
+    messageCount.textContent = `${filteredMessages.length} Message${filteredMessages.length !== 1 ? 's' : ''}`;
+
+    if (filteredMessages.length === 0) {
+        messageList.innerHTML = `
+            <div class="empty-state">
+                <div class="empty-state-icon">📭</div>
+                <h3>No messages found</h3>
+                <p>Try adjusting your filters or search terms</p>
+            </div>
+        `;
+        return;
+    }
+
+    messageList.innerHTML = filteredMessages.map(msg => `
+        <div class="message-item ${msg.urgency}" data-id="${msg.id}" onclick="selectMessage(${msg.id})">
+            <div class="message-header-row">
+                <div class="message-customer-info">
+                    <div class="customer-avatar" onclick="viewCustomerDetails(event, ${msg.id})">${msg.avatar}</div>
+                    <div class="customer-details">
+                        <div class="customer-name">${msg.customerName}</div>
+                        <div class="customer-id">${msg.customerId}</div>
+                    </div>
+                </div>
+                <div class="message-badges">
+                    <span class="badge ${msg.urgency}">${msg.urgency}</span>
+                    <span class="badge ${msg.status}">${msg.status}</span>
+                    ${msg.message_count > 1 ? `<span class="badge count">${msg.message_count} msgs</span>` : ''}
+                </div>
+            </div>
+            <div class="message-preview">${msg.preview}</div>
+            <div class="message-footer">
+                <div class="message-time">
+                    <span>🕐</span>
+                    <span>${msg.timestamp}</span>
+                </div>
+            </div>
+        </div>
+    `).join('');
+}
+
+// Get Filtered Messages
+function getFilteredMessages() {
+    let filtered = [...messagesData];
+
+    // Apply filter
+    if (currentFilter === 'urgent') {
+        filtered = filtered.filter(msg => msg.urgency === 'urgent');
+    } else if (currentFilter === 'normal') {
+        filtered = filtered.filter(msg => msg.urgency === 'normal');
+    } else if (currentFilter === 'unresolved') {
+        filtered = filtered.filter(msg => msg.status !== 'resolved');
+    }
+
+    // Apply search
+    if (searchTerm) {
+        const term = searchTerm.toLowerCase();
+        filtered = filtered.filter(msg => 
+            msg.customerName.toLowerCase().includes(term) ||
+            msg.customerId.toLowerCase().includes(term) ||
+            msg.preview.toLowerCase().includes(term)
+        );
+    }
+
+    // Sort: urgent messages first, then by timestamp
+    filtered.sort((a, b) => {
+        if (a.urgency === 'urgent' && b.urgency !== 'urgent') return -1;
+        if (a.urgency !== 'urgent' && b.urgency === 'urgent') return 1;
+        // Sort by timestamp (newest first)
+        return new Date(b.timestamp) - new Date(a.timestamp);
+    });
+
+    return filtered;
+}
+
+// Select Message
+// Select Message (Opens Chat)
+function selectMessage(id) {
+    const message = messagesData.find(msg => msg.id === id);
+    if (message) {
+        // Navigate to agent chat page for this specific customer
+        window.location.href = `/agent/chat/${message.customer_id}`;
+    }
+}
+
+// View Customer Details (Opens Side Panel)
+function viewCustomerDetails(event, id) {
+    // Stop propagation so we don't open the chat
+    event.stopPropagation();
+
+    selectedMessage = messagesData.find(msg => msg.id === id);
+    if (selectedMessage) {
+        showCustomerPreview(selectedMessage);
+
+        // On mobile, scroll to side panel or show it
+        if (window.innerWidth <= 768) {
+            const sidePanel = document.querySelector('.side-panel');
+            sidePanel.scrollIntoView({ behavior: 'smooth' });
+        }
+    }
+}
+
+// Show Customer Preview
+function showCustomerPreview(message) {
+    customerPreview.innerHTML = `
+        <div class="customer-preview-content">
+            <div class="preview-avatar">${message.avatar}</div>
+            <div class="preview-name">${message.customerName}</div>
+            <div class="preview-id">${message.customerId}</div>
+            <div class="preview-details">
+                <div class="detail-row">
+                    <span class="detail-label">Account Type</span>
+                    <span class="detail-value">${message.accountType}</span>
+                </div>
+                <div class="detail-row">
+                    <span class="detail-label">Last Interaction</span>
+                    <span class="detail-value">${message.lastInteraction}</span>
+                </div>
+                <div class="detail-row">
+                    <span class="detail-label">Loan Status</span>
+                    <span class="detail-value">${message.loanStatus}</span>
+                </div>
+                <div class="detail-row">
+                    <span class="detail-label">Message Status</span>
+                    <span class="detail-value" style="text-transform: capitalize;">${message.status}</span>
+                </div>
+            </div>
+        </div>
+    `;
+}
+
+// Claim the head of the work queue and open it
+async function claimNext() {
+    const button = document.getElementById('claimNextBtn');
+    button.disabled = true;
+    try {
+        const response = await fetch('/api/agent/queue/claim', { method: 'POST' });
+        const data = await response.json();
+        if (data.claim) {
+            window.location.href = `/agent/chat/${data.claim.customer_id}?claimed=1`;
+            return;
+        }
+        button.textContent = 'Queue empty';
+        setTimeout(() => { button.textContent = 'Take Next ▶'; }, 3000);
+    } catch (error) {
+        console.error('Error claiming conversation:', error);
+    }
+    button.disabled = false;
+}
+
+// Make function global for onclick
+// Make functions global for onclick
+window.selectMessage = selectMessage;
+window.viewCustomerDetails = viewCustomerDetails;
+
+// Attach Event Listeners
+function attachEventListeners() {
+    document.getElementById('claimNextBtn').addEventListener('click', claimNext);
+
+    // Search input
+    searchInput.addEventListener('input', (e) => {
+        searchTerm = e.target.value;
+        renderMessages();
+    });
+
+    // Filter buttons
+    filterButtons.forEach(btn => {
+        btn.addEventListener('click', () => {
+            // Remove active class from all
+            filterButtons.forEach(b => b.classList.remove('active'));
+
+            // Add active class to clicked
+            btn.classList.add('active');
+
+            // Update filter
+            currentFilter = btn.dataset.filter;
+
+            // Re-render
+            renderMessages();
+        });
+    });
+
+    // Navbar scroll effect
+    window.addEventListener('scroll', () => {
+        if (window.scrollY > 50) {
+            navbar.classList.add('scrolled');
+        } else {
+            navbar.classList.remove('scrolled');
+        }
+    });
+}
+
+// Update navigation and user info based on login status
+async function updateUserInfo() {
+    // Load user data from localStorage or session
+    await loadUserData();
+
+    const userData = localStorage.getItem('messageflow_user');
+    const userRole = localStorage.getItem('messageflow_role');
+
+    if (userData && userRole) {
+        const user = JSON.parse(userData);
+
+        // Update agent name in navigation
+        const agentNameElement = document.getElementById('agentName');
+        if (agentNameElement) {
+            agentNameElement.textContent = user.name || 'Support Agent';
+        }
+    }
+}
+
+// Initialize on load
+window.addEventListener('load', () => {
+    updateUserInfo();
+    init();
+});
@@ -0,0 +1,180 @@
+// State management
+let selectedRole = null;
+
+// DOM elements
+const roleCards = document.querySelectorAll('.role-card');
+const roleSelection = document.getElementById('roleSelection');
+const loginFormContainer = document.getElementById('loginFormContainer');
+const backButton = document.getElementById('backButton');
+const loginForm = document.getElementById('loginForm');
+const step1 = document.getElementById('step1');
+const step2 = document.getElementById('step2');
+const roleBadge = document.getElementById('roleBadge');
+const roleIcon = document.getElementById('roleIcon');
+const roleText = document.getElementById('roleText');
+const loginTitle = document.getElementById('loginTitle');
+const loginSubtitle = document.getElementById('loginSubtitle');
+const loginButton = document.getElementById('loginButton');
+
+// Role selection handler
+roleCards.forEach(card => {
+    card.addEventListener('click', () => {
+        const role = card.dataset.role;
+
+        // Remove previous selection
+        roleCards.forEach(c => c.classList.remove('selected'));
+
+        // Add selection to clicked card
+        card.classList.add('selected');
+        selectedRole = role;
+
+        // Wait for animation, then transition to login form
+        setTimeout(() => {
+            showLoginForm(role);
+        }, 400);
+    });
+});
+
+// Show login form based on selected role
+function showLoginForm(role) {
+    // Update step indicator
+    step1.classList.remove('active');
+    step1.classList.add('completed');
+    step2.classList.add('active');
+
+    // Hide role selection
+    roleSelection.classList.add('hidden');
+
+    // Show login form
+    loginFormContainer.classList.add('active');
+
+    // Update login form content based on role
+    if (role === 'customer') {
+        roleIcon.textContent = '👤';
+        roleText.textContent = 'Customer Login';
+        loginTitle.textContent = 'Customer Login';
+        loginSubtitle.textContent = 'Access your support tickets and messages';
+        loginButton.textContent = 'Login as Customer';
+    } else if (role === 'agent') {
+        roleIcon.textContent = '🎧';
+        roleText.textContent = 'Agent Login';
+        loginTitle.textContent = 'Agent Login';
+        loginSubtitle.textContent = 'Access your agent dashboard';
+        loginButton.textContent = 'Login as Support Agent';
+    }
+
+    // Scroll to top smoothly
+    window.scrollTo({ top: 0, behavior: 'smooth' });
+}
+
+// Back button handler
+backButton.addEventListener('click', () => {
+    // Update step indicator
+    step2.classList.remove('active');
+    step1.classList.remove('completed');
+    step1.classList.add('active');
+
+    // Show role selection
+    roleSelection.classList.remove('hidden');
+
+    // Hide login form
+    loginFormContainer.classList.remove('active');
+
+    // Reset selection
+    roleCards.forEach(c => c.classList.remove('selected'));
+    selectedRole = null;
+});
+
+// Form submission handler
+// Form submission handler
+const errorMessageDiv = document.getElementById('errorMessage');
+
+function showError(message) {
+    errorMessageDiv.textContent = message;
+    errorMessageDiv.style.display = 'block';
+    errorMessageDiv.scrollIntoView({ behavior: 'smooth', block: 'center' });
+}
+
+function hideError() {
+    errorMessageDiv.style.display = 'none';
+}
+
+loginForm.addEventListener('submit', (e) => {
+    e.preventDefault();
+    hideError();
+
+    const email = document.getElementById('email').value;
+    const name = document.getElementById('name').value;
+
+    // Show loading state
+    loginButton.textContent = 'Logging in...';
+    loginButton.classList.add('loading');
+    loginButton.disabled = true;
+
+    // Send login request to backend
+    fetch('/api/login', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            name: name,
+            email: email,
+            role: selectedRole
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            // Store user data in localStorage
+            const userData = {
+                email: email,
+                name: name,
+                role: selectedRole,
+                loginTime: new Date().toISOString()
+            };
+
+            localStorage.setItem('messageflow_user', JSON.stringify(userData));
+            localStorage.setItem('messageflow_role', selectedRole);
+
+            // Redirect based on role
+            if (selectedRole === 'customer') {
+                window.location.href = '/customer';
+            } else if (selectedRole === 'agent') {
+                window.location.href = '/dashboard';
+            }
+        } else {
+            showError(data.error || 'Login failed: Unknown error');
+            loginButton.textContent = 'Continue';
+            loginButton.classList.remove('loading');
+            loginButton.disabled = false;
+        }
+    })
+    .catch(error => {
+        console.error('Login error:', error);
+        showError('Login failed: ' + error.message);
+        loginButton.textContent = 'Continue';
+        loginButton.classList.remove('loading');
+        loginButton.disabled = false;
+    });
+});
+
+// Navbar scroll effect (matching home page)
+const navbar = document.getElementById('navbar');
+window.addEventListener('scroll', () => {
+    if (window.scrollY > 50) {
+        navbar.classList.add('scrolled');
+    } else {
+        navbar.classList.remove('scrolled');
+    }
+});
+
+// Check if user is already logged in
+window.addEventListener('load', () => {
+    const storedUser = localStorage.getItem('messageflow_user');
+    if (storedUser) {
+        const user = JSON.parse(storedUser);
+        console.log('User already logged in:', user);
+        // Optionally redirect to dashboard
+    }
+});
@@ -0,0 +1,324 @@
+// State management
+let selectedRole = null;
+
+// DOM elements
+const roleCards = document.querySelectorAll('.role-card');
+const roleSelection = document.getElementById('roleSelection');
+const registerFormContainer = document.getElementById('registerFormContainer');
+const backButton = document.getElementById('backButton');
+const registerForm = document.getElementById('registerForm');
+const step1 = document.getElementById('step1');
+const step2 = document.getElementById('step2');
+const step3 = document.getElementById('step3');
+const roleBadge = document.getElementById('roleBadge');
+const roleIcon = document.getElementById('roleIcon');
+const roleText = document.getElementById('roleText');
+const registerTitle = document.getElementById('registerTitle');
+const registerSubtitle = document.getElementById('registerSubtitle');
+const registerButton = document.getElementById('registerButton');
+const customerFields = document.getElementById('customerFields');
+const agentFields = document.getElementById('agentFields');
+
+// Role selection handler
+roleCards.forEach(card => {
+    card.addEventListener('click', () => {
+        const role = card.dataset.role;
+
+        // Remove previous selection
+        roleCards.forEach(c => c.classList.remove('selected'));
+
+        // Add selection to clicked card
+        card.classList.add('selected');
+        selectedRole = role;
+
+        // Wait for animation, then transition to form
+        setTimeout(() => {
+            showRegistrationForm(role);
+        }, 400);
+    });
+});
+
+// Show registration form based on selected role
+function showRegistrationForm(role) {
+    // Update step indicator
+    step1.classList.remove('active');
+    step1.classList.add('completed');
+    step2.classList.add('active');
+
+    // Hide role selection
+    roleSelection.classList.add('hidden');
+
+    // Show registration form
+    registerFormContainer.classList.add('active');
+
+    // Update form content based on role
+    if (role === 'customer') {
+        roleIcon.textContent = '👤';
+        roleText.textContent = 'Customer Registration';
+        registerTitle.textContent = 'Customer Registration';
+        registerSubtitle.textContent = 'Create your customer account to access support';
+        registerButton.textContent = 'Create Customer Account';
+
+        // Show customer fields
+        customerFields.style.display = 'block';
+        agentFields.style.display = 'none';
+
+        // Toggle required attributes for Customer
+        document.getElementById('customerName').setAttribute('required', '');
+        document.getElementById('customerEmail').setAttribute('required', '');
+        document.getElementById('accountType').setAttribute('required', '');
+        document.getElementById('customerConsent').setAttribute('required', '');
+
+        // Remove required attributes from Agent fields
+        document.getElementById('agentName').removeAttribute('required');
+        document.getElementById('agentEmail').removeAttribute('required');
+        document.getElementById('agentId').removeAttribute('required');
+        document.getElementById('department').removeAttribute('required');
+        document.getElementById('agentConsent').removeAttribute('required');
+
+        // Enable customer field validation
+        enableFieldValidation('customerName');
+        enableFieldValidation('customerEmail');
+        enableFieldValidation('customerPhone');
+    } else if (role === 'agent') {
+        roleIcon.textContent = '🎧';
+        roleText.textContent = 'Agent Registration';
+        registerTitle.textContent = 'Support Agent Registration';
+        registerSubtitle.textContent = 'Join our support team';
+        registerButton.textContent = 'Create Agent Account';
+
+        // Show agent fields
+        customerFields.style.display = 'none';
+        agentFields.style.display = 'block';
+
+        // Toggle required attributes for Agent
+        document.getElementById('agentName').setAttribute('required', '');
+        document.getElementById('agentEmail').setAttribute('required', '');
+        document.getElementById('agentId').setAttribute('required', '');
+        document.getElementById('department').setAttribute('required', '');
+        document.getElementById('agentConsent').setAttribute('required', '');
+
+        // Remove required attributes from Customer fields
+        document.getElementById('customerName').removeAttribute('required');
+        document.getElementById('customerEmail').removeAttribute('required');
+        document.getElementById('accountType').removeAttribute('required');
+        document.getElementById('customerConsent').removeAttribute('required');
+
+        // Enable agent field validation
+        enableFieldValidation('agentName');
+        enableFieldValidation('agentEmail');
+        enableFieldValidation('agentId');
+    }
+
+    // Scroll to top smoothly
+    window.scrollTo({ top: 0, behavior: 'smooth' });
+}
+
+// Back button handler
+backButton.addEventListener('click', () => {
+    // Update step indicator
+    step2.classList.remove('active');
+    step1.classList.remove('completed');
+    step1.classList.add('active');
+
+    // Show role selection
+    roleSelection.classList.remove('hidden');
+
+    // Hide registration form
+    registerFormContainer.classList.remove('active');
+
+    // Reset selection
+    roleCards.forEach(c => c.classList.remove('selected'));
+    selectedRole = null;
+
+    // Reset form
+    registerForm.reset();
+
+    // Clear all validation states
+    document.querySelectorAll('.form-input').forEach(input => {
+        input.classList.remove('valid', 'invalid');
+        const icon = input.nextElementSibling;
+        if (icon && icon.classList.contains('validation-icon')) {
+            icon.classList.remove('show', 'valid', 'invalid');
+        }
+    });
+});
+
+// Field validation with visual feedback
+function enableFieldValidation(fieldId) {
+    const input = document.getElementById(fieldId);
+    const icon = input.nextElementSibling;
+
+    // Real-time validation
+    input.addEventListener('input', () => {
+        validateField(input, icon);
+    });
+
+    // Blur validation
+    input.addEventListener('blur', () => {
+        if (input.value.trim() !== '') {
+            validateField(input, icon);
+        }
+    });
+}
+
+function validateField(input, icon) {
+    const value = input.value.trim();
+    const type = input.type;
+    let isValid = false;
+
+    if (value === '') {
+        input.classList.remove('valid', 'invalid');
+        if (icon) {
+            icon.classList.remove('show');
+        }
+        return;
+    }
+
+    // Email validation
+    if (type === 'email') {
+        const emailRegex = /^[^\s@]+@[^\s@]+\.[^\s@]+$/;
+        isValid = emailRegex.test(value);
+    }
+    // Phone validation (optional but validate format if provided)
+    else if (type === 'tel') {
+        const phoneRegex = /^[\+]?[(]?[0-9]{1,4}[)]?[-\s\.]?[(]?[0-9]{1,5}[)]?[-\s\.]?[0-9]{4,6}$/;
+        isValid = phoneRegex.test(value) || value === '';
+    }
+    // Text validation (minimum 2 characters)
+    else if (type === 'text') {
+        isValid = value.length >= 2;
+    }
+
+    // Update visual state
+    if (isValid) {
+        input.classList.remove('invalid');
+        input.classList.add('valid');
+        if (icon) {
+            icon.classList.remove('invalid');
+            icon.classList.add('valid', 'show');
+        }
+    } else {
+        input.classList.remove('valid');
+        input.classList.add('invalid');
+        if (icon) {
+            icon.classList.remove('valid');
+            icon.classList.add('invalid', 'show');
+        }
+    }
+}
+
+const statusMessageDiv = document.getElementById('statusMessage');
+
+function showStatus(message, type) {
+    statusMessageDiv.textContent = message;
+    statusMessageDiv.className = `status-message ${type}`;
+    statusMessageDiv.style.display = 'block';
+    statusMessageDiv.scrollIntoView({ behavior: 'smooth', block: 'center' });
+}
+
+function hideStatus() {
+    statusMessageDiv.style.display = 'none';
+}
+
+// Form submission handler
+registerForm.addEventListener('submit', (e) => {
+    e.preventDefault();
+    hideStatus();
+
+    let userData = {
+        role: selectedRole,
+        registrationTime: new Date().toISOString()
+    };
+
+    // Collect data based on role
+    if (selectedRole === 'customer') {
+        userData = {
+            ...userData,
+            name: document.getElementById('customerName').value,
+            email: document.getElementById('customerEmail').value,
+            phone: document.getElementById('customerPhone').value,
+            account_type: document.getElementById('accountType').value
+        };
+    } else if (selectedRole === 'agent') {
+        userData = {
+            ...userData,
+            name: document.getElementById('agentName').value,
+            email: document.getElementById('agentEmail').value,
+            agentId: document.getElementById('agentId').value,
+            department: document.getElementById('department').value,
+            shiftPreference: document.getElementById('shiftPreference').value
+        };
+    }
+
+    // Show loading state
+    registerButton.textContent = 'Creating account...';
+    registerButton.classList.add('loading');
+    registerButton.disabled = true;
+
+    // Send registration request to backend
+    fetch('/api/register', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(userData)
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            // Store user data in localStorage
+            localStorage.setItem('messageflow_user', JSON.stringify(data.user));
+            localStorage.setItem('messageflow_role', selectedRole);
+
+            // Update step indicator to completed
+            step2.classList.remove('active');
+            step2.classList.add('completed');
+            step3.classList.add('active', 'completed');
+
+            // Show success message
+            showStatus(`Registration successful! Welcome to MessageFlow, ${userData.name}. Redirecting...`, 'success');
+
+            setTimeout(() => {
+                // Redirect based on role
+                if (selectedRole === 'customer') {
+                    window.location.href = '/customer';
+                } else {
+                    window.location.href = '/dashboard';
+                }
+            }, 1500);
+        } else {
+            showStatus(data.error || 'Registration failed. Please try again.', 'error');
+            registerButton.textContent = 'Create Account';
+            registerButton.classList.remove('loading');
+            registerButton.disabled = false;
+        }
+    })
+    .catch(error => {
+        console.error('Registration error:', error);
+        showStatus('Registration failed: ' + error.message, 'error');
+        registerButton.textContent = 'Create Account';
+        registerButton.classList.remove('loading');
+        registerButton.disabled = false;
+    });
+});
+
+// Navbar scroll effect
+const navbar = document.getElementById('navbar');
+window.addEventListener('scroll', () => {
+    if (window.scrollY > 50) {
+        navbar.classList.add('scrolled');
+    } else {
+        navbar.classList.remove('scrolled');
+    }
+});
+
+// Check if user is already registered
+window.addEventListener('load', () => {
+    const storedUser = localStorage.getItem('messageflow_user');
+    if (storedUser) {
+        const user = JSON.parse(storedUser);
+        console.log('User already registered:', user);
+        // Optionally show a message or redirect
+    }
+});
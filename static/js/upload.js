@@ -0,0 +1,86 @@
+const form = document.getElementById('uploadForm');
+const fileInput = document.getElementById('fileInput');
+const fileLabel = document.getElementById('fileLabel');
+const statusBox = document.getElementById('statusBox');
+const uploadBtn = document.getElementById('uploadBtn');
+
+fileInput.addEventListener('change', (e) => {
+    if (e.target.files.length > 0) {
+        fileLabel.textContent = e.target.files[0].name;
+    }
+});
+
+// Poll the background import job until it finishes
+async function pollImportJob(statusUrl) {
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const response = await fetch(statusUrl);
+        const job = await response.json();
+        if (!response.ok) {
+            statusBox.className = 'status-box error';
+            statusBox.innerHTML = `<strong>Error:</strong> ${job.error}`;
+            return;
+        }
+
+        if (job.state === 'queued' || job.state === 'running') {
+            const rate = job.rows_per_second ? ` (${job.rows_per_second} rows/s)` : '';
+            statusBox.innerHTML = `<strong>Importing...</strong> ${job.rows_processed} rows processed${rate}.`;
+            continue;
+        }
+
+        if (job.state === 'completed') {
+            statusBox.className = 'status-box success';
+            statusBox.innerHTML = `<strong>Success!</strong> ${job.messages_imported} messages imported.`;
+            if (job.duplicates_skipped) {
+                statusBox.innerHTML += ` ${job.duplicates_skipped} duplicate${job.duplicates_skipped !== 1 ? 's' : ''} skipped.`;
+            }
+            if (job.rows_failed) {
+                statusBox.innerHTML += ` ${job.rows_failed} row${job.rows_failed !== 1 ? 's' : ''} skipped (first: row ${job.errors[0].row}, ${job.errors[0].error}).`;
+            }
+        } else {
+            statusBox.className = 'status-box error';
+            statusBox.innerHTML = `<strong>Error:</strong> ${job.error}`;
+        }
+        return;
+    }
+}
+
+form.addEventListener('submit', async (e) => {
+    e.preventDefault();
+    if (!fileInput.files.length) return;
+
+    const formData = new FormData();
+    formData.append('file', fileInput.files[0]);
+
+    uploadBtn.disabled = true;
+    uploadBtn.textContent = 'Uploading...';
+    statusBox.style.display = 'none';
+
+    try {
+        const response = await fetch('/api/agent/upload-messages', {
+            method: 'POST',
+            body: formData
+        });
+
+        const result = await response.json();
+
+        statusBox.style.display = 'block';
+        if (result.success) {
+            statusBox.className = 'status-box success';
+            statusBox.innerHTML = `<strong>Uploaded.</strong> Import queued...`;
+            form.reset();
+            fileLabel.textContent = 'Click to select or drag CSV file here';
+            await pollImportJob(result.status_url);
+        } else {
+            statusBox.className = 'status-box error';
+            statusBox.innerHTML = `<strong>Error:</strong> ${result.error}`;
+        }
+    } catch (err) {
+        statusBox.style.display = 'block';
+        statusBox.className = 'status-box error';
+        statusBox.innerHTML = `<strong>Network Error:</strong> Failed to upload.`;
+    } finally {
+        uploadBtn.disabled = false;
+        uploadBtn.textContent = 'Upload Messages';
+    }
+});